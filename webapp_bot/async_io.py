@@ -0,0 +1,75 @@
+"""
+async_io.py – блокирующий I/O вне asyncio-цикла бота
+====================================================
+•  run_io(fn, *args)  – выполнить fn в ограниченном пуле потоков IO_POOL
+                        (JSON/SQLite, glob/rename, pydub-перекодирование …)
+•  LoopLagMonitor     – «пинг» цикла: если таймер проснулся позже порога,
+                        значит какой-то callback блокировал цикл – пишем warning.
+                        LOOP_LAG_DEBUG=1 дополнительно включает asyncio debug,
+                        который называет конкретный медленный callback.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("async-io")
+
+IO_WORKERS = int(os.getenv("IO_WORKERS", "4"))
+IO_POOL = concurrent.futures.ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="io")
+
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Выполнить блокирующую функцию в IO_POOL и дождаться результата."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(IO_POOL, functools.partial(fn, *args, **kwargs))
+
+
+class LoopLagMonitor:
+    """
+    Parameters
+    ----------
+    threshold : float
+        Задержка (сек), начиная с которой пишем warning.
+    interval  : float
+        Как часто «пингуем» цикл.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.5):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if os.getenv("LOOP_LAG_DEBUG") == "1":
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"max_lag_ms": round(self.max_lag * 1000, 1), "stalls": self.stalls}
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - started - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold:
+                self.stalls += 1
+                logger.warning("Event loop заблокирован на %.0f ms", lag * 1000)
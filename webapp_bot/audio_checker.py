@@ -1,16 +1,26 @@
 """
 audio_checker.py
 ================
-Загрузка модели PatentTTSNet + функция predict(path)
+Модель PatentTTSNet + функция predict(path).
+predict_batch(inputs) – пачка файлов / mel одним прогоном модели
+(перед ним в server_bot стоит MicroBatcher для /audio_check).
+Лог-мелы считает mel_frontend (torch, те же признаки, что давала librosa).
+Длинные записи: iter_windows() – вся запись перекрывающимися окнами,
+verdict() – итог и интервалы подозрительных окон.
+Веса грузятся при первом load_model() / predict(), а не при импорте –
+server_bot прогревает модель в фоне.
 """
 
+import threading
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import librosa
-import numpy as np
 from pathlib import Path
 
+from mel_frontend import HOP_LENGTH, load_audio, log_mel
+from weights import mmap_state_dict
+
 # ─────────────────────────────── гиперпараметры
 SAMPLE_RATE        = 16000
 N_MELS             = 80
@@ -27,11 +37,7 @@ CLASSES = ["original", "synth_same_text", "synth_random_text"]
 
 # ─────────────────────────────── препроцессинг
 def compute_mel_spectrogram(path: str):
-    y, sr = librosa.load(path, sr=SAMPLE_RATE)
-    mel = librosa.feature.melspectrogram(y=y, sr=sr,
-                                         n_mels=N_MELS, power=2.0)
-    mel = librosa.power_to_db(mel, ref=np.max)
-    return torch.tensor(mel.T, dtype=torch.float32)          # [T, M]
+    return log_mel([load_audio(path, SAMPLE_RATE)], SAMPLE_RATE, N_MELS)[0]   # [T, M]
 
 def compute_artifact_map(mel: torch.Tensor, k: int = 9):
     x = mel.unsqueeze(0).transpose(1, 2)                     # [1,M,T]
@@ -131,44 +137,145 @@ class PatentTTSNet(nn.Module):
         return self.heads(fused)
 
 # ─────────────────────────────── загрузка весов
-MODEL = PatentTTSNet()
 BASE_DIR = Path(__file__).resolve().parent
 ckpt_path = BASE_DIR / "models" / "patent_tts_net.pth"
-if not ckpt_path.exists():
-    raise FileNotFoundError(f"{ckpt_path} not found")
-
-missing, unexpected = MODEL.load_state_dict(
-    torch.load(ckpt_path, map_location="cpu"),
-    strict=False
-)
-if missing or unexpected:
-    raise RuntimeError(
-        f"State dict mismatch!\nMissing: {missing}\nUnexpected: {unexpected}"
-    )
-MODEL.eval()
+MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+def load_model() -> PatentTTSNet:
+    """Загрузить веса один раз; повторные вызовы возвращают готовую модель."""
+    global MODEL
+    with _MODEL_LOCK:
+        if MODEL is not None:
+            return MODEL
+        model = PatentTTSNet()
+        st_path = ckpt_path.with_suffix(".safetensors")
+        if st_path.exists():        # convert_safetensors.py → mmap, без копии
+            state, assign = mmap_state_dict(st_path), True
+        elif ckpt_path.exists():
+            state, assign = torch.load(ckpt_path, map_location="cpu"), False
+        else:
+            raise FileNotFoundError(f"{ckpt_path} not found")
+        missing, unexpected = model.load_state_dict(
+            state, strict=False, assign=assign
+        )
+        if missing or unexpected:
+            raise RuntimeError(
+                f"State dict mismatch!\nMissing: {missing}\nUnexpected: {unexpected}"
+            )
+        MODEL = model.eval()
+        return MODEL
 
 # ─────────────────────────────── predict
+def _fit(x: torch.Tensor, max_len: int) -> torch.Tensor:
+    """[T, M] → ровно [max_len, M]: паддинг нулями справа или обрезка."""
+    T = x.size(0)
+    if T < max_len:
+        return F.pad(x, (0, 0, 0, max_len - T))
+    return x[:max_len, :]
+
 @torch.no_grad()
+def predict_batch(inputs, max_len: int = 400) -> list:
+    """
+    Пачка входов (путь к аудио, сигнал [N] 16 кГц или mel [T, N_MELS]) →
+    один прогон модели; пути и сигналы идут через одно STFT на всех.
+    Каждый вход приводится к max_len кадрам, как в predict(), поэтому
+    результат элемента не зависит от соседей по пачке.
+    Возвращает по элементу: {"fake": p, "classes": {класс: p}, "label": str}.
+    """
+    if not inputs:
+        return []
+    items = [
+        load_audio(x, SAMPLE_RATE) if isinstance(x, (str, Path))
+        else torch.as_tensor(x, dtype=torch.float32)
+        for x in inputs
+    ]
+    waves = [i for i, x in enumerate(items) if x.dim() == 1]
+    for i, mel in zip(waves, log_mel([items[i] for i in waves], SAMPLE_RATE, N_MELS)):
+        items[i] = mel
+    mels, arts = [], []
+    for mel in items:
+        mels.append(_fit(mel, max_len))
+        arts.append(_fit(compute_artifact_map(mel), max_len))
+
+    log_bin, log_mul = load_model()(torch.stack(mels), torch.stack(arts))
+    p_fake = torch.sigmoid(log_bin).tolist()
+    p_cls = torch.softmax(log_mul, dim=1).tolist()
+    out = []
+    for fake, probs in zip(p_fake, p_cls):
+        bin_lbl = "real" if fake < 0.5 else "fake"
+        mul_lbl = CLASSES[max(range(NUM_CLASSES), key=probs.__getitem__)]
+        out.append({
+            "fake": fake,
+            "classes": dict(zip(CLASSES, probs)),
+            "label": f"BINARY: {bin_lbl}, CLASS: {mul_lbl}",
+        })
+    return out
+
 def predict(path: str, max_len: int = 400) -> str:
-    mel = compute_mel_spectrogram(path)
-    art = compute_artifact_map(mel)
+    return predict_batch([path], max_len)[0]["label"]
 
-    T = mel.size(0)
-    if T < max_len:
-        pad = max_len - T
-        mel = F.pad(mel, (0, 0, 0, pad))
-        art = F.pad(art, (0, 0, 0, pad))
-    else:
-        mel = mel[:max_len, :]
-        art = art[:max_len, :]
+# ─────────────────────────────── скользящее окно
+# окно – отрезок сигнала ровно на WINDOW_FRAMES кадров (~12.8 с), шаг – половина
+# окна; каждое окно идёт в модель как отдельный короткий клип (своя нормировка
+# ref=max), поэтому запись короче окна даёт ровно результат predict()
+WINDOW_FRAMES  = 400
+WINDOW_SAMPLES = (WINDOW_FRAMES - 1) * HOP_LENGTH + 1
+WINDOW_STEP    = WINDOW_FRAMES // 2 * HOP_LENGTH
+
+def split_windows(wav, step: int = WINDOW_STEP) -> list:
+    """
+    Сигнал [N] 16 кГц → [(начало_с, конец_с, отрезок)] с перекрытием.
+    Последнее окно прижато к концу записи – хвост не теряется.
+    Отрезки – срезы wav, без копий.
+    """
+    n = len(wav)
+    starts = list(range(0, max(n - WINDOW_SAMPLES, 0) + 1, step))
+    if starts[-1] + WINDOW_SAMPLES < n:
+        starts.append(n - WINDOW_SAMPLES)
+    return [
+        (round(s / SAMPLE_RATE, 2), round(min(s + WINDOW_SAMPLES, n) / SAMPLE_RATE, 2),
+         wav[s:s + WINDOW_SAMPLES])
+        for s in starts
+    ]
 
-    mel = mel.unsqueeze(0)
-    art = art.unsqueeze(0)
+def iter_windows(src, step: int = WINDOW_STEP, batch: int = 16):
+    """Путь / байты / сигнал → оценки окон пачками по batch, по мере готовности."""
+    if isinstance(src, (str, Path, bytes, bytearray, memoryview)):
+        src = load_audio(src, SAMPLE_RATE)
+    windows = split_windows(torch.as_tensor(src, dtype=torch.float32), step)
+    for i in range(0, len(windows), batch):
+        chunk = windows[i:i + batch]
+        scores = predict_batch([w for _, _, w in chunk], WINDOW_FRAMES)
+        for (start, end, _), res in zip(chunk, scores):
+            yield {"start": start, "end": end, **res}
 
-    log_bin, log_mul = MODEL(mel, art)
-    bin_lbl = "real" if torch.sigmoid(log_bin).item() < 0.5 else "fake"
-    mul_lbl = CLASSES[log_mul.argmax(dim=1).item()]
-    return f"BINARY: {bin_lbl}, CLASS: {mul_lbl}"
+def verdict(windows: list, threshold: float = 0.5) -> dict:
+    """
+    Оценки окон → итог по записи: подделка, если хоть одно окно ≥ threshold;
+    класс – у самого подозрительного окна; suspicious – слитые интервалы
+    (с) таких окон.
+    """
+    if not windows:
+        raise ValueError("no windows")
+    worst = max(windows, key=lambda w: w["fake"])
+    regions = []
+    for w in sorted(windows, key=lambda w: w["start"]):
+        if w["fake"] < threshold:
+            continue
+        if regions and w["start"] <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], w["end"])
+        else:
+            regions.append([w["start"], w["end"]])
+    bin_lbl = "fake" if worst["fake"] >= threshold else "real"
+    mul_lbl = max(worst["classes"], key=worst["classes"].get)
+    return {
+        "fake": worst["fake"],
+        "label": f"BINARY: {bin_lbl}, CLASS: {mul_lbl}",
+        "suspicious": regions,
+        "duration": max(w["end"] for w in windows),
+        "windows": len(windows),
+    }
 
 # быстрая ручная проверка
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""
+audio_format.py – сборка аудио в памяти
+=======================================
+•  wav_header()   – RIFF/WAVE-заголовок PCM 16-бит; без data_size пишется
+                    «бесконечная» длина (0xFFFFFFFF) – так заголовок можно
+                    отправить первым, ещё не зная длины потока
+•  pcm16()        – float-сэмплы [-1, 1] (ndarray / list) → int16 little-endian
+•  decode_audio() – байты (ogg / mp4 / wav …) → mono float32 без временных
+                    файлов: PCM-WAV разбирается здесь же, остальное – ffmpeg
+                    через stdin/stdout
+•  encode_audio() – WAV из памяти → Ogg/Opus (голосовое Telegram) или MP3,
+                    тоже ffmpeg через stdin/stdout; Opus в 10–20 раз меньше WAV
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import struct
+import subprocess
+import wave
+from typing import Optional, Tuple
+
+import numpy as np
+
+TTS_SAMPLE_RATE = 24_000  # выход XTTS v2
+STREAM_SIZE = 0xFFFFFFFF
+FFMPEG = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# выходные форматы: имя → (mime, суффикс, кодек ffmpeg, контейнер)
+OUTPUT_FORMATS = {
+    "wav": ("audio/wav", ".wav", None, None),
+    "ogg": ("audio/ogg", ".ogg", "libopus", "ogg"),
+    "mp3": ("audio/mpeg", ".mp3", "libmp3lame", "mp3"),
+}
+FORMAT_ALIASES = {"opus": "ogg", "mpeg": "mp3", "wave": "wav"}
+
+
+def wav_header(
+    sample_rate: int = TTS_SAMPLE_RATE,
+    data_size: Optional[int] = None,
+    channels: int = 1,
+    bits: int = 16,
+) -> bytes:
+    block = channels * bits // 8
+    if data_size is None:
+        riff_size = data_size = STREAM_SIZE
+    else:
+        riff_size = min(36 + data_size, STREAM_SIZE)
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                sample_rate * block, block, bits)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+def pcm16(samples) -> bytes:
+    a = np.clip(np.asarray(samples, dtype=np.float32).reshape(-1), -1.0, 1.0)
+    return (a * 32767.0).astype("<i2").tobytes()
+
+
+def decode_audio(data: bytes, sample_rate: int = 22_050) -> Tuple[np.ndarray, int]:
+    """
+    Аудио из памяти → (mono float32, частота). PCM-WAV возвращается в своей
+    частоте (ресемплинг – на стороне модели), прочее ffmpeg сразу приводит
+    к `sample_rate`.
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            return _decode_wav(data)
+        except (wave.Error, ValueError):
+            pass  # float / ADPCM и т.п. – пусть разбирает ffmpeg
+    proc = subprocess.run(
+        [FFMPEG, "-nostdin", "-v", "error", "-i", "pipe:0", "-vn",
+         "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "pipe:1"],
+        input=bytes(data), capture_output=True, check=True,
+    )
+    return np.frombuffer(proc.stdout, dtype="<f4").copy(), sample_rate
+
+
+def output_format(name: Optional[str]) -> Optional[str]:
+    """Имя формата из запроса (ogg / opus / mp3 / wav …) → ключ OUTPUT_FORMATS или None."""
+    name = (name or "").strip().lower().lstrip(".")
+    name = FORMAT_ALIASES.get(name, name)
+    return name if name in OUTPUT_FORMATS else None
+
+
+def encode_audio(wav: bytes, fmt: str = "ogg", kbps: int = 32) -> bytes:
+    """
+    WAV-байты → `fmt` с битрейтом `kbps` (кбит/с). wav возвращается как есть.
+    Opus кодируется в режиме voip – он рассчитан на речь.
+    """
+    codec, muxer = OUTPUT_FORMATS[fmt][2:]
+    if codec is None:
+        return bytes(wav)
+    args = [FFMPEG, "-nostdin", "-v", "error", "-f", "wav", "-i", "pipe:0",
+            "-vn", "-ac", "1", "-c:a", codec, "-b:a", f"{int(kbps)}k"]
+    if codec == "libopus":
+        args += ["-application", "voip"]
+    proc = subprocess.run(
+        args + ["-f", muxer, "pipe:1"],
+        input=bytes(wav), capture_output=True, check=True,
+    )
+    return proc.stdout
+
+
+def _decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    with wave.open(io.BytesIO(data)) as w:
+        width, channels, sr = w.getsampwidth(), w.getnchannels(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 2:
+        a = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 1:
+        a = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 4:
+        a = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"unsupported sample width {width}")
+    return a.reshape(-1, channels).mean(axis=1), sr
@@ -0,0 +1,142 @@
+"""
+autodelete.py – отложенное удаление сообщений Telegram
+======================================================
+schedule() только ставит (chat_id, message_id, срок) в очередь и сразу
+возвращается – хендлер больше не ждёт DEL_DELAY секунд.
+Фоновая задача в цикле бота удаляет наступившие сообщения пачками
+по чату (bot.delete_messages, до 100 id за вызов).
+Очередь сохраняется в StateStore (ns "autodelete") и поднимается
+после рестарта через restore().
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from telegram.error import TelegramError
+
+from async_io import run_io
+from state_store import StateStore
+
+logger = logging.getLogger("autodelete")
+
+NS = "autodelete"
+MAX_BATCH = 100  # лимит Bot API для deleteMessages
+
+
+class DeletionScheduler:
+    def __init__(self, store: Optional[StateStore] = None):
+        self.store = store
+        self._pending: Dict[int, Dict[int, float]] = {}  # chat → {msg_id: срок}
+        self._dirty: set[int] = set()
+        self._bot = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    # ---------- public API ------------------------------------------- #
+    def schedule(self, bot, chat_id: int, msg_id: int, delay: float = 0.0) -> None:
+        """Поставить сообщение в очередь на удаление через `delay` секунд."""
+        self._bot = bot
+        self._pending.setdefault(chat_id, {})[msg_id] = time.time() + delay
+        self._dirty.add(chat_id)
+        self._ensure_running()
+        self._wake.set()
+
+    async def restore(self, bot) -> int:
+        """Поднять очередь из хранилища (post_init бота). Возвращает размер."""
+        self._bot = bot
+        if self.store is not None:
+            for chat, msgs in (await run_io(self.store.all, NS)).items():
+                if msgs:
+                    self._pending.setdefault(int(chat), {}).update(
+                        {int(m): float(t) for m, t in msgs.items()}
+                    )
+        if self._pending:
+            self._ensure_running()
+            self._wake.set()
+        return self.pending()
+
+    def pending(self) -> int:
+        return sum(len(m) for m in self._pending.values())
+
+    async def run_due(self) -> int:
+        """Удалить всё, чей срок наступил. Возвращает число сообщений."""
+        now = time.time()
+        batches: Dict[int, list[int]] = {}
+        for chat, msgs in list(self._pending.items()):
+            due = sorted(m for m, t in msgs.items() if t <= now)
+            if not due:
+                continue
+            for m in due:
+                del msgs[m]
+            if not msgs:
+                del self._pending[chat]
+            batches[chat] = due
+            self._dirty.add(chat)
+        for chat, ids in batches.items():
+            await self._delete(chat, ids)
+        # сохраняем уже после удаления: повторный delete безвреден, потерянный – нет
+        await self._persist()
+        return sum(len(ids) for ids in batches.values())
+
+    # ---------- internal --------------------------------------------- #
+    def _ensure_running(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wake = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            await self.run_due()
+            due = [t for msgs in self._pending.values() for t in msgs.values()]
+            # таймер вместо wait_for: тот в 3.11 может «проглотить» cancel()
+            timer = (
+                asyncio.get_running_loop().call_later(
+                    max(0.0, min(due) - time.time()), self._wake.set
+                )
+                if due else None
+            )
+            try:
+                await self._wake.wait()
+            finally:
+                if timer:
+                    timer.cancel()
+
+    async def _delete(self, chat_id: int, ids: list[int]) -> None:
+        bot = self._bot
+        if bot is None:
+            return
+        if len(ids) > 1 and hasattr(bot, "delete_messages"):
+            for i in range(0, len(ids), MAX_BATCH):
+                try:
+                    await bot.delete_messages(chat_id=chat_id, message_ids=ids[i:i + MAX_BATCH])
+                except TelegramError:
+                    pass
+            return
+        for msg_id in ids:
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=msg_id)
+            except TelegramError:
+                pass
+
+    async def _persist(self) -> None:
+        if self.store is None or not self._dirty:
+            return
+        ops = []
+        for chat in self._dirty:
+            msgs = {str(m): t for m, t in self._pending.get(chat, {}).items()}
+            ops.append((NS, str(chat), lambda _, msgs=msgs: msgs))
+        chats = set(self._dirty)
+        # чистим до await: пометки, пришедшие во время записи, не теряются
+        self._dirty.clear()
+        try:
+            await run_io(self.store.update_many, ops)  # все чаты – одной транзакцией
+        except Exception:
+            # запись не удалась – чаты снова «грязные», повтор на следующем проходе
+            self._dirty |= chats
+            logger.exception("Очередь удаления не сохранена (%d чатов)", len(chats))
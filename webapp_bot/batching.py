@@ -0,0 +1,104 @@
+"""
+batching.py – динамический micro-batching
+=========================================
+MicroBatcher собирает одиночные запросы в пачку: первая заявка открывает
+окно `window` секунд, всё пришедшее за это время (но не больше max_batch)
+уходит одним вызовом fn(items) → список результатов той же длины.
+Каждый submit() получает свой Future; исключение fn достаётся всей пачке.
+
+Используется перед XTTS (VoiceModule, TTS_BATCH_*) и перед детектором
+подделок (/audio_check).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        window: float = 0.03,
+        max_batch: int = 8,
+        name: str = "batcher",
+    ):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    # ---------- public API ------------------------------------------- #
+    def submit(self, item: Any) -> concurrent.futures.Future:
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def call(self, item: Any, timeout: Optional[float] = None) -> Any:
+        return self.submit(item).result(timeout)
+
+    async def run(self, item: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(item))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.largest,
+        }
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    # ---------- internal --------------------------------------------- #
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=left)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch: List[tuple]) -> None:
+        items = [item for item, _ in batch]
+        self.batches += 1
+        self.items += len(items)
+        self.largest = max(self.largest, len(items))
+        try:
+            results = list(self.fn(items))
+            if len(results) != len(items):
+                raise RuntimeError(f"batch fn returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for (_, fut), res in zip(batch, results):
+            fut.set_result(res)
@@ -0,0 +1,68 @@
+"""
+bench_audio_check.py – пропускная способность детектора подделок по размеру пачки
+================================================================================
+audio_checker.predict_batch() на случайных mel [400, 80] (декодирование
+не входит – мерится только прогон PatentTTSNet) и mel_frontend.log_mel()
+на 12-секундных сигналах. Для каждого B (1, 2, 4, 8, 16, 32) печатается:
+проверок/с, мс на пачку и мс лог-мелов на пачку.
+
+    python bench/bench_audio_check.py                 # веса models/patent_tts_net.*
+    python bench/bench_audio_check.py --random        # без чекпоинта: случайные веса
+
+Считается на CPU (CUDA_VISIBLE_DEVICES=""); потоки torch – --threads.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SIZES = (1, 2, 4, 8, 16, 32)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=64)
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--random", action="store_true")
+    args = ap.parse_args()
+
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+    import torch
+    import audio_checker as ac
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    if args.random:
+        ac.MODEL = ac.PatentTTSNet().train(False)
+    ac.load_model()
+    mels = [torch.randn(400, ac.N_MELS) for _ in range(args.items)]
+    waves = [torch.randn(12 * ac.SAMPLE_RATE) * 0.1 for _ in range(args.items)]
+    ac.predict_batch(mels[:1])  # прогрев
+    ac.log_mel(waves[:1], ac.SAMPLE_RATE, ac.N_MELS)
+
+    for size in SIZES:
+        started = time.perf_counter()
+        batches = 0
+        for i in range(0, len(mels), size):
+            ac.predict_batch(mels[i:i + size])
+            batches += 1
+        wall = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(0, len(waves), size):
+            ac.log_mel(waves[i:i + size], ac.SAMPLE_RATE, ac.N_MELS)
+        mel_wall = time.perf_counter() - started
+        print({
+            "B": size,
+            "checks/s": round(len(mels) / wall, 1),
+            "ms/batch": round(wall / batches * 1000, 1),
+            "mel_ms/batch": round(mel_wall / batches * 1000, 1),
+        })
+
+
+if __name__ == "__main__":
+    main()
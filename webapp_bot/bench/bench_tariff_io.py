@@ -0,0 +1,78 @@
+"""
+bench_tariff_io.py – системные вызовы чтения/записи на один POST /voice/tts
+==========================================================================
+Запрос уходит в пустой слот: срабатывают проверки лимита и тарифа
+(tariff_info / daily_gen_count), но синтеза нет – меряем только I/O
+вокруг тарифов. Счётчики syscr / syscw берутся из /proc/self/io (Linux).
+
+    python bench/bench_tariff_io.py [N]
+
+Режимы:
+  legacy  – JSON-backend + запись файла на каждое чтение (как было)
+  cold    – текущий код, кеш тарифов сбрасывается перед каждым запросом
+  warm    – текущий код, кеш прогрет
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+import server_bot as sb  # noqa: E402
+from state_store import JsonStore  # noqa: E402
+
+
+def io_counters() -> tuple[int, int]:
+    vals = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            k, v = line.split(":")
+            vals[k] = int(v)
+    return vals["syscr"], vals["syscw"]
+
+
+def legacy_record(uid: str) -> dict:
+    rec = sb._norm_tariff(sb.STORE.get("tariffs", uid))
+    sb.STORE.put("tariffs", uid, rec)
+    return rec
+
+
+def run(client, n: int, before_each=None) -> tuple[float, float]:
+    payload = {"userId": "bench", "text": "Привет!", "slot": 0}
+    client.post("/voice/tts", json=payload)  # прогрев
+    r0, w0 = io_counters()
+    for _ in range(n):
+        if before_each:
+            before_each()
+        client.post("/voice/tts", json=payload)
+    r1, w1 = io_counters()
+    # одно чтение /proc/self/io уже входит в r1 – вычитаем
+    return (r1 - r0 - 1) / n, (w1 - w0) / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    client = sb.app.test_client()
+    tmp = Path(tempfile.mkdtemp())
+    rows = []
+
+    orig_store, orig_record = sb.STORE, sb._tariff_record
+    sb.STORE = JsonStore({"tariffs": tmp / "tariffs_db.json"})
+    sb._tariff_record = legacy_record
+    rows.append(("legacy", *run(client, n)))
+    sb.STORE, sb._tariff_record = orig_store, orig_record
+
+    rows.append(("cold", *run(client, n, sb._TARIFF_CACHE.clear)))
+    rows.append(("warm", *run(client, n)))
+
+    print(f"{'mode':<8}{'read/req':>10}{'write/req':>11}")
+    for name, r, w in rows:
+        print(f"{name:<8}{r:>10.1f}{w:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
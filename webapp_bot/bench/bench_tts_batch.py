@@ -0,0 +1,114 @@
+"""
+bench_tts_batch.py – пропускная способность / задержка XTTS по размеру батча
+===========================================================================
+Для каждого размера батча B (1, 2, 4, 8, 16) одновременно отправляется
+B × rounds коротких фраз через MicroBatcher перед VoiceModule._infer_batch
+(B = 1 – прежний путь tts.inference без батчинга). Печатается:
+фраз/с, p50 / p95 задержки и RTF (секунд синтеза на секунду аудио).
+
+    python bench/bench_tts_batch.py --model D:/prdja --emb users_emb/<id>/speaker_embedding_0.npz
+    python bench/bench_tts_batch.py --synthetic      # только накладные расходы батчера
+
+По умолчанию считается на CPU (CUDA_VISIBLE_DEVICES="" выставляется до
+импорта torch); потоки torch – --threads.
+"""
+
+import argparse
+import concurrent.futures
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batching import MicroBatcher  # noqa: E402
+
+PHRASES = [
+    "Привет!",
+    "Как у вас дела сегодня?",
+    "Перезвоните мне, пожалуйста, после обеда.",
+    "Это тестовое сообщение для проверки синтеза.",
+]
+SIZES = (1, 2, 4, 8, 16)
+
+
+def run(infer_one, infer_batch, size: int, rounds: int, window: float, item):
+    batcher = MicroBatcher(infer_batch, window, size) if size > 1 else None
+    call = batcher.call if batcher else (lambda it: infer_one(*it))
+    latencies, audio_sec = [], 0.0
+
+    def one(i):
+        started = time.perf_counter()
+        wav = call(item(i))
+        return time.perf_counter() - started, len(wav)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(size) as ex:
+        for lat, n in ex.map(one, range(size * rounds)):
+            latencies.append(lat)
+            audio_sec += n / 24_000
+    wall = time.perf_counter() - started
+    if batcher:
+        batcher.close()
+    latencies.sort()
+    return {
+        "B": size,
+        "phrases/s": round(len(latencies) / wall, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000),
+        "rtf": round(wall / audio_sec, 3) if audio_sec else None,
+    }
+
+
+def synthetic():
+    """Модель пачки: 50 мс фикс. + 10 мс на элемент (вместо 60 мс поодиночке)."""
+    import numpy as np
+
+    def infer_one(*_):
+        time.sleep(0.06)
+        return np.zeros(24_000)
+
+    def infer_batch(items):
+        time.sleep(0.05 + 0.01 * len(items))
+        return [np.zeros(24_000) for _ in items]
+
+    return infer_one, infer_batch, lambda i: (PHRASES[i % len(PHRASES)],)
+
+
+def real(args):
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+    import torch
+    from voice_module import VoiceModule
+
+    torch.set_num_threads(args.threads)
+    vm = VoiceModule(args.model, ROOT / "users_emb")
+    vm.batcher = None
+    params = vm.get_user_params("bench")
+    g_latent, sp_emb = vm.emb_cache.get(args.emb)
+    item = lambda i: (PHRASES[i % len(PHRASES)], params, g_latent, sp_emb)  # noqa: E731
+    vm._infer_one(*item(0))  # прогрев
+    return vm._infer_one, vm._infer_batch, item
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=os.getenv("XTTS_MODEL_DIR", "D:/prdja"))
+    ap.add_argument("--emb")
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--window-ms", type=float, default=30)
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--synthetic", action="store_true")
+    args = ap.parse_args()
+    if not args.synthetic and not args.emb:
+        ap.error("--emb обязателен (или --synthetic)")
+
+    infer_one, infer_batch, item = synthetic() if args.synthetic else real(args)
+    for size in SIZES:
+        print(run(infer_one, infer_batch, size, args.rounds, args.window_ms / 1000, item))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+bench_xtts_profiles.py – скорость и качество профилей CPU-инференса XTTS
+========================================================================
+Один и тот же набор фраз синтезируется в каждом профиле (xtts_profile.py)
+с одинаковыми seed. fp32 считается всегда и служит эталоном. Печатается:
+RTF (секунд синтеза на секунду аудио; < 1 – быстрее реального времени)
+и mel_db – средняя |Δ| лог-мелов к fp32 после DTW-выравнивания
+(xtts_profile.mel_distance), в среднем по фразам.
+
+    python bench/bench_xtts_profiles.py --model D:/prdja --emb users_emb/<id>/speaker_embedding_0.npz
+    python bench/bench_xtts_profiles.py ... --profiles int8,int8-bf16 --threads 8 --out bench_out
+
+--out сохраняет WAV каждого профиля – порог mel_db для тарифа стоит
+подтверждать на слух. Считается на CPU (CUDA_VISIBLE_DEVICES="").
+"""
+
+import argparse
+import gc
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from audio_format import TTS_SAMPLE_RATE, pcm16, wav_header  # noqa: E402
+from xtts_profile import PROFILES, mel_distance  # noqa: E402
+
+PHRASES = [
+    "Привет!",
+    "Как у вас дела сегодня?",
+    "Перезвоните мне, пожалуйста, после обеда.",
+    "Это тестовое сообщение для проверки синтеза.",
+    "Ваш заказ номер сорок два будет доставлен завтра до полудня.",
+    "Не сообщайте никому код из смс, даже сотрудникам банка.",
+]
+
+
+def synth_all(vm, emb, params, seed: int):
+    import torch
+
+    g_latent, sp_emb = vm.emb_cache.get(emb)
+    wavs, took = [], 0.0
+    for i, text in enumerate(PHRASES):
+        torch.manual_seed(seed + i)
+        started = time.perf_counter()
+        wavs.append(vm._infer_one(text, params, g_latent, sp_emb))
+        took += time.perf_counter() - started
+    return wavs, took
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=os.getenv("XTTS_MODEL_DIR", "D:/prdja"))
+    ap.add_argument("--emb", required=True)
+    ap.add_argument("--profiles", default="int8,bf16,int8-bf16")
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    names = ["fp32"] + [p for p in args.profiles.split(",") if p and p != "fp32"]
+    unknown = [p for p in names if p not in PROFILES]
+    if unknown:
+        ap.error(f"неизвестные профили: {unknown}; есть: {list(PROFILES)}")
+
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+    import torch
+    import torchaudio
+    from voice_module import VoiceModule
+
+    torch.set_num_threads(args.threads)
+    mel = torchaudio.transforms.MelSpectrogram(
+        TTS_SAMPLE_RATE, n_fft=1024, hop_length=256, n_mels=80
+    )
+
+    def log_mel(wav):
+        spec = mel(torch.as_tensor(wav, dtype=torch.float32))
+        return (10 * torch.log10(spec.clamp_min(1e-10))).T.numpy()
+
+    reference = None
+    for name in names:
+        vm = VoiceModule(args.model, ROOT / "users_emb", profile=name)
+        vm.batcher = None
+        params = vm.get_user_params("bench")
+        synth_all(vm, args.emb, params, args.seed)  # прогрев
+        wavs, took = synth_all(vm, args.emb, params, args.seed)
+        audio_sec = sum(len(w) for w in wavs) / TTS_SAMPLE_RATE
+        mels = [log_mel(w) for w in wavs]
+        if reference is None:
+            reference = mels
+        row = {
+            "profile": name,
+            "effective": vm.profile.name,  # bf16 без поддержки CPU → без bf16
+            "rtf": round(took / audio_sec, 3),
+            "audio_sec": round(audio_sec, 1),
+            "mel_db": round(statistics.mean(
+                mel_distance(r, m) for r, m in zip(reference, mels)
+            ), 2),
+        }
+        print(row)
+        if args.out:
+            out = Path(args.out) / name
+            out.mkdir(parents=True, exist_ok=True)
+            for i, w in enumerate(wavs):
+                pcm = pcm16(w)
+                (out / f"{i:02d}.wav").write_bytes(wav_header(TTS_SAMPLE_RATE, len(pcm)) + pcm)
+        del vm
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,26 @@
 # bot_extra_commands.py
 # Дополнительные команды для Telegram-бота проекта Audio HighRes.
 
-import json
 import shutil
 from pathlib import Path
 from datetime import date
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
+from state_store import get_store
+from counters import get_counters
+from async_io import run_io
+from msglog import get_log_writer, read_history
 
 # Пути к базам данных
-TARIFFS_DB = "tariffs_db.json"
 USERS_EMB = Path("users_emb")
 SETTINGS_DB = "user_settings.json"
 
-def load_json(path: str) -> dict:
-    try:
-        with open(path, encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-
-def save_json(path: str, data: dict):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
 def get_tariff(uid: str) -> str:
-    tariffs = load_json(TARIFFS_DB)
-    return tariffs.get(uid, "free")
+    rec = get_store().get("tariffs", uid) or "free"
+    return rec if isinstance(rec, str) else rec.get("plan", "free")
 
 def daily_gen_count(uid: str) -> int:
-    meta = USERS_EMB / uid / "gen_meta.json"
-    if not meta.exists():
-        return 0
-    d = load_json(meta)
-    if d.get("date") != date.today().isoformat():
-        return 0
-    return d.get("count", 0)
+    return get_counters().get(uid)
 
 async def cmd_help(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
     help_message = (
@@ -45,7 +30,7 @@ async def cmd_help(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
         "/help — вывести это сообщение помощи.\n"
         "/about — информация о проекте.\n"
         "/stats — ваша статистика использования сервиса.\n"
-        "/history — ваша история последних запросов.\n"
+        "/history [N] [page K] [ГГГГ-ММ-ДД] — ваша история запросов.\n"
         "/feedback — отправить отзыв разработчикам.\n\n"
         "Отправьте голос для создания слепка.\n"
         "Отправьте текст, чтобы бот синтезировал речь."
@@ -65,7 +50,7 @@ async def cmd_about(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
 async def cmd_stats(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
     uid = str(upd.effective_user.id)
-    tariff = get_tariff(uid)
+    tariff = await run_io(get_tariff, uid)
     daily_gen = daily_gen_count(uid)
     
     stats_message = (
@@ -75,25 +60,63 @@ async def cmd_stats(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
     )
     await upd.message.reply_text(stats_message, parse_mode='Markdown')
 
+def _append_feedback(uid: str, text: str):
+    Path("feedbacks").mkdir(exist_ok=True)
+    with open(f"feedbacks/{uid}.txt", "a", encoding="utf-8") as f:
+        f.write(text + "\n")
+
 async def cmd_feedback(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
     feedback_text = ' '.join(ctx.args)
     if not feedback_text:
         await upd.message.reply_text("Используйте команду так: /feedback ваш отзыв.")
         return
     uid = str(upd.effective_user.id)
-    Path("feedbacks").mkdir(exist_ok=True)
-    with open(f"feedbacks/{uid}.txt", "a", encoding="utf-8") as f:
-        f.write(feedback_text + "\n")
+    await run_io(_append_feedback, uid, feedback_text)
     await upd.message.reply_text("✅ Ваш отзыв отправлен. Спасибо!")
 
+HISTORY_MAX = 50       # записей на страницу
+HISTORY_MAX_PAGE = 100
+
+def parse_history_args(args) -> dict | None:
+    """`/history 20`, `/history page 3`, `/history 2025-06-15` → kwargs read_history."""
+    opts = {"limit": 5, "page": 1, "day": None}
+    it = iter(args or [])
+    for tok in it:
+        if tok.lower() in {"page", "стр"}:
+            tok = next(it, "")
+            if not tok.isdigit() or not 1 <= int(tok) <= HISTORY_MAX_PAGE:
+                return None
+            opts["page"] = int(tok)
+        elif tok.isdigit() and 1 <= int(tok) <= HISTORY_MAX:
+            opts["limit"] = int(tok)
+        else:
+            try:
+                opts["day"] = date.fromisoformat(tok)
+            except ValueError:
+                return None
+    return opts
+
+def _history(user_dir: Path, opts: dict) -> list:
+    get_log_writer().flush(user_dir)  # свежие строки ещё могут быть в буфере
+    return read_history(user_dir, **opts)
+
 async def cmd_history(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
     uid = str(upd.effective_user.id)
-    log_file = USERS_EMB / uid / "message.log"
-    if not log_file.exists():
+    opts = parse_history_args(ctx.args)
+    if opts is None:
+        await upd.message.reply_text(
+            f"Используйте: /history [N≤{HISTORY_MAX}] [page K] [ГГГГ-ММ-ДД]"
+        )
+        return
+    lines = await run_io(_history, USERS_EMB / uid, opts)
+    if not lines:
         await upd.message.reply_text("📂 У вас пока нет истории.")
         return
-    with open(log_file, "r", encoding="utf-8") as f:
-        lines = f.readlines()[-5:]
-    history_text = "📝 *Последние запросы:*\n\n" + ''.join(lines)
+    title = "📝 *Последние запросы:*"
+    if opts["day"]:
+        title = f"📝 *Запросы за {opts['day'].isoformat()}, стр. {opts['page']}:*"
+    elif opts["page"] > 1:
+        title = f"📝 *Запросы, стр. {opts['page']}:*"
+    history_text = title + "\n\n" + ''.join(lines)[-3900:]  # лимит Telegram – 4096
     await upd.message.reply_text(history_text, parse_mode='Markdown')
 
@@ -3,7 +3,10 @@
 
 import asyncio
 from functools import lru_cache
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+from pathlib import Path
+from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification, pipeline
+
+from weights import load_into
 
 SAVE_PATH = r"D:\prdja\scam_classifier_finetuned"
 
@@ -22,10 +25,25 @@ id2label = {
 _PROMPT = "Определите, к какому типу мошенничества относится следующее сообщение:"
 
 
+def _load_model(path: str):
+    """model.safetensors (convert_safetensors.py) → веса из mmap, без копии в куче."""
+    st_path = Path(path) / "model.safetensors"
+    if not st_path.exists():
+        return AutoModelForSequenceClassification.from_pretrained(path)
+    mdl = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(path))
+    try:
+        load_into(mdl, st_path, getattr(mdl, "_keys_to_ignore_on_load_missing", None) or ())
+    except RuntimeError:  # старые имена ключей и т.п. – пусть разбирается transformers
+        # но из исходного pytorch_model.bin: сам from_pretrained взял бы тот же
+        # model.safetensors, на котором мы только что споткнулись
+        return AutoModelForSequenceClassification.from_pretrained(path, use_safetensors=False)
+    return mdl.train(False)  # как после from_pretrained – режим инференса
+
+
 class ScamClassifier:
     def __init__(self) -> None:
         tok = AutoTokenizer.from_pretrained(SAVE_PATH)
-        mdl = AutoModelForSequenceClassification.from_pretrained(SAVE_PATH)
+        mdl = _load_model(SAVE_PATH)
         self._clf = pipeline("text-classification", model=mdl, tokenizer=tok, top_k=None, device=0)
 
     async def analyse(self, text: str) -> dict[str, float]:
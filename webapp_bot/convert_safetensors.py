@@ -0,0 +1,87 @@
+"""
+convert_safetensors.py – чекпоинты моделей → safetensors (один раз, офлайн)
+===========================================================================
+•  XTTS      <XTTS_MODEL_DIR>/XTTS-v2/model.pth → model.safetensors
+             (state_dict уже в том виде, что ждёт Xtts.load_state_dict:
+             без префикса «xtts.» и ключей dvae / mel-спектрограмм тренера)
+•  classifier <SAVE_PATH>/pytorch_model.bin → model.safetensors
+•  PatentTTS models/patent_tts_net.pth → models/patent_tts_net.safetensors
+Загрузчики (voice_module, classifier, audio_checker) сами берут
+*.safetensors, если файл есть, и отображают его в память (weights.py);
+исходные чекпоинты можно оставить как запасной вариант.
+
+    python convert_safetensors.py                 # всё, пути по умолчанию
+    python convert_safetensors.py --only xtts --xtts-dir D:/prdja/XTTS-v2
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+from weights import save_safetensors, tensor_names
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# ключи тренера, которые Xtts.get_compatible_checkpoint_state_dict отбрасывает
+_XTTS_IGNORE = ("torch_mel_spectrogram_style_encoder", "torch_mel_spectrogram_dvae", "dvae")
+
+
+def _torch_load(path: Path):
+    import torch
+
+    return torch.load(path, map_location="cpu")  # nosec B614 – свой чекпоинт, офлайн
+
+
+def xtts_state_dict(checkpoint: dict) -> dict:
+    state = {}
+    for key, value in checkpoint["model"].items():
+        if key.startswith("xtts."):
+            key = key[len("xtts."):]
+        if key.split(".")[0] not in _XTTS_IGNORE:
+            state[key] = value
+    return state
+
+
+def convert(src: Path, dst: Path, extract=lambda sd: sd) -> None:
+    if not src.exists():
+        print(f"– {src}: нет файла, пропуск")
+        return
+    started = time.perf_counter()
+    state = extract(_torch_load(src))
+    if isinstance(state, dict) and "state_dict" in state:
+        state = state["state_dict"]
+    save_safetensors(state, dst, metadata={"source": src.name})
+    tensors = len(tensor_names(dst))
+    print(f"✓ {src} → {dst.name}: {tensors} тензоров, "
+          f"{dst.stat().st_size / 2**20:.0f} МБ, {time.perf_counter() - started:.1f} с")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--only", choices=("xtts", "classifier", "patent"))
+    ap.add_argument("--xtts-dir", default=Path(os.getenv("XTTS_MODEL_DIR", "D:/prdja")) / "XTTS-v2")
+    ap.add_argument("--classifier-dir", default=r"D:\prdja\scam_classifier_finetuned")
+    ap.add_argument("--patent", default=BASE_DIR / "models" / "patent_tts_net.pth")
+    args = ap.parse_args(argv)
+
+    jobs = {
+        "xtts": lambda: convert(
+            Path(args.xtts_dir) / "model.pth",
+            Path(args.xtts_dir) / "model.safetensors",
+            xtts_state_dict,
+        ),
+        "classifier": lambda: convert(
+            Path(args.classifier_dir) / "pytorch_model.bin",
+            Path(args.classifier_dir) / "model.safetensors",
+        ),
+        "patent": lambda: convert(Path(args.patent), Path(args.patent).with_suffix(".safetensors")),
+    }
+    for name, job in jobs.items():
+        if args.only in (None, name):
+            job()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
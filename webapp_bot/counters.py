@@ -0,0 +1,148 @@
+"""
+counters.py – дневные счётчики генераций
+========================================
+•  счётчики за сегодня живут в RAM; incr / get / reset – под одним lock,
+   поэтому атомарны для Flask-потоков и цикла бота одновременно
+•  смена суток – один проход: словарь просто заменяется пустым
+•  персистентность – append-only журнал «дата<TAB>uid<TAB>+n | =n»,
+   фоновый поток дописывает его раз в flush_interval секунд
+   (при падении теряется не больше одного интервала);
+   когда журнал разрастается, он сжимается до снимка текущего дня
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List
+
+
+class DailyCounters:
+    def __init__(
+        self,
+        journal: str | Path,
+        flush_interval: float = 1.0,
+        compact_after: int = 10_000,
+    ):
+        self.journal = Path(journal)
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._day = date.today()
+        self._counts: Dict[str, int] = {}
+        self._pending: List[str] = []
+        self._records = 0  # строк в журнале на диске
+        self._load()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="counters", daemon=True)
+        self._thread.start()
+
+    # ---------- public API ------------------------------------------- #
+    def get(self, uid: str) -> int:
+        with self._lock:
+            self._rollover()
+            return self._counts.get(uid, 0)
+
+    def incr(self, uid: str, n: int = 1) -> int:
+        with self._lock:
+            self._rollover()
+            value = self._counts[uid] = self._counts.get(uid, 0) + n
+            self._pending.append(f"{self._day.isoformat()}\t{uid}\t+{n}\n")
+            return value
+
+    def reset(self, uid: str) -> None:
+        with self._lock:
+            self._rollover()
+            self._counts.pop(uid, None)
+            self._pending.append(f"{self._day.isoformat()}\t{uid}\t=0\n")
+
+    def flush(self) -> None:
+        """Дописать накопленные записи в журнал (при необходимости – сжать)."""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                snapshot = None
+                if self._records + len(pending) > self.compact_after:
+                    snapshot = (self._day, dict(self._counts))
+            if snapshot:
+                self._compact(*snapshot)
+            elif pending:
+                with open(self.journal, "a", encoding="utf-8") as f:
+                    f.writelines(pending)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._records += len(pending)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def import_legacy(self, users_root: str | Path) -> int:
+        """Разово подтянуть сегодняшние users_emb/<id>/gen_meta.json."""
+        today = date.today().isoformat()
+        n = 0
+        for meta in Path(users_root).glob("*/gen_meta.json"):
+            try:
+                d = json.loads(meta.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if d.get("date") == today and d.get("count"):
+                self.incr(meta.parent.name, int(d["count"]))
+                n += 1
+        return n
+
+    # ---------- internal --------------------------------------------- #
+    def _rollover(self) -> None:
+        today = date.today()
+        if today != self._day:
+            self._day, self._counts = today, {}
+
+    def _load(self) -> None:
+        today = self._day.isoformat()
+        try:
+            f = open(self.journal, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                self._records += 1
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 3 or parts[0] != today:
+                    continue
+                _, uid, op = parts
+                if op.startswith("="):
+                    self._counts[uid] = int(op[1:])
+                else:
+                    self._counts[uid] = self._counts.get(uid, 0) + int(op)
+        self._counts = {k: v for k, v in self._counts.items() if v}
+
+    def _compact(self, day: date, counts: Dict[str, int]) -> None:
+        tmp = self.journal.with_name(self.journal.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(f"{day.isoformat()}\t{uid}\t={v}\n" for uid, v in counts.items())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal)
+        self._records = len(counts)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+@lru_cache
+def get_counters() -> DailyCounters:
+    journal = Path(os.getenv("GEN_JOURNAL", "gen_counters.journal"))
+    first_start = not journal.exists()
+    counters = DailyCounters(journal)
+    if first_start:
+        counters.import_legacy(os.getenv("USERS_EMB_DIR", "users_emb"))
+    atexit.register(counters.close)
+    return counters
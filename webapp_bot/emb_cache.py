@@ -0,0 +1,94 @@
+"""
+emb_cache.py – LRU готовых слепков голоса
+=========================================
+EmbeddingCache хранит результат loader(path) – для VoiceModule это пара
+тензоров (gpt_cond_latent, speaker_embedding) уже на нужном device.
+•  ключ – путь к *.npz; при каждом get() файл stat-ится, и если изменился
+   «штамп» (inode, mtime_ns, size), запись считается устаревшей.
+   Перезапись слота через rename/replace (tg_voice, /voice/embed) меняет
+   inode, поэтому кеш сбрасывается сам, без явных вызовов
+•  лимит – max_mb мегабайт суммарного размера тензоров; вытесняется
+   давно не использованный слепок
+•  hits / misses – для stats()
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Tuple
+
+Stamp = Tuple[int, int, int]
+
+
+def file_stamp(path: Path) -> Stamp:
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _nbytes(value: Any) -> int:
+    """Размер тензора / ndarray (или кортежа из них) в байтах."""
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    n = getattr(value, "nbytes", None)
+    if n is None and hasattr(value, "element_size"):
+        n = value.element_size() * value.nelement()
+    return int(n or 0)
+
+
+class EmbeddingCache:
+    def __init__(self, loader: Callable[[Path], Any], max_mb: float = 64.0):
+        self.loader = loader
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[Stamp, Any, int]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, path: str | Path) -> Any:
+        key = str(Path(path).resolve())
+        stamp = file_stamp(Path(key))  # FileNotFoundError – как и у np.load
+        with self._lock:
+            item = self._items.get(key)
+            if item and item[0] == stamp:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+        # грузим вне lock: параллельные синтезы других слепков не ждут
+        value = self.loader(Path(key))
+        size = _nbytes(value)
+        with self._lock:
+            self._drop(key)
+            if size <= self.max_bytes:
+                self._items[key] = (stamp, value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    self._drop(next(iter(self._items)))
+        return value
+
+    def invalidate(self, path: str | Path) -> None:
+        with self._lock:
+            self._drop(str(Path(path).resolve()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._items),
+                "mb": round(self._bytes / (1024 * 1024), 2),
+            }
+
+    def _drop(self, key: str) -> None:
+        item = self._items.pop(key, None)
+        if item:
+            self._bytes -= item[2]
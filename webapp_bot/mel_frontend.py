@@ -0,0 +1,150 @@
+"""
+mel_frontend.py – лог-мел признаки детектора подделок на torch
+==============================================================
+Повторяет цепочку, на которой учили PatentTTSNet:
+librosa.load(sr=16000) → feature.melspectrogram(n_mels=80, power=2)
+→ power_to_db(ref=np.max, top_db=80), но без librosa:
+•  mel_filterbank() – Slaney-мел, как librosa.filters.mel; считается один
+                      раз на набор параметров (lru_cache)
+•  load_audio()     – файл / байты → mono float32 нужной частоты:
+                      декодирование audio_format.decode_audio, ресемплер
+                      torchaudio создаётся один раз на пару частот
+•  log_mel()        – пачка сигналов разной длины → список [T_i, n_mels]:
+                      одно STFT на группу близких по длине (длиннейший ≤
+                      MAX_PAD_RATIO × кратчайший): короткий клип не считается
+                      на длину чужого длинного; хвосты дополнены нулями, и
+                      кадры клипа те же, что у librosa (pad_mode="constant"),
+                      ref=max и top_db – по каждому клипу отдельно
+Расхождение с librosa – сотые доли дБ (STFT во float32). После ресемплинга
+оно больше: librosa ресемплирует через soxr, здесь – windowed-sinc torchaudio.
+torch импортируется только внутри функций.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+from audio_format import decode_audio
+
+N_FFT = 2048
+HOP_LENGTH = 512
+TOP_DB = 80.0
+AMIN = 1e-10
+MAX_PAD_RATIO = 2.0  # сколько раз клип может быть «раздут» паддингом в пачке
+
+# шкала Slaney (librosa htk=False): линейная до 1 кГц, выше – логарифмическая
+_F_SP = 200.0 / 3
+_MIN_LOG_HZ = 1000.0
+_MIN_LOG_MEL = _MIN_LOG_HZ / _F_SP
+_LOGSTEP = np.log(6.4) / 27.0
+
+
+def hz_to_mel(f):
+    f = np.asanyarray(f, dtype=np.float64)
+    mel = f / _F_SP
+    log = f >= _MIN_LOG_HZ
+    return np.where(log, _MIN_LOG_MEL + np.log(np.maximum(f, _MIN_LOG_HZ) / _MIN_LOG_HZ) / _LOGSTEP, mel)
+
+
+def mel_to_hz(m):
+    m = np.asanyarray(m, dtype=np.float64)
+    f = m * _F_SP
+    log = m >= _MIN_LOG_MEL
+    return np.where(log, _MIN_LOG_HZ * np.exp(_LOGSTEP * (m - _MIN_LOG_MEL)), f)
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sr: int, n_fft: int = N_FFT, n_mels: int = 80) -> np.ndarray:
+    """[n_mels, 1 + n_fft // 2] float32, fmin=0, fmax=sr/2, norm="slaney"."""
+    fft_freqs = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    mel_f = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sr / 2.0), n_mels + 2))
+    fdiff = np.diff(mel_f)
+    ramps = np.subtract.outer(mel_f, fft_freqs)
+    weights = np.zeros((n_mels, len(fft_freqs)), dtype=np.float32)
+    for i in range(n_mels):
+        lower = -ramps[i] / fdiff[i]
+        upper = ramps[i + 2] / fdiff[i + 1]
+        weights[i] = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (mel_f[2:n_mels + 2] - mel_f[:n_mels]))[:, None]  # равная площадь
+    weights.flags.writeable = False  # общий для всех вызовов
+    return weights
+
+
+def load_audio(src, sr: int = 16_000):
+    """Путь или байты → torch.Tensor [N] float32 mono с частотой sr."""
+    import torch
+
+    data = bytes(src) if isinstance(src, (bytes, bytearray, memoryview)) else Path(src).read_bytes()
+    samples, rate = decode_audio(data, sr)
+    wav = torch.from_numpy(samples)
+    if rate != sr:
+        with torch.no_grad():
+            wav = _resampler(rate, sr)(wav)
+    return wav
+
+
+def log_mel(
+    waves: Sequence,
+    sr: int = 16_000,
+    n_mels: int = 80,
+    n_fft: int = N_FFT,
+    hop_length: int = HOP_LENGTH,
+    top_db: float = TOP_DB,
+) -> List["torch.Tensor"]:  # noqa: F821
+    """Сигналы [N_i] → лог-мелы [1 + N_i // hop_length, n_mels] в дБ (макс. = 0)."""
+    import torch
+
+    waves = [torch.as_tensor(w, dtype=torch.float32).reshape(-1) for w in waves]
+    out: list = [None] * len(waves)
+    for group in length_groups([len(w) for w in waves]):
+        batch = torch.nn.utils.rnn.pad_sequence(
+            [waves[i] for i in group], batch_first=True
+        )  # [B, N]
+        window, basis = _consts(sr, n_fft, n_mels, str(batch.device))
+        with torch.no_grad():
+            spec = torch.stft(
+                batch, n_fft, hop_length, window=window, center=True,
+                pad_mode="constant", return_complex=True,
+            )
+            power = spec.real.square() + spec.imag.square()        # [B, F, T]
+            db = 10.0 * torch.log10(torch.matmul(basis, power).clamp_min(AMIN))
+        for row, i in enumerate(group):
+            m = db[row, :, : 1 + len(waves[i]) // hop_length]
+            m = (m - m.max()).clamp_min(-top_db)  # ref=np.max, потом top_db
+            out[i] = m.T.contiguous()
+    return out
+
+
+def length_groups(lengths: Sequence[int], ratio: float = MAX_PAD_RATIO) -> List[List[int]]:
+    """Индексы, сгруппированные по длине: в группе длиннейший ≤ ratio × кратчайший."""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    groups: List[List[int]] = []
+    for i in order:
+        if groups and lengths[i] <= ratio * max(1, lengths[groups[-1][0]]):
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+
+# ────────────────────────────────────────
+# helpers
+# ────────────────────────────────────────
+@lru_cache(maxsize=8)
+def _resampler(orig_sr: int, sr: int):
+    import torchaudio
+
+    return torchaudio.transforms.Resample(orig_sr, sr)  # sinc-ядро – один раз
+
+
+@lru_cache(maxsize=8)
+def _consts(sr: int, n_fft: int, n_mels: int, device: str):
+    import torch
+
+    window = torch.hann_window(n_fft, periodic=True, device=device)
+    basis = torch.from_numpy(mel_filterbank(sr, n_fft, n_mels).copy()).to(device)
+    return window, basis
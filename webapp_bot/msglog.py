@@ -0,0 +1,317 @@
+"""
+msglog.py – журнал сообщений users_emb/<id>/message.log
+=======================================================
+•  MessageLogWriter – write() только кладёт строку в буфер пользователя;
+                      фоновый поток дописывает буферы раз в flush_interval
+                      секунд (или сразу, если набралось flush_lines строк)
+•  ротация          – при превышении max_bytes или смене даты активный лог
+                      сжимается в message.<YYYYmmdd-HHMMSS>-<nnn>.log.gz
+                      (по умолчанию сегменты хранятся все; keep_segments /
+                      MSGLOG_KEEP_SEGMENTS – удалять старше N последних)
+•  message.log.idx  – смещения начала строк активного лога (uint64 LE),
+                      по нему read_history() читает хвост без чтения файла
+                      целиком и ищет границы дня бинарным поиском
+•  read_history()   – страница истории (limit / page / день); память –
+                      O(limit × page), от размера журнала не зависит
+"""
+
+from __future__ import annotations
+
+import atexit
+import gzip
+import os
+import shutil
+import struct
+import threading
+from collections import deque
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LOG_NAME = "message.log"
+IDX_NAME = "message.log.idx"
+SEGMENT_GLOB = "message.*.log.gz"
+OFFSET = struct.Struct("<Q")
+
+# запись / ротация и чтение активного лога – под одним замком: иначе
+# read_history() может открыть индекс от старого лога, а лог – уже новый
+_FS_LOCK = threading.Lock()
+
+
+# ────────────────────────────────────────
+# writer
+# ────────────────────────────────────────
+class MessageLogWriter:
+    def __init__(
+        self,
+        flush_interval: float = 2.0,
+        flush_lines: int = 64,
+        max_bytes: int = 1 << 20,
+        rotate_daily: bool = True,
+        keep_segments: Optional[int] = None,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_lines = flush_lines
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.keep_segments = keep_segments  # None / 0 – ничего не удалять
+        self._buf: Dict[Path, List[str]] = {}
+        self._buf_lock = threading.Lock()
+        self._io_lock = _FS_LOCK
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread: threading.Thread | None = None
+
+    # ---------- public API ------------------------------------------- #
+    def write(self, folder: Path, line: str) -> None:
+        """Добавить строку «[ts] line» в буфер пользователя (без диска)."""
+        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._buf_lock:
+            lines = self._buf.setdefault(Path(folder), [])
+            # одна запись = одна строка, иначе индекс смещений «поедет»
+            lines.append(f"[{ts}] " + line.replace("\r", "").replace("\n", "\\n"))
+            full = len(lines) >= self.flush_lines
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def flush(self, folder: Path | None = None) -> None:
+        """Сбросить буфер одного пользователя (или всех) на диск."""
+        with self._buf_lock:
+            if folder is None:
+                pending, self._buf = self._buf, {}
+            else:
+                pending = {Path(folder): self._buf.pop(Path(folder), [])}
+        with self._io_lock:
+            for f, lines in pending.items():
+                if lines:
+                    self._append(f, lines)
+
+    def close(self) -> None:
+        self._stop = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    # ---------- internal --------------------------------------------- #
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name="msglog", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _append(self, folder: Path, lines: List[str]) -> None:
+        folder.mkdir(parents=True, exist_ok=True)
+        self._maybe_rotate(folder)
+        log, idx = folder / LOG_NAME, folder / IDX_NAME
+        if log.exists() and not idx.exists():
+            _rebuild_index(log, idx)  # лог, записанный до появления индекса
+        data = bytearray()
+        offsets = []
+        with open(log, "ab") as f:
+            pos = f.tell()
+            for line in lines:
+                offsets.append(pos + len(data))
+                data += line.encode("utf-8") + b"\n"
+            f.write(data)
+        with open(idx, "ab") as f:
+            f.write(b"".join(OFFSET.pack(o) for o in offsets))
+
+    def _maybe_rotate(self, folder: Path) -> None:
+        log = folder / LOG_NAME
+        try:
+            st = log.stat()
+        except FileNotFoundError:
+            return
+        if st.st_size == 0:
+            return
+        too_big = st.st_size >= self.max_bytes
+        new_day = self.rotate_daily and date.fromtimestamp(st.st_mtime) != date.today()
+        if not (too_big or new_day):
+            return
+        stamp = datetime.fromtimestamp(st.st_mtime).strftime("%Y%m%d-%H%M%S")
+        n = 0  # порядковый номер: сегменты одной секунды сортируются по имени
+        while (dst := folder / f"message.{stamp}-{n:03d}.log.gz").exists():
+            n += 1
+        with open(log, "rb") as src, gzip.open(dst, "wb") as out:
+            shutil.copyfileobj(src, out)
+        log.unlink()
+        (folder / IDX_NAME).unlink(missing_ok=True)
+        if self.keep_segments:
+            for old in segments(folder)[:-self.keep_segments]:
+                old.unlink(missing_ok=True)
+
+
+def _rebuild_index(log: Path, idx: Path) -> None:
+    offsets = []
+    pos = 0
+    with open(log, "rb") as f:
+        for raw in f:
+            offsets.append(pos)
+            pos += len(raw)
+    with open(idx, "wb") as f:
+        f.write(b"".join(OFFSET.pack(o) for o in offsets))
+
+
+# ────────────────────────────────────────
+# reader
+# ────────────────────────────────────────
+def segments(folder: Path) -> List[Path]:
+    """Сжатые сегменты пользователя, от старых к новым."""
+    return sorted(Path(folder).glob(SEGMENT_GLOB))
+
+
+def last_lines(folder: Path, n: int) -> List[str]:
+    """Последние n строк журнала (активный лог + при нехватке – сегменты)."""
+    return read_history(folder, limit=n)
+
+
+def read_history(
+    folder: Path, limit: int = 5, page: int = 1, day: Optional[date] = None
+) -> List[str]:
+    """
+    Страница истории в хронологическом порядке: page=1 – последние `limit`
+    записей, page=2 – предыдущие и т.д. `day` оставляет только записи дня.
+    """
+    folder = Path(folder)
+    need = limit * page
+    with _FS_LOCK:
+        found, first_day = _active_tail(folder, need, day)
+        segs = segments(folder)
+    prefix = f"[{day.isoformat()}" if day else None
+    # сегменты старше активного лога; при фильтре по дню – только если
+    # активный лог не начинается позже нужного дня
+    if len(found) < need and not (day and first_day and first_day < day):
+        for seg in reversed(segs):
+            if day and _segment_day(seg) < day:
+                break  # дальше только более старые записи
+            try:
+                with gzip.open(seg, "rt", encoding="utf-8") as f:
+                    lines = f if prefix is None else (l for l in f if l.startswith(prefix))
+                    tail = deque(lines, maxlen=need - len(found))
+            except FileNotFoundError:  # удалён ротацией (keep_segments) после списка
+                continue
+            found = list(tail) + found
+            if len(found) >= need:
+                break
+    end = max(0, len(found) - limit * (page - 1))
+    return found[max(0, end - limit):end]
+
+
+def _segment_day(seg: Path) -> date:
+    # message.<YYYYmmdd-HHMMSS>-<nnn>.log.gz – время последней записи сегмента
+    return datetime.strptime(seg.name.split(".")[1][:8], "%Y%m%d").date()
+
+
+def _entry_day(raw: bytes) -> Optional[date]:
+    try:
+        return date.fromisoformat(raw[1:11].decode("ascii"))
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def _active_tail(
+    folder: Path, need: int, day: Optional[date]
+) -> Tuple[List[str], Optional[date]]:
+    """До `need` последних записей активного лога + день первой записи."""
+    log, idx = folder / LOG_NAME, folder / IDX_NAME
+    if not log.exists():
+        return [], None
+    if not idx.exists():
+        return _active_tail_reverse(log, need, day)
+
+    count = idx.stat().st_size // OFFSET.size
+    if count == 0:
+        return [], None
+    with open(idx, "rb") as fi, open(log, "rb") as fl:
+
+        def offset(i: int) -> int:
+            fi.seek(i * OFFSET.size)
+            return OFFSET.unpack(fi.read(OFFSET.size))[0]
+
+        def day_of(i: int) -> Optional[date]:
+            fl.seek(offset(i))
+            return _entry_day(fl.read(11))
+
+        def bisect(pred) -> int:  # первая запись, для которой pred() истинно
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                d = day_of(mid)
+                if d is not None and pred(d):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            return lo
+
+        first_day = day_of(0)
+        lo, hi = 0, count
+        if day:
+            lo = bisect(lambda d: d >= day)
+            hi = bisect(lambda d: d > day)
+        start = max(lo, hi - need)
+        if start >= hi:
+            return [], first_day
+        fl.seek(offset(start))
+        data = fl.read(offset(hi) - offset(start)) if hi < count else fl.read()
+    return [l.decode("utf-8") + "\n" for l in data.splitlines()], first_day
+
+
+def _active_tail_reverse(
+    log: Path, need: int, day: Optional[date]
+) -> Tuple[List[str], Optional[date]]:
+    """Лог без индекса (старый формат): читаем блоками с конца файла."""
+    out: List[str] = []
+    last_day = None
+    for raw in _reverse_lines(log):
+        d = _entry_day(raw)
+        last_day = d or last_day
+        if day and d:
+            if d > day:
+                continue
+            if d < day:
+                return out[::-1], d
+        out.append(raw.decode("utf-8", "replace") + "\n")
+        if len(out) >= need:
+            break
+    return out[::-1], None if len(out) >= need else last_day
+
+
+def _reverse_lines(path: Path, block: int = 8192) -> Iterator[bytes]:
+    """Непустые строки файла от последней к первой; память – O(block)."""
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b"\n")
+            rest = lines.pop(0)  # возможно неполная – ждём следующий блок
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if rest:
+            yield rest
+
+
+# ────────────────────────────────────────
+# общий экземпляр
+# ────────────────────────────────────────
+@lru_cache
+def get_log_writer() -> MessageLogWriter:
+    writer = MessageLogWriter(
+        flush_interval=float(os.getenv("MSGLOG_FLUSH_SEC", "2")),
+        max_bytes=int(os.getenv("MSGLOG_MAX_BYTES", str(1 << 20))),
+        keep_segments=int(os.getenv("MSGLOG_KEEP_SEGMENTS", "0")) or None,
+    )
+    atexit.register(writer.close)
+    return writer
@@ -0,0 +1,156 @@
+"""
+readiness.py – фоновая загрузка моделей и готовность сервиса
+============================================================
+•  LazyModel     – loader() выполняется один раз в фоновом потоке;
+                   get(timeout) ждёт результата (не дождались / загрузка
+                   упала → ModelNotReady), await wait() – то же для asyncio,
+                   peek() – модель или None, без ожидания
+•  ModelProxy    – заместитель объекта модели: атрибуты берутся у модели
+                   в момент обращения (с ожиданием загрузки), поэтому его
+                   можно держать там, где раньше лежал готовый объект
+•  ModelRegistry – именованные модели; start() запускает загрузку eager-
+                   моделей (остальные – при первом get / wait); status() –
+                   для /healthz и /readyz: состояние, время прогрева, ошибка
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("readiness")
+
+
+class ModelNotReady(RuntimeError):
+    """Модель ещё грузится (или загрузка упала) – запрос стоит повторить позже."""
+
+    def __init__(self, name: str, state: str):
+        super().__init__(f"model {name!r} is {state}")
+        self.name = name
+        self.state = state
+
+
+class LazyModel:
+    def __init__(
+        self, name: str, loader: Callable[[], Any], required: bool = True, eager: bool = True
+    ):
+        self.name = name
+        self.loader = loader
+        self.required = required  # без неё /readyz отвечает 503
+        self.eager = eager        # грузить при старте сервиса, а не по запросу
+        self._future: concurrent.futures.Future = concurrent.futures.Future()
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._load_sec: Optional[float] = None
+
+    # ---------- public API ------------------------------------------- #
+    def start(self) -> "LazyModel":
+        """Запустить загрузку (повторные вызовы ничего не делают)."""
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+                # RUNNING: отменённый await в хендлере не отменит общую загрузку
+                self._future.set_running_or_notify_cancel()
+                threading.Thread(
+                    target=self._load, name=f"load-{self.name}", daemon=True
+                ).start()
+        return self
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        self.start()
+        try:
+            return self._future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise ModelNotReady(self.name, self.state) from None
+        except Exception as e:
+            raise ModelNotReady(self.name, self.state) from e
+
+    async def wait(self) -> Any:
+        self.start()
+        try:
+            return await asyncio.wrap_future(self._future)
+        except Exception as e:
+            raise ModelNotReady(self.name, self.state) from e
+
+    def peek(self) -> Any:
+        return self._future.result() if self.ready else None
+
+    @property
+    def ready(self) -> bool:
+        return self._future.done() and self._future.exception() is None
+
+    @property
+    def state(self) -> str:
+        if self._started is None:
+            return "idle"
+        if not self._future.done():
+            return "loading"
+        return "failed" if self._future.exception() else "ready"
+
+    def status(self) -> dict:
+        st: Dict[str, Any] = {
+            "state": self.state,
+            "required": self.required,
+            "load_sec": self._load_sec,
+        }
+        if st["state"] == "loading":
+            st["loading_sec"] = round(time.monotonic() - self._started, 1)
+        elif st["state"] == "failed":
+            e = self._future.exception()
+            st["error"] = f"{type(e).__name__}: {e}"
+        return st
+
+    # ---------- internal --------------------------------------------- #
+    def _load(self) -> None:
+        try:
+            value = self.loader()
+        except BaseException as e:
+            self._load_sec = round(time.monotonic() - self._started, 3)
+            logger.exception("Модель %s не загрузилась", self.name)
+            self._future.set_exception(e)
+            return
+        self._load_sec = round(time.monotonic() - self._started, 3)
+        logger.info("Модель %s готова за %.1f с", self.name, self._load_sec)
+        self._future.set_result(value)
+
+
+class ModelProxy:
+    """Атрибуты загруженной модели; присвоенные самому прокси – перекрывают их."""
+
+    def __init__(self, model: LazyModel):
+        self._model = model
+
+    def __getattr__(self, item: str) -> Any:
+        if item.startswith("__"):  # pickle / copy не должны ждать загрузки
+            raise AttributeError(item)
+        return getattr(self._model.get(), item)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models: Dict[str, LazyModel] = {}
+
+    def register(
+        self, name: str, loader: Callable[[], Any], *, required: bool = True, eager: bool = True
+    ) -> LazyModel:
+        model = self._models[name] = LazyModel(name, loader, required, eager)
+        return model
+
+    def __getitem__(self, name: str) -> LazyModel:
+        return self._models[name]
+
+    def start(self) -> None:
+        """Запустить загрузку eager-моделей – каждая в своём потоке."""
+        for model in self._models.values():
+            if model.eager:
+                model.start()
+
+    def ready(self) -> bool:
+        return all(m.ready for m in self._models.values() if m.required)
+
+    def status(self) -> Dict[str, dict]:
+        return {name: m.status() for name, m in self._models.items()}
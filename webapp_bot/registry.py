@@ -0,0 +1,79 @@
+"""
+registry.py – множества id из текстовых файлов (blacklist / authorized users)
+=============================================================================
+Файл читается один раз в set; проверка `uid in reg` – O(1) без диска.
+Внешние правки подхватываются по (mtime, size), но stat делается
+не чаще одного раза в `check_interval` секунд. Дописывает в файл только
+сам реестр – под общим lock, поэтому строки не перемешиваются.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class IdRegistry:
+    def __init__(self, path: str | Path, check_interval: float = 2.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._ids: set[str] = set()
+        self._stamp: tuple[int, int] | None = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    # ---------- public API ------------------------------------------- #
+    def __contains__(self, uid: str) -> bool:
+        self._maybe_reload()
+        return uid in self._ids
+
+    def __len__(self) -> int:
+        self._maybe_reload()
+        return len(self._ids)
+
+    def add(self, uid: str) -> bool:
+        """Дописать id в файл. False, если он уже был в реестре."""
+        with self._lock:
+            self._maybe_reload(locked=True)
+            if uid in self._ids:
+                return False
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(uid + "\n")
+            self._ids.add(uid)
+            self._stamp = self._stat()
+            return True
+
+    def reload(self) -> None:
+        """Перечитать файл целиком (при старте и после внешней правки)."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                ids = {l.strip() for l in f if l.strip()}
+        except FileNotFoundError:
+            ids = set()
+        self._ids = ids
+        self._stamp = self._stat()
+        self._checked = time.monotonic()
+
+    # ---------- internal --------------------------------------------- #
+    def _stat(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _maybe_reload(self, locked: bool = False) -> None:
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        if self._stat() == self._stamp:
+            return
+        if locked:
+            self.reload()
+        else:
+            with self._lock:
+                self.reload()
@@ -0,0 +1,80 @@
+"""
+segmenter.py – длинный текст → короткие сегменты для XTTS
+=========================================================
+•  split_text() – режет по границам предложений и упаковывает их в сегменты
+                  не длиннее бюджета (по умолчанию – символы; VoiceModule
+                  передаёт подсчёт токенов своего токенизатора). Предложение
+                  длиннее бюджета режется по , ; : – и, в крайнем случае, по словам
+•  crossfade()  – склейка синтезированных сегментов с коротким
+                  равномощным перекрытием, без щелчков на стыках
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+# конец предложения: . ! ? … (возможно, с закрывающей кавычкой), затем пробел
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"»)]))\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+|\s+(?=[—–-]\s)")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text.strip()) if s.strip()]
+
+
+def _split_long(piece: str, budget: int, length: Callable[[str], int]) -> List[str]:
+    """Одно слишком длинное предложение → части по запятым, затем по словам."""
+    for sep in (_CLAUSE_END, re.compile(r"\s+")):
+        parts = [p for p in sep.split(piece) if p.strip()]
+        if len(parts) > 1:
+            return _pack(parts, budget, length)
+    return [piece]  # одно «слово» длиннее бюджета – отдаём как есть
+
+
+def _pack(pieces: Sequence[str], budget: int, length: Callable[[str], int]) -> List[str]:
+    out: List[str] = []
+    cur = ""
+    for piece in pieces:
+        if length(piece) > budget:
+            if cur:
+                out.append(cur)
+                cur = ""
+            out.extend(_split_long(piece, budget, length))
+            continue
+        cand = f"{cur} {piece}" if cur else piece
+        if length(cand) <= budget:
+            cur = cand
+        else:
+            out.append(cur)
+            cur = piece
+    if cur:
+        out.append(cur)
+    return out
+
+
+def split_text(
+    text: str, budget: int = 180, length: Callable[[str], int] = len
+) -> List[str]:
+    """Сегменты в исходном порядке; каждый – целые предложения в пределах бюджета."""
+    return _pack(split_sentences(text), budget, length)
+
+
+def crossfade(parts: Sequence[np.ndarray], sample_rate: int, fade_ms: float = 30.0) -> np.ndarray:
+    """Склеить сегменты (1-D float) с перекрытием fade_ms."""
+    parts = [np.asarray(p, dtype=np.float32).reshape(-1) for p in parts]
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+    out = parts[0]
+    fade = int(sample_rate * fade_ms / 1000)
+    for p in parts[1:]:
+        n = min(fade, len(out), len(p))
+        if n == 0:
+            out = np.concatenate([out, p])
+            continue
+        t = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+        mixed = out[-n:] * np.cos(t) + p[:n] * np.sin(t)
+        out = np.concatenate([out[:-n], mixed, p[n:]])
+    return out
@@ -7,7 +7,8 @@
 # • Anti-scam-классификатор (classifier.py)
 # • XTTS-clone / synthesis  (voice_module.py)
 # • Логи users_emb/<id>/message.log  +  strikes / blacklist
-# • Тарифы/лимиты           tariffs_db.json   (free/base/vip/premium)
+# • Тарифы/лимиты           user_state.sqlite3 (free/base/vip/premium)
+# • Модели грузятся в фоне  (readiness.py) – GET /healthz, /readyz
 # -------------------------------------------------------------------------------
 # Запуск:
 #   1)  export BOT_TOKEN="123456:ABC-DEF…"   # либо .env
@@ -21,11 +22,12 @@ import json
 import shutil
 import subprocess
 import threading
-import tempfile
 import asyncio
-import concurrent.futures
+import atexit
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
-from datetime import datetime, date
 from types import MethodType
 
 from dotenv import load_dotenv
@@ -49,7 +51,6 @@ from telegram import (
 )
 
 # для безопасной отправки аудио
-from telegram.error import TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -59,10 +60,23 @@ from telegram.ext import (
     filters,
 )
 
-from audio_checker import predict
 from classifier import get_classifier
-from voice_module import VoiceModule
-from pydub import AudioSegment
+from state_store import get_store
+from registry import IdRegistry
+from autodelete import DeletionScheduler
+from async_io import run_io, LoopLagMonitor
+from batching import MicroBatcher
+from readiness import ModelNotReady, ModelProxy, ModelRegistry
+from msglog import get_log_writer
+from counters import get_counters
+from tts_cache import get_tts_cache
+from voice_workers import VoiceWorkerPool
+from xtts_profile import get_profile
+from synthesis import SynthesisRequest, TTS_KEYS
+import slots
+from audio_format import (
+    OUTPUT_FORMATS, TTS_SAMPLE_RATE, encode_audio, output_format, wav_header,
+)
 from bot_extra_commands import cmd_help, cmd_about, cmd_stats, cmd_feedback, cmd_history
 
 # ───────────────────────── конфигурация
@@ -76,12 +90,15 @@ LT_CMD_ENV = os.getenv("LT_CMD")
 XTTS_MODEL_DIR = Path(os.getenv("XTTS_MODEL_DIR", "D:/prdja"))
 
 # все «постоянные» файлы / папки теперь настраиваются извне
-SETTINGS_DB = os.getenv("SETTINGS_DB", "user_settings.json")
-TARIFFS_DB = os.getenv("TARIFFS_DB", "tariffs_db.json")
 AUTH_FILE = os.getenv("AUTH_FILE", "authorized_users.txt")
-STRIKES_DB = os.getenv("STRIKES_DB", "user_strikes.json")
 BL_FILE = os.getenv("BLACKLIST_FILE", "blacklist.txt")
 USERS_EMB = Path(os.getenv("USERS_EMB_DIR", "users_emb"))
+# тарифы / настройки / strikes: SQLite (STATE_DB) или JSON (STATE_BACKEND=json);
+# старые *.json (SETTINGS_DB / TARIFFS_DB / STRIKES_DB, state_store.LEGACY_FILES)
+# импортируются в SQLite при первом запуске
+STORE = get_store()
+# дневные счётчики генераций: RAM + журнал GEN_JOURNAL (counters.py)
+COUNTERS = get_counters()
 
 # числа приводим к нужному типу
 MAX_STRIKES = int(os.getenv("MAX_STRIKES", "5"))
@@ -103,118 +120,119 @@ TARIFF_DEFS = {
     "vip": {"slots": 6, "daily_gen": 60},
     "premium": {"slots": 12, "daily_gen": 9999},
 }
+# битрейт Opus (кбит/с) для отдаваемой речи; MP3 – вдвое выше
+TARIFF_KBPS = {"free": 24, "base": 32, "vip": 48, "premium": 64}
+# профиль CPU-инференса XTTS (xtts_profile.py) по тарифу, env вида
+# «free:int8,base:int8»; не указанные планы – XTTS_PROFILE. Действует только
+# с репликами (VOICE_WORKERS > 0): на каждый профиль – свой пул реплик
+DEFAULT_PROFILE = get_profile().name
+TARIFF_PROFILES = {
+    plan: get_profile(name).name
+    for plan, name in (
+        item.split(":", 1)
+        for item in os.getenv("XTTS_TARIFF_PROFILES", "").replace(" ", "").split(",")
+        if item
+    )
+}
 
 # ───────── ensure files / dirs
-for path, default in [
-    (SETTINGS_DB, {}),
-    (TARIFFS_DB, {}),
-    (STRIKES_DB, {}),
-    (AUTH_FILE, None),
-]:
-    if not Path(path).exists():
-        with open(path, "w", encoding="utf-8") as f:
-            if default is not None:
-                json.dump(default, f)
 USERS_EMB.mkdir(exist_ok=True)
+Path(AUTH_FILE).touch(exist_ok=True)
 Path(BL_FILE).touch(exist_ok=True)
 
+# id-реестры в RAM; внешние правки файлов подхватываются по mtime
+BLACKLIST = IdRegistry(BL_FILE)
+AUTHORIZED = IdRegistry(AUTH_FILE)
+
 
 # ───────────────────────── helpers
 # ───────── тарифы: вспомогательные функции  ← вставить здесь
 def set_tariff_safe(uid: str, name: str) -> str:
     """
-    Валидирует имя тарифа и записывает его в tariffs_db.json.
+    Валидирует имя тарифа и записывает его в хранилище тарифов.
     Возвращает фактически установленный план (или прежний, если ошибка).
     """
     if name not in TARIFF_DEFS:  # неизвестный план
         return get_tariff(uid)  # ничего не меняем
-    db = load_json(TARIFFS_DB)
-    rec = db.get(uid)
-    if isinstance(rec, str):
-        rec = {"plan": name, "bonus_gen": 0}
-    else:
-        rec = rec or {"bonus_gen": 0}
-        rec["plan"] = name
-    db[uid] = rec
-    save_json(TARIFFS_DB, db)
+    set_tariff(uid, name)
     return name
 
 
-# ---- какие поля из user_settings.json можно отдавать в VoiceModule
-ALLOWED_TTS_KEYS = {
-    "temperature",
-    "top_k",
-    "top_p",
-    "repetition_penalty",
-    "length_penalty",
-    "speed",
-}
-
-
-def apply_user_settings(uid: str) -> None:
+def tts_request(uid: str, text: str, emb: Path, raw: dict | None = None) -> SynthesisRequest:
     """
-    Берём сохранённые настройки пользователя, отфильтровываем
-    только TTS-параметры и передаём их в VoiceModule.
+    Неизменяемый запрос на синтез: слепок + TTS-параметры из сохранённых
+    настроек пользователя (или уже загруженных `raw`). VOICE не меняется.
     """
-    raw = load_json(SETTINGS_DB).get(uid)
-    if not raw:
-        return
-    overrides = {k: raw[k] for k in ALLOWED_TTS_KEYS if k in raw}
-    if overrides:
-        VOICE.set_user_params(uid, **overrides)
+    if raw is None:
+        raw = STORE.get("settings", uid)
+    params = {k: v for k, v in (raw or {}).items() if k in TTS_KEYS}
+    return SynthesisRequest.create(uid, text, emb, params)
 
 
-def load_json(p: str) -> dict:
-    try:
-        with open(p, encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-
-
-def save_json(p: str, d: dict) -> None:
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(d, f, ensure_ascii=False, indent=2)
-
 def toggle_filter(uid: str) -> bool:
     """Переключить антискам-фильтр. Возвращает новое состояние."""
-    db = load_json(SETTINGS_DB)
-    cfg = db.get(uid, {})
-    state = not cfg.get("filter_off", False)
-    cfg["filter_off"] = state
-    db[uid] = cfg
-    save_json(SETTINGS_DB, db)
-    return state
+
+    def flip(cfg):
+        cfg = cfg or {}
+        cfg["filter_off"] = not cfg.get("filter_off", False)
+        return cfg
+
+    return STORE.update("settings", uid, flip)["filter_off"]
 
 def is_blacklisted(uid: str) -> bool:
-    with open(BL_FILE, encoding="utf-8") as f:
-        return uid in {l.strip() for l in f}
+    return uid in BLACKLIST
 
 
 def add_black(uid: str):
-    if not is_blacklisted(uid):
-        with open(BL_FILE, "a", encoding="utf-8") as f:
-            f.write(uid + "\n")
+    BLACKLIST.add(uid)
 
 
 def add_strike(uid: str) -> int:
-    d = load_json(STRIKES_DB)
-    d[uid] = d.get(uid, 0) + 1
-    save_json(STRIKES_DB, d)
-    return d[uid]
+    return STORE.incr("strikes", uid)
 
-def _tariff_record(uid: str) -> dict:
-    """Возвращает запись из tariffs_db.json, создавая при необходимости."""
-    db = load_json(TARIFFS_DB)
-    rec = db.get(uid)
+
+def _norm_tariff(rec) -> dict:
+    """Старый формат (строка-план) / пустая запись → {"plan", "bonus_gen"}."""
     if isinstance(rec, str):
         rec = {"plan": rec, "bonus_gen": 0}
-    if not rec:
-        rec = {"plan": "free", "bonus_gen": 0}
-    if "bonus_gen" not in rec:
-        rec["bonus_gen"] = 0
-    db[uid] = rec
-    save_json(TARIFFS_DB, db)
+    rec = dict(rec or {"plan": "free"})
+    rec.setdefault("plan", "free")
+    rec.setdefault("bonus_gen", 0)
+    return rec
+
+
+# ───────── кеш тарифов: чтение без диска, запись – сквозная (write-through);
+# LRU на TARIFF_CACHE_SIZE пользователей – давно не заходившие вытесняются
+_TARIFF_CACHE: "OrderedDict[str, dict]" = OrderedDict()
+_TARIFF_CACHE_SIZE = int(os.getenv("TARIFF_CACHE_SIZE", "10000"))
+_TARIFF_LOCK = threading.Lock()
+
+
+def _tariff_cache_put(uid: str, rec: dict) -> None:
+    """Положить запись в кеш (под _TARIFF_LOCK) и вытеснить самые старые."""
+    _TARIFF_CACHE[uid] = rec
+    _TARIFF_CACHE.move_to_end(uid)
+    while len(_TARIFF_CACHE) > _TARIFF_CACHE_SIZE:
+        _TARIFF_CACHE.popitem(last=False)
+
+
+def _tariff_record(uid: str) -> dict:
+    """Запись тарифа без побочных эффектов: кеш → хранилище → free."""
+    with _TARIFF_LOCK:
+        rec = _TARIFF_CACHE.get(uid)
+        if rec is not None:
+            _TARIFF_CACHE.move_to_end(uid)
+            return rec
+        rec = _norm_tariff(STORE.get("tariffs", uid))
+        _tariff_cache_put(uid, rec)
+    return rec
+
+
+def _update_tariff(uid: str, fn) -> dict:
+    """Изменить запись в хранилище и сразу обновить кеш."""
+    with _TARIFF_LOCK:
+        rec = STORE.update("tariffs", uid, lambda r: fn(_norm_tariff(r)))
+        _tariff_cache_put(uid, rec)
     return rec
 
 
@@ -223,27 +241,14 @@ def get_tariff(uid: str) -> str:
 
 
 def set_tariff(uid: str, name: str) -> None:
-    db = load_json(TARIFFS_DB)
-    rec = db.get(uid)
-    if isinstance(rec, str):
-        rec = {"plan": name, "bonus_gen": 0}
-    else:
-        rec = rec or {"bonus_gen": 0}
-        rec["plan"] = name
-    db[uid] = rec
-    save_json(TARIFFS_DB, db)
+    _update_tariff(uid, lambda rec: {**rec, "plan": name})
 
 
 def add_daily_gen(uid: str, amount: int) -> int:
     """Увеличивает bonus_gen и возвращает новое значение."""
-    db = load_json(TARIFFS_DB)
-    rec = db.get(uid)
-    if isinstance(rec, str):
-        rec = {"plan": rec, "bonus_gen": 0}
-    rec = rec or {"plan": "free", "bonus_gen": 0}
-    rec["bonus_gen"] = rec.get("bonus_gen", 0) + int(amount)
-    db[uid] = rec
-    save_json(TARIFFS_DB, db)
+    rec = _update_tariff(
+        uid, lambda rec: {**rec, "bonus_gen": rec["bonus_gen"] + int(amount)}
+    )
     return rec["bonus_gen"]
 
 
@@ -254,60 +259,157 @@ def tariff_info(uid: str) -> dict:
     return base
 
 
+def tariff_kbps(uid: str) -> int:
+    return TARIFF_KBPS.get(_tariff_record(uid).get("plan", "free"), TARIFF_KBPS["free"])
+
+
+def tariff_profile(uid: str) -> str:
+    """Профиль XTTS для синтеза пользователя (ключ VOICE_POOLS)."""
+    if VOICE_WORKERS <= 0:  # модель в процессе одна – и профиль один
+        return DEFAULT_PROFILE
+    return TARIFF_PROFILES.get(_tariff_record(uid).get("plan", "free"), DEFAULT_PROFILE)
+
+
 def daily_gen_count(uid: str) -> int:
-    meta = USERS_EMB / uid / "gen_meta.json"
-    if not meta.exists():
-        return 0
-    d = load_json(meta)
-    if d.get("date") != date.today().isoformat():
-        return 0
-    return d.get("count", 0)
+    return COUNTERS.get(uid)
 
 
-def inc_daily_gen(uid: str) -> None:
-    meta = USERS_EMB / uid / "gen_meta.json"
-    d = load_json(meta)
-    today = date.today().isoformat()
-    if d.get("date") != today:
-        d = {"date": today, "count": 0}
-    d["count"] = d.get("count", 0) + 1
-    save_json(meta, d)
+def inc_daily_gen(uid: str, n: int = 1) -> None:
+    COUNTERS.incr(uid, n)
 
 
 def reset_daily_gen(uid: str) -> None:
     """Сбросить счётчик дневных генераций пользователя."""
-    meta = USERS_EMB / uid / "gen_meta.json"
-    meta.parent.mkdir(parents=True, exist_ok=True)
-    save_json(meta, {"date": date.today().isoformat(), "count": 0})
+    COUNTERS.reset(uid)
 
 
 def log_line(uid: str, line: str):
-    folder = USERS_EMB / uid
-    folder.mkdir(parents=True, exist_ok=True)
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(folder / "message.log", "a", encoding="utf-8") as f:
-        f.write(f"[{ts}] {line}\n")
+    """Строка в message.log: буферизуется, пишется фоновым потоком (msglog)."""
+    get_log_writer().write(USERS_EMB / uid, line)
 
 
 AUTO_DEL_KEY = "auto_delete"
 DEL_DELAY = 5.0
 
+# очередь автоудаления: хендлер не ждёт DEL_DELAY, очередь переживает рестарт
+DELETER = DeletionScheduler(STORE)
+
+# контроль отзывчивости цикла бота (порог – LOOP_LAG_MS)
+LAG_MONITOR = LoopLagMonitor(threshold=float(os.getenv("LOOP_LAG_MS", "100")) / 1000)
+
 
 async def _maybe_delete(ctx, chat_id: int, msg_id: int, delay: float = 0.0) -> None:
-    """Безопасное удаление сообщения Telegram."""
+    """Поставить сообщение Telegram в очередь на удаление (не блокирует)."""
     if not ctx or not getattr(ctx, "bot", None):
         return
-    try:
-        if delay:
-            await asyncio.sleep(delay)
-        await ctx.bot.delete_message(chat_id=chat_id, message_id=msg_id)
-    except TelegramError:
-        pass
+    DELETER.schedule(ctx.bot, chat_id, msg_id, delay)
 
 
 def auto_delete_enabled(uid: str) -> bool:
-    """Проверяем флаг автоудаления из user_settings.json."""
-    return load_json(SETTINGS_DB).get(uid, {}).get(AUTO_DEL_KEY, False)
+    """Проверяем флаг автоудаления в настройках пользователя."""
+    return (STORE.get("settings", uid) or {}).get(AUTO_DEL_KEY, False)
+
+
+# ───────── контекст пользователя на один апдейт
+@dataclass
+class UserContext:
+    """
+    Снимок состояния пользователя, который читается один раз в начале
+    Telegram-хендлера. Изменения копятся здесь же и пишутся одной
+    транзакцией в flush() (его вызывает декоратор `with_user_context`).
+    """
+
+    uid: str
+    settings: dict
+    limits: dict  # {"slots", "daily_gen"} с учётом бонуса
+    plan: str
+    strikes: int
+    gen_today: int
+    slot: int | None
+    blacklisted: bool
+    _settings_patch: dict = field(default_factory=dict, repr=False)
+    _settings_replace: bool = field(default=False, repr=False)
+    _strikes_delta: int = field(default=0, repr=False)
+    _gen_delta: int = field(default=0, repr=False)
+
+    # ---------- чтение ------------------------------------------------
+    @property
+    def auto_delete(self) -> bool:
+        return bool(self.settings.get(AUTO_DEL_KEY, False))
+
+    @property
+    def filter_off(self) -> bool:
+        return bool(self.settings.get("filter_off", False))
+
+    @property
+    def limit_reached(self) -> bool:
+        return self.gen_today >= self.limits["daily_gen"]
+
+    # ---------- изменения (в RAM до flush) ----------------------------
+    def save_settings(self, settings: dict) -> None:
+        """Полная замена настроек (Web-App «Сохранить»)."""
+        self.settings = dict(settings)
+        self._settings_patch = dict(settings)
+        self._settings_replace = True
+
+    def set_setting(self, key: str, value) -> None:
+        self.settings[key] = value
+        self._settings_patch[key] = value
+
+    def add_strike(self) -> int:
+        self.strikes += 1
+        self._strikes_delta += 1
+        return self.strikes
+
+    def count_generation(self) -> None:
+        self.gen_today += 1
+        self._gen_delta += 1
+
+    def flush(self) -> None:
+        """Записать накопленные изменения одной транзакцией."""
+        ops = []
+        if self._settings_patch or self._settings_replace:
+            patch, replace = self._settings_patch, self._settings_replace
+            ops.append(
+                ("settings", self.uid,
+                 lambda cur: dict(patch) if replace else {**(cur or {}), **patch})
+            )
+        if self._strikes_delta:
+            delta = self._strikes_delta
+            ops.append(("strikes", self.uid, lambda cur: int(cur or 0) + delta))
+        if ops:
+            STORE.update_many(ops)
+        if self._gen_delta:
+            inc_daily_gen(self.uid, self._gen_delta)
+        self._settings_patch, self._settings_replace = {}, False
+        self._strikes_delta = self._gen_delta = 0
+
+
+def load_user_context(uid: str) -> UserContext:
+    return UserContext(
+        uid=uid,
+        settings=dict(STORE.get("settings", uid) or {}),
+        limits=tariff_info(uid),
+        plan=get_tariff(uid),
+        strikes=int(STORE.get("strikes", uid) or 0),
+        gen_today=daily_gen_count(uid),
+        slot=ACTIVE_SLOTS.get(uid),
+        blacklisted=is_blacklisted(uid),
+    )
+
+
+def with_user_context(handler):
+    """Хендлер (upd, ctx, uc): uc загружается до вызова и пишется после."""
+
+    @functools.wraps(handler)
+    async def wrapper(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
+        uc = await run_io(load_user_context, str(upd.effective_user.id))
+        try:
+            return await handler(upd, ctx, uc)
+        finally:
+            await run_io(uc.flush)
+
+    return wrapper
 
 
 ABBR = {
@@ -323,8 +425,12 @@ ABBR = {
     "Социальные схемы": "СС",
 }
 
-# ───────────────────────── XTTS
-VOICE = VoiceModule(model_dir=XTTS_MODEL_DIR, storage_dir=USERS_EMB)
+# ───────────────────────── модели
+# грузятся в фоновых потоках (main() запускает все сразу, первый запрос –
+# свою); Flask-маршрут ждёт модель до MODEL_WAIT_SEC, потом отвечает 503
+# warming_up, хендлер бота ставит запрос в ожидание
+MODELS = ModelRegistry()
+MODEL_WAIT_SEC = float(os.getenv("MODEL_WAIT_SEC", "2"))
 
 
 def _userdir_patch(self, uid: str) -> Path:
@@ -333,9 +439,148 @@ def _userdir_patch(self, uid: str) -> Path:
     return d
 
 
-VOICE._user_dir = MethodType(_userdir_patch, VOICE)  # type: ignore
-VOICE.users_root = USERS_EMB  # type: ignore
-voice_pool = concurrent.futures.ThreadPoolExecutor(1)
+def _load_voice():
+    from voice_module import VoiceModule  # torch + TTS – только в фоне
+
+    vm = VoiceModule(model_dir=XTTS_MODEL_DIR, storage_dir=USERS_EMB)
+    vm._user_dir = MethodType(_userdir_patch, vm)  # type: ignore
+    vm.users_root = USERS_EMB  # type: ignore
+    return vm
+
+
+def _load_audio_checker():
+    import audio_checker
+
+    audio_checker.load_model()
+    return audio_checker
+
+
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "0"))
+# с репликами (VOICE_WORKERS > 0) синтез и слепки считают они, а XTTS в этом
+# процессе нужна только потоковому /voice/tts/stream: грузится при первом
+# обращении и на /readyz не влияет – иначе копий модели было бы N + 1
+XTTS = MODELS.register("xtts", _load_voice, required=VOICE_WORKERS == 0, eager=VOICE_WORKERS == 0)
+AUDIO_CHECKER = MODELS.register("audio_checker", _load_audio_checker)
+CLASSIFIER = MODELS.register("classifier", get_classifier)
+# XTTS: атрибуты берутся у модели в момент обращения (с ожиданием загрузки)
+VOICE = ModelProxy(XTTS)
+# реплики модели: VOICE_WORKERS процессов (0 – потоки в этом процессе).
+# Здесь пул только описан – процессы поднимает init_workers() из main():
+# реплика (spawn) заново импортирует этот модуль и своих реплик не заводит
+# С micro-batching (TTS_BATCH_MAX > 1) модель должна получать запросы
+# параллельно, иначе батчеру нечего собирать: по умолчанию и потоков (без
+# реплик), и одновременных заданий на реплику – по TTS_BATCH_MAX
+_TTS_BATCH_MAX = int(os.getenv("TTS_BATCH_MAX", "1"))
+# пул на каждый профиль из TARIFF_PROFILES (по VOICE_WORKERS реплик);
+# ядра по умолчанию делятся на все реплики всех пулов
+_PROFILES = sorted(
+    {TARIFF_PROFILES.get(plan, DEFAULT_PROFILE) for plan in TARIFF_DEFS}
+    if VOICE_WORKERS > 0 else {DEFAULT_PROFILE}
+)
+_VOICE_THREADS = int(os.getenv("VOICE_THREADS", "0")) or (
+    max(1, (os.cpu_count() or 1) // (VOICE_WORKERS * len(_PROFILES))) if VOICE_WORKERS > 0 else None
+)
+VOICE_POOLS = {
+    name: VoiceWorkerPool(
+        VOICE_WORKERS,
+        target=VOICE,
+        factory_args=(XTTS_MODEL_DIR, USERS_EMB, name),
+        threads_per_worker=_VOICE_THREADS,
+        inline_threads=int(os.getenv("VOICE_INLINE_THREADS", "0")) or _TTS_BATCH_MAX,
+        jobs_per_worker=int(os.getenv("VOICE_JOBS_PER_WORKER", "0")) or _TTS_BATCH_MAX,
+    )
+    for name in _PROFILES
+}
+for _pool in VOICE_POOLS.values():
+    atexit.register(_pool.close)
+# слепки от профиля не зависят – их считает пул профиля по умолчанию (или любой)
+VOICE_POOL = VOICE_POOLS.get(DEFAULT_PROFILE) or VOICE_POOLS[_PROFILES[0]]
+
+
+def _wait_voice_pools() -> bool:
+    return all(pool.wait_ready() for pool in VOICE_POOLS.values())
+
+
+# модель, от которой зависят синтез и слепки (маршруты, хендлеры бота)
+if VOICE_WORKERS > 0:
+    # реплики грузят XTTS в своих процессах – готовность для /readyz;
+    # реплика, не поднявшаяся VOICE_MAX_FAILURES раз, переводит её в failed
+    VOICE_MODEL = MODELS.register("voice_workers", _wait_voice_pools)
+else:
+    VOICE_MODEL = XTTS
+# /audio_check: записи длиннее AUDIO_CHECK_MAX_SEC не принимаются (413)
+AUDIO_CHECK_MAX_SEC = float(os.getenv("AUDIO_CHECK_MAX_SEC", "600"))
+# /audio_check: загрузки, пришедшие за AUDIO_CHECK_WINDOW_MS, проверяются
+# одним STFT и одним прогоном PatentTTSNet (декодирование – в потоке запроса)
+CHECK_BATCHER = MicroBatcher(
+    lambda waves: AUDIO_CHECKER.get().predict_batch(waves),
+    window=float(os.getenv("AUDIO_CHECK_WINDOW_MS", "20")) / 1000,
+    max_batch=int(os.getenv("AUDIO_CHECK_BATCH", "8")),
+    name="audio-check",
+)
+atexit.register(CHECK_BATCHER.close)
+
+
+def requires_models(*models):
+    """Flask-маршрут: дождаться моделей (до MODEL_WAIT_SEC), иначе 503 warming_up."""
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for model in models:
+                try:
+                    model.get(MODEL_WAIT_SEC)
+                except ModelNotReady as e:
+                    body = jsonify(status="warming_up", model=e.name, state=e.state)
+                    return body, 503, {"Retry-After": "5"}
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+async def _model_ready(ctx, uc: "UserContext", msg, model) -> bool:
+    """Хендлер бота ждёт модель; если прогрев затянулся – предупреждаем."""
+    wait = asyncio.ensure_future(model.wait())
+    done, _ = await asyncio.wait({wait}, timeout=0.5)
+    if not done:
+        note = await msg.reply_text("⏳ Модель загружается, запрос выполнится после прогрева…")
+        if uc.auto_delete:
+            await _maybe_delete(ctx, note.chat_id, note.message_id, DEL_DELAY)
+    try:
+        await wait
+    except ModelNotReady:
+        err = await msg.reply_text("❌ Модель недоступна, попробуйте позже.")
+        if uc.auto_delete:
+            await _maybe_delete(ctx, err.chat_id, err.message_id, DEL_DELAY)
+        return False
+    return True
+
+
+# готовые синтезы (tts_cache.py): повтор фразы не доходит до XTTS
+TTS_CACHE = get_tts_cache()
+
+
+def _tts_lookup(req: SynthesisRequest, profile: str) -> tuple[str, Path | None]:
+    """Ключ кеша и путь к готовому файлу (None – нужно синтезировать)."""
+    # профиль XTTS меняет звук – int8-синтез не отдаётся вместо fp32
+    key = TTS_CACHE.key(req.embedding, req.text, {**req.sampling(), "profile": profile})
+    return key, TTS_CACHE.get(key)
+
+
+def _tts_encoded(key: str, wav_path: Path, fmt: str, kbps: int) -> Path:
+    """Готовый синтез в формате fmt; перекодированный вариант тоже кешируется."""
+    if fmt == "wav":
+        return wav_path
+    if fmt == "mp3":
+        kbps *= 2
+    enc_key = f"{key}-{fmt}{kbps}"
+    path = TTS_CACHE.get(enc_key)
+    if path is None:
+        data = encode_audio(wav_path.read_bytes(), fmt, kbps)
+        path = TTS_CACHE.put_bytes(enc_key, data, OUTPUT_FORMATS[fmt][1])
+    return path
 
 
 # ───────────────────────── LocalTunnel
@@ -402,12 +647,7 @@ def telegram_auth():
     d = request.get_json(force=True, silent=True)
     if not d or "id" not in d:
         return jsonify(status="error", message="Нет ID"), 400
-    uid = str(d["id"])
-    with open(AUTH_FILE, "a+", encoding="utf-8") as f:
-        f.seek(0)
-        ids = {l.strip() for l in f}
-        if uid not in ids:
-            f.write(uid + "\n")
+    AUTHORIZED.add(str(d["id"]))
     return jsonify(status="success"), 200
 
 
@@ -416,9 +656,7 @@ def save_settings():
     p = request.get_json(force=True, silent=True)
     if not p or "userId" not in p or "settings" not in p:
         return jsonify(status="error", message="bad payload"), 400
-    db = load_json(SETTINGS_DB)
-    db[str(p["userId"])] = p["settings"]
-    save_json(SETTINGS_DB, db)
+    STORE.put("settings", str(p["userId"]), p["settings"])
     return jsonify(status="success"), 200
 
 
@@ -441,37 +679,118 @@ def get_settings():
     uid = request.args.get("userId")
     if not uid:
         return jsonify(status="error", message="need userId"), 400
-    db = load_json(SETTINGS_DB)
-    if uid in db:
-        return jsonify(status="success", settings=db[uid]), 200
+    settings = STORE.get("settings", uid)
+    if settings is not None:
+        return jsonify(status="success", settings=settings), 200
     return jsonify(status="not_found"), 404
 
 
+def _too_long(checker, wav):
+    """Запись длиннее AUDIO_CHECK_MAX_SEC → ответ 413, иначе None."""
+    if len(wav) <= AUDIO_CHECK_MAX_SEC * checker.SAMPLE_RATE:
+        return None
+    msg = f"audio is longer than {AUDIO_CHECK_MAX_SEC:g} s"
+    return jsonify(status="error", message=msg), 413
+
+
+def _check_windows(wav):
+    """
+    Вся запись скользящим окном → оценки окон по порядку. Окна идут через
+    CHECK_BATCHER группами по max_batch: пачки делятся с чужими загрузками,
+    и длинная запись не занимает очередь целиком.
+    """
+    windows = AUDIO_CHECKER.get().split_windows(wav)
+    step = CHECK_BATCHER.max_batch
+    for i in range(0, len(windows), step):
+        chunk = windows[i:i + step]
+        futures = [CHECK_BATCHER.submit(w) for _, _, w in chunk]
+        for (start, end, _), fut in zip(chunk, futures):
+            yield {"start": start, "end": end, **fut.result()}
+
+
 @app.route("/audio_check", methods=["POST"])
+@requires_models(AUDIO_CHECKER)
 def audio_check():
+    """
+    Проверка записи на синтез. По умолчанию – первые ~12 с одним окном;
+    ?mode=windows – вся запись перекрывающимися окнами: итог, интервалы
+    подозрительных окон (suspicious, секунды) и оценка каждого окна.
+    """
     if "audio" not in request.files:
         return jsonify(status="error", message="no file"), 400
-    f = request.files["audio"]
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-    tmp.close()
+    windowed = request.args.get("mode") == "windows"
     try:
         print("⏳ Анализ аудио…")
-        f.save(tmp.name)
-        res = predict(tmp.name)
+        checker = AUDIO_CHECKER.get()
+        # декодирование – здесь: битый файл падает сам, а не валит всю пачку
+        wav = checker.load_audio(request.files["audio"].read(), checker.SAMPLE_RATE)
+        too_long = _too_long(checker, wav)
+        if too_long:
+            return too_long
+        if windowed:
+            windows = list(_check_windows(wav))
+            out = checker.verdict(windows)
+        else:
+            # модель видит только первое окно – остальное в пачку не везём:
+            # длинная загрузка не раздувает STFT соседям по пачке
+            out = CHECK_BATCHER.call(wav[: checker.WINDOW_SAMPLES])
+        res = out["label"]
         status = "безопасно" if "BINARY: real" in res else "опасно"
         print(f"✅ Результат: {status}")
     except Exception as e:
         return jsonify(status="error", message=str(e)), 500
-    finally:
+    if windowed:
+        return jsonify(
+            status="ok", result=res, fake=out["fake"], suspicious=out["suspicious"],
+            duration=out["duration"], windows=windows,
+        ), 200
+    return jsonify(status="ok", result=res, fake=out["fake"], classes=out["classes"]), 200
+
+
+@app.route("/audio_check/stream", methods=["POST"])
+@requires_models(AUDIO_CHECKER)
+def audio_check_stream():
+    """
+    То же, что ?mode=windows, но NDJSON по мере готовности: строка
+    {"type": "window", …} на окно, последняя – {"type": "verdict", …}.
+    Ошибка после начала ответа приходит строкой {"type": "error"}.
+    """
+    if "audio" not in request.files:
+        return jsonify(status="error", message="no file"), 400
+    checker = AUDIO_CHECKER.get()
+    try:
+        wav = checker.load_audio(request.files["audio"].read(), checker.SAMPLE_RATE)
+    except Exception as e:
+        return jsonify(status="error", message=str(e)), 500
+    too_long = _too_long(checker, wav)
+    if too_long:
+        return too_long
+
+    def line(obj) -> str:
+        return json.dumps(obj, ensure_ascii=False) + "\n"
+
+    def generate():
+        done = []
         try:
-            os.remove(tmp.name)
-        except:
-            pass
-    return jsonify(status="ok", result=res), 200
+            for w in _check_windows(wav):
+                done.append(w)
+                yield line({"type": "window", **w})
+            out = checker.verdict(done)
+        except Exception as e:  # статус уже отправлен – сообщаем строкой
+            yield line({"type": "error", "message": str(e)})
+            return
+        yield line({"type": "verdict", "result": out.pop("label"), **out})
+
+    return Response(
+        generate(),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
 
 # ───────────────────────── voice-routes
 @app.route("/voice/embed", methods=["POST"])
+@requires_models(VOICE_MODEL)
 def voice_embed():
     form = request.form
     if "audio" not in request.files or "userId" not in form or "slot" not in form:
@@ -481,35 +800,19 @@ def voice_embed():
     if not (0 <= slot < slots_allowed):
         return jsonify(status="error", message=f"slot {slot} out of range"), 403
 
-    user_dir = USERS_EMB / uid
-    before = set(user_dir.glob("speaker_embedding_*.npz"))
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".ogg")
-    tmp.close()
-    request.files["audio"].save(tmp.name)
+    # загрузка читается из потока запроса – без временного файла;
+    # слепок пишется сразу в свой слот
     try:
-        VOICE.create_embedding(tmp.name, uid)
-    finally:
-        try:
-            os.remove(tmp.name)
-        except:
-            pass
-
-    after = set(user_dir.glob("speaker_embedding_*.npz"))
-    new = after - before
-    if not new:
-        return jsonify(status="error", message="no new embedding"), 500
-
-    new_file = new.pop()
-    target = user_dir / f"speaker_embedding_{slot}.npz"
-    if target.exists():
-        target.unlink()
-    new_file.rename(target)
+        VOICE_POOL.call("create_embedding", request.files["audio"].read(), uid, slot)
+    except Exception as e:
+        log_line(uid, f"EMBED ERROR: {e}")
+        return jsonify(status="error", message="embedding failed"), 500
+    slots.mark(USERS_EMB / uid, slot)
     return jsonify(status="ok"), 200
 
 
-@app.route("/voice/tts", methods=["POST"])
-def voice_tts():
+def _tts_args():
+    """Проверка тела /voice/tts*: SynthesisRequest или готовый ответ-ошибка."""
     d = request.get_json(force=True, silent=True)
     if not d or "userId" not in d or "text" not in d or "slot" not in d:
         return jsonify(status="error", message="need userId, text & slot"), 400
@@ -518,42 +821,154 @@ def voice_tts():
     if daily_gen_count(uid) >= tariff_info(uid)["daily_gen"]:
         return jsonify(status="error", message="daily limit"), 403
 
-    emb = USERS_EMB / uid / f"speaker_embedding_{slot}.npz"
+    emb = slots.slot_path(USERS_EMB / uid, slot)
     if not emb.exists():
         return jsonify(status="error", message="slot empty"), 404
 
-    # применяем личные настройки до синтеза
-    apply_user_settings(uid)
+    return tts_request(uid, text, emb)
 
-    # явно указываем VOICE, какой embedding-файл использовать
-    VOICE.user_embedding[uid] = emb  # type: ignore
 
-    try:
-        wav_path = Path(VOICE.synthesize(uid, text))
-    except Exception as e:
-        return jsonify(status="error", message=str(e)), 500
+def _tts_format() -> str | None:
+    """Формат ответа /voice/tts: ?format=ogg|mp3|wav, иначе Accept (по умолчанию WAV)."""
+    if "format" in request.args:
+        return output_format(request.args["format"])
+    mimes = {v[0]: k for k, v in OUTPUT_FORMATS.items()}
+    mimes["audio/opus"] = "ogg"
+    best = request.accept_mimetypes.best_match(list(mimes), default="audio/wav")
+    return mimes[best]
+
+
+@app.route("/voice/tts", methods=["POST"])
+@requires_models(VOICE_MODEL)
+def voice_tts():
+    fmt = _tts_format()
+    if fmt is None:
+        return jsonify(status="error", message="unsupported format"), 406
+    req = _tts_args()
+    if not isinstance(req, SynthesisRequest):
+        return req
+    uid = req.user_id
+
+    profile = tariff_profile(uid)
+    key, wav_path = _tts_lookup(req, profile)
+    if wav_path is None:
+        try:
+            wav_path = Path(VOICE_POOLS[profile].call("synthesize", req))
+        except TimeoutError:  # VOICE_CALL_TIMEOUT: очередь реплик не успела
+            return jsonify(status="error", message="synthesis timed out"), 504
+        except Exception as e:
+            return jsonify(status="error", message=str(e)), 500
+
+        if not wav_path.exists() or not wav_path.is_file():
+            return jsonify(status="error", message="synthesis failed"), 500
+        try:
+            TTS_CACHE.put(key, wav_path)
+        except OSError as e:  # кеш – не повод терять готовый синтез
+            log_line(uid, f"TTS CACHE ERROR: {e}")
 
-    if not wav_path.exists() or not wav_path.is_file():
-        return jsonify(status="error", message="synthesis failed"), 500
+    try:
+        out = _tts_encoded(key, wav_path, fmt, tariff_kbps(uid))
+    except (OSError, subprocess.CalledProcessError) as e:
+        return jsonify(status="error", message=f"encoding failed: {e}"), 500
 
     inc_daily_gen(uid)
-    # отдаем настоящий WAV
     return send_file(
-        wav_path.resolve(),
+        out.resolve(),
         as_attachment=True,
-        download_name=wav_path.name,
+        download_name=wav_path.with_suffix(OUTPUT_FORMATS[fmt][1]).name,
+        mimetype=OUTPUT_FORMATS[fmt][0],
+    )
+
+
+@app.route("/voice/tts/stream", methods=["POST"])
+@requires_models(XTTS)
+def voice_tts_stream():
+    """
+    Потоковый синтез: WAV-заголовок уходит сразу, дальше – PCM-куски
+    по мере декодирования XTTS (chunked transfer). Web-App может начинать
+    воспроизведение с первого куска. Готовый результат – из кеша целиком.
+    """
+    req = _tts_args()
+    if not isinstance(req, SynthesisRequest):
+        return req
+    uid = req.user_id
+
+    # поток идёт моделью этого процесса – в её профиле, не тарифном
+    key, wav_path = _tts_lookup(req, DEFAULT_PROFILE)
+    if wav_path is not None:
+        inc_daily_gen(uid)
+        return send_file(wav_path.resolve(), mimetype="audio/wav")
+
+    def generate():
+        yield wav_header(TTS_SAMPLE_RATE)
+        pcm = bytearray()
+        try:
+            # в VoiceModule поток идёт под замком модели – как и synthesize()
+            # из VOICE_POOL; при обрыве клиента генерация останавливается
+            for chunk in VOICE.synthesize_stream(req):
+                pcm += chunk
+                yield chunk
+        except Exception as e:  # статус уже отправлен – только логируем
+            log_line(uid, f"TTS STREAM ERROR: {e}")
+            return
+        inc_daily_gen(uid)
+        try:
+            TTS_CACHE.put_bytes(key, wav_header(TTS_SAMPLE_RATE, len(pcm)) + bytes(pcm))
+        except OSError as e:
+            log_line(uid, f"TTS CACHE ERROR: {e}")
+
+    return Response(
+        generate(),
         mimetype="audio/wav",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/voice/stats")
+def voice_stats():
+    """Счётчики кешей (синтезы, тензоры слепков) и состояние реплик модели."""
+    emb_cache = getattr(XTTS.peek(), "emb_cache", None)
+    return jsonify(
+        tts_cache=TTS_CACHE.stats(),
+        emb_cache=emb_cache.stats() if emb_cache else None,
+        workers=[
+            {"profile": name, **h} for name, pool in VOICE_POOLS.items() for h in pool.health()
+        ],
+        audio_check=CHECK_BATCHER.stats(),
     )
 
 
+@app.route("/healthz")
+def healthz():
+    """Процесс жив; состояние и время прогрева моделей, задержки цикла бота."""
+    return jsonify(status="ok", models=MODELS.status(), loop_lag=LAG_MONITOR.stats()), 200
+
+
+@app.route("/readyz")
+def readyz():
+    """200 – все обязательные модели загружены, иначе 503 warming_up."""
+    ready = MODELS.ready()
+    return jsonify(
+        status="ready" if ready else "warming_up", models=MODELS.status()
+    ), (200 if ready else 503)
+
+
 # ───────────────────────── Telegram-handlers
+# блокирующие шаги хендлеров – выполняются через run_io, вне цикла бота
+def _ensure_registered(uid: str) -> None:
+    """Регистрация пользователя + тариф free, если ещё не задан."""
+    AUTHORIZED.add(uid)
+    if STORE.get("tariffs", uid) is None:
+        set_tariff(uid, "free")
+
+
 def build_slot_keyboard(uid: str) -> InlineKeyboardMarkup:
-    slots = tariff_info(uid)["slots"]
-    files = list((USERS_EMB / uid).glob("speaker_embedding_*.npz"))
+    allowed = tariff_info(uid)["slots"]
+    filled = slots.filled(USERS_EMB / uid)
     active = ACTIVE_SLOTS.get(uid)
     kb = []
-    for i in range(slots):
-        if i < len(files):
+    for i in range(allowed):
+        if i in filled:
             text = f"{'✅ ' if active==i else ''}Слот {i+1}"
             data = f"slot:{i}"
         else:
@@ -563,9 +978,10 @@ def build_slot_keyboard(uid: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(kb)
 
 
-async def cmd_start(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    uid = str(upd.effective_user.id)
-    if is_blacklisted(uid):
+@with_user_context
+async def cmd_start(upd: Update, ctx: ContextTypes.DEFAULT_TYPE, uc: UserContext):
+    uid = uc.uid
+    if uc.blacklisted:
         return
 
     # ── «жёсткий» сброс Web-App  ───────────────────────────────────
@@ -589,20 +1005,12 @@ async def cmd_start(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
         )
         return  # дальше /start не продолжаем
 
-    # ── регистрация пользователю (если впервые)
-    with open(AUTH_FILE, "a+", encoding="utf-8") as f:
-        f.seek(0)
-        known = {l.strip() for l in f}
-        if uid not in known:
-            f.write(uid + "\n")
-
-    # ── тариф: если ещё не задан – free
-    if uid not in load_json(TARIFFS_DB):
-        set_tariff(uid, "free")
+    # ── регистрация пользователю (если впервые) + тариф free
+    await run_io(_ensure_registered, uid)
 
     # ── отдаём клавиатуры
     await upd.message.reply_text(
-        "Ваши голосовые слоты:", reply_markup=build_slot_keyboard(uid)
+        "Ваши голосовые слоты:", reply_markup=await run_io(build_slot_keyboard, uid)
     )
 
     await upd.message.reply_text(
@@ -622,7 +1030,8 @@ async def cb_handler(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if cmd == "slot":
             await q.answer("Слот выбран")
             await q.edit_message_text(
-                f"Слот {idx+1} выбран.", reply_markup=build_slot_keyboard(uid)
+                f"Слот {idx+1} выбран.",
+                reply_markup=await run_io(build_slot_keyboard, uid),
             )
         else:
             await q.answer()
@@ -634,7 +1043,7 @@ async def cb_handler(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if not is_admin(uid):
             await q.answer("Недостаточно прав", show_alert=True)
             return
-        new = set_tariff_safe(uid, arg)
+        new = await run_io(set_tariff_safe, uid, arg)
         await q.answer()
         await q.edit_message_text(
             f"🎫 Тариф установлен: *{new}*",
@@ -643,9 +1052,10 @@ async def cb_handler(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
         )
 
 
-async def handle_web_app(upd: Update, _: ContextTypes.DEFAULT_TYPE):
-    uid = str(upd.effective_user.id)
-    if is_blacklisted(uid):
+@with_user_context
+async def handle_web_app(upd: Update, _: ContextTypes.DEFAULT_TYPE, uc: UserContext):
+    uid = uc.uid
+    if uc.blacklisted:
         return
 
     try:
@@ -657,9 +1067,7 @@ async def handle_web_app(upd: Update, _: ContextTypes.DEFAULT_TYPE):
     act = payload.get("action")
 
     if act == "save_settings":
-        db = load_json(SETTINGS_DB)
-        db[uid] = payload.get("settings", {})
-        save_json(SETTINGS_DB, db)
+        uc.save_settings(payload.get("settings", {}))
         await upd.message.reply_text("✅ Настройки сохранены.")
 
     elif act == "set_tariff":
@@ -667,7 +1075,7 @@ async def handle_web_app(upd: Update, _: ContextTypes.DEFAULT_TYPE):
             await upd.message.reply_text("⛔ Только админ может менять тариф.")
             return
         plan = payload.get("plan")
-        new = set_tariff_safe(uid, plan)
+        new = await run_io(set_tariff_safe, uid, plan)
         await upd.message.reply_text(
             f"🎫 Тариф установлен: *{new}*", parse_mode="Markdown"
         )
@@ -676,11 +1084,12 @@ async def handle_web_app(upd: Update, _: ContextTypes.DEFAULT_TYPE):
         await upd.message.reply_text("❌ unknown action")
 
 
-async def tg_voice(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    uid = str(upd.effective_user.id)
-    if is_blacklisted(uid):
+@with_user_context
+async def tg_voice(upd: Update, ctx: ContextTypes.DEFAULT_TYPE, uc: UserContext):
+    uid = uc.uid
+    if uc.blacklisted:
         return
-    slot = ACTIVE_SLOTS.get(uid)
+    slot = uc.slot
     msg = upd.effective_message
     if slot is None:
         await msg.reply_text("Выберите слот через /start")
@@ -690,81 +1099,60 @@ async def tg_voice(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if not v:
         return
 
-    allowed = tariff_info(uid)["slots"]
+    allowed = uc.limits["slots"]
     if not (0 <= slot < allowed):
         await msg.reply_text(f"Слот {slot+1} вне диапазона.")
         return
 
-    m = await upd.message.reply_text("⏳ Обрабатываю запись…")
-    if auto_delete_enabled(uid):
+    if not await _model_ready(ctx, uc, msg, VOICE_MODEL):
+        return
+    m = await msg.reply_text("⏳ Обрабатываю запись…")
+    if uc.auto_delete:
         await _maybe_delete(ctx, m.chat_id, m.message_id, DEL_DELAY)
 
-
-    user_dir = USERS_EMB / uid
-    before = set(user_dir.glob("speaker_embedding_*.npz"))
-
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".ogg")
-    tmp.close()
-    await (await ctx.bot.get_file(v.file_id)).download_to_drive(tmp.name)
-    file_path = tmp.name
-    if msg.video or msg.video_note:
-        wav_tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        wav_tmp.close()
-        (
-            AudioSegment.from_file(tmp.name)
-            .set_channels(1)
-            .set_frame_rate(16_000)
-            .set_sample_width(2)
-            .export(wav_tmp.name, format="wav")
-        )
-        os.remove(tmp.name)
-        file_path = wav_tmp.name
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(voice_pool, VOICE.create_embedding, file_path, uid)
-    os.remove(file_path)
-
-    after = set(user_dir.glob("speaker_embedding_*.npz"))
-    new = after - before
-    if not new:
-        err = await upd.message.reply_text("Ошибка создания слепка.")
-        if auto_delete_enabled(uid):
-            await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+    # голосовое / видео / кружок – сразу в память; декодирует VoiceModule,
+    # слепок атомарно встаёт в выбранный слот
+    data = await (await ctx.bot.get_file(v.file_id)).download_as_bytearray()
+    try:
+        await VOICE_POOL.run("create_embedding", bytes(data), uid, slot)
+        await run_io(slots.mark, USERS_EMB / uid, slot)
+    except Exception as e:
+        await run_io(log_line, uid, f"EMBED ERROR: {e}")
+        err = await msg.reply_text("Ошибка создания слепка.")
+        if uc.auto_delete:
+            await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
             await _maybe_delete(ctx, err.chat_id, err.message_id, DEL_DELAY)
         return
-
-    new_file = new.pop()
-    target = user_dir / f"speaker_embedding_{slot}.npz"
-    if target.exists():
-        target.unlink()
-    new_file.rename(target)
-    done = await upd.message.reply_text(
-        "🗣️ Слепок создан.", reply_markup=build_slot_keyboard(uid)
+    done = await msg.reply_text(
+        "🗣️ Слепок создан.", reply_markup=await run_io(build_slot_keyboard, uid)
     )
-    if auto_delete_enabled(uid):
-        await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+    if uc.auto_delete:
+        await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
         await _maybe_delete(ctx, done.chat_id, done.message_id, DEL_DELAY)
 
 
-async def tg_text(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
+@with_user_context
+async def tg_text(upd: Update, ctx: ContextTypes.DEFAULT_TYPE, uc: UserContext):
     msg = upd.effective_message
     if not msg or not msg.text:
         return
 
-    uid = str(upd.effective_user.id)
+    uid = uc.uid
     txt = msg.text.strip()
 
-    if is_blacklisted(uid):
+    if uc.blacklisted:
         return
 
-    settings = load_json(SETTINGS_DB).get(uid, {})
-    if not settings.get("filter_off"):
-        tmp = await upd.message.reply_text("⏳ Анализирую текст…")
-        if auto_delete_enabled(uid):
+    if not uc.filter_off:
+        tmp = await msg.reply_text("⏳ Анализирую текст…")
+        if uc.auto_delete:
             await _maybe_delete(ctx, tmp.chat_id, tmp.message_id, DEL_DELAY)
+        if not await _model_ready(ctx, uc, msg, CLASSIFIER):
+            return
         clf = get_classifier()
         scores = await clf.analyse(txt)
         comp = ";".join(f"{ABBR[k]}{scores.get(k, 0) * 100:04.1f}" for k in ABBR)
-        log_line(uid, f"{txt} ({comp})")
+        await run_io(log_line, uid, f"{txt} ({comp})")
 
         safe = scores.get("Безопасные сообщения", 0)
         top_lbl, top_p = max(scores.items(), key=lambda kv: kv[1])
@@ -780,74 +1168,92 @@ async def tg_text(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
             ]
             if parts:
                 warn = "; ".join(parts)
-        res = await upd.message.reply_text(
+        res = await msg.reply_text(
             "Результат: безопасно" if not warn else "Результат: опасно"
         )
-        if auto_delete_enabled(uid):
+        if uc.auto_delete:
             await _maybe_delete(ctx, res.chat_id, res.message_id, DEL_DELAY)
-            await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+            await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
         if warn:
-            s = add_strike(uid)
+            s = uc.add_strike()
             if s >= MAX_STRIKES:
-                add_black(uid)
-                ban = await upd.message.reply_text("🚫 Заблокировано.")
-                if auto_delete_enabled(uid):
-                    await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+                await run_io(add_black, uid)  # IdRegistry пишет файл
+                ban = await msg.reply_text("🚫 Заблокировано.")
+                if uc.auto_delete:
+                    await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
                     await _maybe_delete(ctx, ban.chat_id, ban.message_id, DEL_DELAY)
                 return
-            warn_msg = await upd.message.reply_text(f"⚠️ {warn}. Strike {s}/{MAX_STRIKES}.")
-            if auto_delete_enabled(uid):
-                await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+            warn_msg = await msg.reply_text(f"⚠️ {warn}. Strike {s}/{MAX_STRIKES}.")
+            if uc.auto_delete:
+                await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
                 await _maybe_delete(ctx, warn_msg.chat_id, warn_msg.message_id, DEL_DELAY)
             return
     else:
-        log_line(uid, txt)
+        await run_io(log_line, uid, txt)
 
     # ---------- обычный TTS ----------
-    slot = ACTIVE_SLOTS.get(uid)
+    slot = uc.slot
     if slot is None:
         return
 
-    if daily_gen_count(uid) >= tariff_info(uid)["daily_gen"]:
-        lm = await upd.message.reply_text("Дневной лимит генераций исчерпан.")
-        if auto_delete_enabled(uid):
-            await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+    if uc.limit_reached:
+        lm = await msg.reply_text("Дневной лимит генераций исчерпан.")
+        if uc.auto_delete:
+            await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
             await _maybe_delete(ctx, lm.chat_id, lm.message_id, DEL_DELAY)
         return
 
-    emb = USERS_EMB / uid / f"speaker_embedding_{slot}.npz"
-    if not emb.exists():
-        sl = await upd.message.reply_text(f"Слот {slot+1} пуст. Выберите занятый слот.")
-        if auto_delete_enabled(uid):
-            await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+    emb = slots.slot_path(USERS_EMB / uid, slot)
+    if not await run_io(emb.exists):
+        sl = await msg.reply_text(f"Слот {slot+1} пуст. Выберите занятый слот.")
+        if uc.auto_delete:
+            await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
             await _maybe_delete(ctx, sl.chat_id, sl.message_id, DEL_DELAY)
         return
 
-    apply_user_settings(uid)
-    VOICE.user_embedding[uid] = emb  # type: ignore
-    proc = await upd.message.reply_text("⏳ Генерирую речь…")
-    if auto_delete_enabled(uid):
-        await _maybe_delete(ctx, proc.chat_id, proc.message_id, DEL_DELAY)
+    req = tts_request(uid, txt, emb, uc.settings)
+    profile = await run_io(tariff_profile, uid)
+    key, wav_path = await run_io(_tts_lookup, req, profile)
+    if wav_path is None:
+        if not await _model_ready(ctx, uc, msg, VOICE_MODEL):
+            return
+        proc = await msg.reply_text("⏳ Генерирую речь…")
+        if uc.auto_delete:
+            await _maybe_delete(ctx, proc.chat_id, proc.message_id, DEL_DELAY)
+
+        try:
+            wav_path = Path(await VOICE_POOLS[profile].run("synthesize", req))
+        except Exception as e:
+            await run_io(log_line, uid, f"TTS ERROR: {e}")
+            return
+        try:
+            await run_io(TTS_CACHE.put, key, wav_path)
+        except OSError as e:  # кеш – не повод терять готовый синтез
+            await run_io(log_line, uid, f"TTS CACHE ERROR: {e}")
 
-    loop = asyncio.get_running_loop()
+    # голосовое Telegram – Ogg/Opus; без ffmpeg/libopus – прежний WAV-файл
+    kbps = await run_io(tariff_kbps, uid)
     try:
-        wav_path = Path(
-            await loop.run_in_executor(voice_pool, VOICE.synthesize, uid, txt)
+        ogg = await run_io(lambda: _tts_encoded(key, wav_path, "ogg", kbps).read_bytes())
+    except (OSError, subprocess.CalledProcessError) as e:
+        await run_io(log_line, uid, f"OPUS ERROR: {e}")
+        ogg = None
+    if ogg is not None:
+        audio_msg = await ctx.bot.send_voice(
+            chat_id=upd.effective_chat.id,
+            voice=InputFile(ogg, filename=wav_path.with_suffix(".ogg").name),
         )
-    except Exception as e:
-        log_line(uid, f"TTS ERROR: {e}")
-        return
-
-    with open(str(wav_path), "rb") as f:
+    else:
+        audio = await run_io(wav_path.read_bytes)
         audio_msg = await ctx.bot.send_audio(
             chat_id=upd.effective_chat.id,
-            audio=InputFile(f, filename=wav_path.name),
+            audio=InputFile(audio, filename=wav_path.name),
             title="TTS",
         )
-    inc_daily_gen(uid)
-    done = await upd.message.reply_text("✅ Готово")
-    if auto_delete_enabled(uid):
-        await _maybe_delete(ctx, upd.effective_chat.id, upd.message.message_id)
+    uc.count_generation()
+    done = await msg.reply_text("✅ Готово")
+    if uc.auto_delete:
+        await _maybe_delete(ctx, upd.effective_chat.id, msg.message_id)
         await _maybe_delete(ctx, audio_msg.chat_id, audio_msg.message_id, DEL_DELAY)
         await _maybe_delete(ctx, done.chat_id, done.message_id, DEL_DELAY)
 
@@ -868,16 +1274,17 @@ async def cmd_tariff(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await upd.message.reply_text("⛔ Это админ-команда.")
         return
 
-    plan = get_tariff(uid)
+    plan = await run_io(get_tariff, uid)
     txt = f"Текущий тариф пользователя – *{plan}*\n" "Выберите новый план:"
     await upd.message.reply_text(
         txt, reply_markup=build_tariff_keyboard(plan), parse_mode="Markdown"
     )
 
 
-async def cmd_filter(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    uid = str(upd.effective_user.id)
-    state = toggle_filter(uid)
+@with_user_context
+async def cmd_filter(upd: Update, ctx: ContextTypes.DEFAULT_TYPE, uc: UserContext):
+    state = not uc.filter_off
+    uc.set_setting("filter_off", state)
     msg = "Антискам-фильтр выключен." if state else "Антискам-фильтр включен."
     await upd.message.reply_text(msg)
 
@@ -892,7 +1299,7 @@ async def cmd_add_limit(upd: Update, ctx: ContextTypes.DEFAULT_TYPE):
         await upd.message.reply_text("Используйте: /add_limit <n>")
         return
     n = int(ctx.args[0])
-    add_daily_gen(uid, n)
+    await run_io(add_daily_gen, uid, n)
     await upd.message.reply_text(f"Добавлено {n} к дневному лимиту.")
 
 
@@ -900,9 +1307,25 @@ def run_flask():
     app.run(port=5000, debug=False, use_reloader=False)
 
 
+async def _post_init(app_tg) -> None:
+    LAG_MONITOR.start()
+    restored = await DELETER.restore(app_tg.bot)
+    if restored:
+        print(f"🧹 Автоудаление: восстановлено {restored} сообщений")
+
+
+def init_workers() -> dict:
+    """Запустить процессы-реплики XTTS (только из main(), не при импорте)."""
+    for pool in VOICE_POOLS.values():
+        pool.start()
+    return VOICE_POOLS
+
+
 def main():
     if not BOT_TOKEN or not re.fullmatch(r"\d+:[\w-]{35}", BOT_TOKEN):
         raise RuntimeError("❌ BOT_TOKEN отсутствует или некорректен.")
+    init_workers()  # до MODELS.start(): готовность "voice_workers" ждёт реплики
+    MODELS.start()  # в фоне: Flask, туннель и бот поднимаются не дожидаясь моделей
     threading.Thread(target=run_flask, daemon=True).start()
     print("🌐 Flask на :5000")
     lt_url = start_lt()
@@ -913,7 +1336,7 @@ def main():
     if not WEBAPP_URL:
         WEBAPP_URL = lt_url.rstrip("/") + "/"
 
-    app_tg = ApplicationBuilder().token(BOT_TOKEN).build()
+    app_tg = ApplicationBuilder().token(BOT_TOKEN).post_init(_post_init).build()
     app_tg.add_handler(CommandHandler("start", cmd_start))
     app_tg.add_handler(CallbackQueryHandler(cb_handler))
     app_tg.add_handler(CommandHandler("tariff", cmd_tariff))
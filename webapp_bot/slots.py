@@ -0,0 +1,107 @@
+"""
+slots.py – слоты голосовых слепков пользователя
+===============================================
+•  slot_path()  – слот i ↔ <user_dir>/speaker_embedding_{i}.npz
+•  save_npz()   – запись во временный файл рядом + os.replace: читатель
+                  видит либо прежний слепок, либо новый целиком, две
+                  загрузки в один слот не смешиваются
+•  slots.json   – манифест занятых слотов {"0": {"size": …, "mtime_ns": …}};
+                  filled() / mark() работают по нему, без glob
+                  по папке пользователя. У старых пользователей манифест
+                  собирается один раз по существующим speaker_embedding_<N>.npz
+Манифест пишет только процесс бота/сервера (реплики модели лишь кладут
+npz в слот), поэтому хватает lock'а на пользователя внутри процесса.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Set
+
+import numpy as np
+
+MANIFEST = "slots.json"
+_SLOT_FILE = re.compile(r"^speaker_embedding_(\d+)\.npz$")
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock(user_dir: Path) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(str(user_dir), threading.Lock())
+
+
+def slot_path(user_dir: str | Path, slot: int) -> Path:
+    return Path(user_dir) / f"speaker_embedding_{int(slot)}.npz"
+
+
+def save_npz(path: str | Path, **arrays) -> Path:
+    """np.savez атомарно: temp-файл в той же папке → os.replace."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp, "wb") as fh:  # файловый объект – savez не дописывает .npz
+            np.savez(fh, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return path
+
+
+# ────────────────────────────────────────
+# манифест
+# ────────────────────────────────────────
+def _entry(path: Path) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _read(user_dir: Path) -> Dict[str, dict]:
+    try:
+        return json.loads((user_dir / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):  # нет манифеста или он битый
+        return _rebuild(user_dir)
+
+
+def _write(user_dir: Path, data: Dict[str, dict]) -> None:
+    user_dir.mkdir(parents=True, exist_ok=True)
+    tmp = user_dir / f".{MANIFEST}.{uuid.uuid4().hex[:8]}.tmp"
+    tmp.write_text(json.dumps(data, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, user_dir / MANIFEST)
+
+
+def _rebuild(user_dir: Path) -> Dict[str, dict]:
+    """Манифест по файлам слотов – единственный glob, при первом обращении."""
+    data: Dict[str, dict] = {}
+    if user_dir.is_dir():
+        for p in user_dir.iterdir():
+            m = _SLOT_FILE.match(p.name)
+            if m:
+                data[m.group(1)] = _entry(p)
+        _write(user_dir, data)
+    return data
+
+
+def filled(user_dir: str | Path) -> Set[int]:
+    """Номера занятых слотов."""
+    user_dir = Path(user_dir)
+    with _lock(user_dir):
+        return {int(k) for k in _read(user_dir)}
+
+
+def mark(user_dir: str | Path, slot: int) -> Path:
+    """Отметить слот занятым после записи его npz; возвращает путь слота."""
+    user_dir = Path(user_dir)
+    path = slot_path(user_dir, slot)
+    with _lock(user_dir):
+        data = _read(user_dir)
+        data[str(int(slot))] = _entry(path)
+        _write(user_dir, data)
+    return path
@@ -0,0 +1,222 @@
+"""
+state_store.py – пользовательское состояние (тарифы / настройки / strikes)
+=========================================================================
+•  SQLiteStore – backend по умолчанию: WAL, одна строка на пользователя,
+                 update / incr выполняются в одной транзакции
+•  JsonStore   – прежний формат «весь файл целиком», оставлен для отката
+•  get_store() – общий экземпляр; backend выбирается через STATE_BACKEND
+
+Пространства имён (ns): "settings", "tariffs", "strikes".
+При первом запуске SQLiteStore разово импортирует старые *.json.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+Op = Tuple[str, str, Callable[[Any], Any]]  # (ns, uid, fn)
+
+# ns → переменная окружения и файл по умолчанию (старые JSON-файлы server_bot.py)
+LEGACY_FILES = {
+    "settings": ("SETTINGS_DB", "user_settings.json"),
+    "tariffs": ("TARIFFS_DB", "tariffs_db.json"),
+    "strikes": ("STRIKES_DB", "user_strikes.json"),
+}
+
+
+class StateStore(ABC):
+    """Общий интерфейс backend-ов: значение = любой JSON-совместимый объект."""
+
+    @abstractmethod
+    def get(self, ns: str, uid: str, default: Any = None) -> Any:
+        ...
+
+    @abstractmethod
+    def put(self, ns: str, uid: str, value: Any) -> None:
+        ...
+
+    def update(self, ns: str, uid: str, fn: Callable[[Any], Any]) -> Any:
+        """Атомарно: value = fn(старое значение или None). Возвращает новое."""
+        return self.update_many([(ns, uid, fn)])[0]
+
+    @abstractmethod
+    def update_many(self, ops: Iterable[Op]) -> List[Any]:
+        """Несколько update одной транзакцией (одна запись на диск)."""
+
+    @abstractmethod
+    def all(self, ns: str) -> Dict[str, Any]:
+        ...
+
+    def incr(self, ns: str, uid: str, amount: int = 1) -> int:
+        """Атомарный счётчик (strikes и т.п.)."""
+        return self.update(ns, uid, lambda v: int(v or 0) + int(amount))
+
+    def import_json(self, ns: str, path: str | Path) -> int:
+        """Разовая миграция из старого JSON-файла. Возвращает число записей."""
+        return 0
+
+
+# ────────────────────────────────────────
+# SQLite (WAL)
+# ────────────────────────────────────────
+class SQLiteStore(StateStore):
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._tx() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " ns TEXT NOT NULL, uid TEXT NOT NULL, data TEXT NOT NULL,"
+                " PRIMARY KEY (ns, uid)) WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS migrations ("
+                " ns TEXT PRIMARY KEY, source TEXT, ts TEXT)"
+            )
+
+    # одно соединение на поток: Flask-потоки и цикл бота не делят курсор
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")  # сразу берём write-lock
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, ns: str, uid: str, default: Any = None) -> Any:
+        row = self._conn().execute(
+            "SELECT data FROM state WHERE ns = ? AND uid = ?", (ns, uid)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, ns: str, uid: str, value: Any) -> None:
+        with self._tx() as db:
+            self._write(db, ns, uid, value)
+
+    def update_many(self, ops: Iterable[Op]) -> List[Any]:
+        out = []
+        with self._tx() as db:
+            for ns, uid, fn in ops:
+                row = db.execute(
+                    "SELECT data FROM state WHERE ns = ? AND uid = ?", (ns, uid)
+                ).fetchone()
+                value = fn(json.loads(row[0]) if row else None)
+                self._write(db, ns, uid, value)
+                out.append(value)
+        return out
+
+    def all(self, ns: str) -> Dict[str, Any]:
+        rows = self._conn().execute(
+            "SELECT uid, data FROM state WHERE ns = ?", (ns,)
+        )
+        return {uid: json.loads(data) for uid, data in rows}
+
+    def import_json(self, ns: str, path: str | Path) -> int:
+        with self._tx() as db:
+            if db.execute("SELECT 1 FROM migrations WHERE ns = ?", (ns,)).fetchone():
+                return 0
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = {}
+            db.executemany(
+                "INSERT OR IGNORE INTO state (ns, uid, data) VALUES (?, ?, ?)",
+                [(ns, str(k), json.dumps(v, ensure_ascii=False)) for k, v in data.items()],
+            )
+            db.execute(
+                "INSERT INTO migrations (ns, source, ts) VALUES (?, ?, ?)",
+                (ns, str(path), datetime.now().isoformat(timespec="seconds")),
+            )
+        return len(data)
+
+    @staticmethod
+    def _write(db: sqlite3.Connection, ns: str, uid: str, value: Any) -> None:
+        db.execute(
+            "INSERT INTO state (ns, uid, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (ns, uid) DO UPDATE SET data = excluded.data",
+            (ns, uid, json.dumps(value, ensure_ascii=False)),
+        )
+
+
+# ────────────────────────────────────────
+# JSON (прежнее поведение)
+# ────────────────────────────────────────
+class JsonStore(StateStore):
+    """Каждый ns – отдельный *.json; запись = перезапись файла целиком."""
+
+    def __init__(self, files: Dict[str, str | Path]):
+        self.files = {ns: Path(p) for ns, p in files.items()}
+        self._lock = threading.RLock()
+
+    def _load(self, ns: str) -> dict:
+        try:
+            with open(self.files[ns], encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, ns: str, data: dict) -> None:
+        path = self.files[ns]
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def get(self, ns: str, uid: str, default: Any = None) -> Any:
+        return self._load(ns).get(uid, default)
+
+    def put(self, ns: str, uid: str, value: Any) -> None:
+        self.update(ns, uid, lambda _: value)
+
+    def update_many(self, ops: Iterable[Op]) -> List[Any]:
+        out = []
+        with self._lock:
+            loaded: Dict[str, dict] = {}
+            for ns, uid, fn in ops:
+                if ns not in loaded:
+                    loaded[ns] = self._load(ns)
+                data = loaded[ns]
+                data[uid] = fn(data.get(uid))
+                out.append(data[uid])
+            for ns, data in loaded.items():
+                self._save(ns, data)
+        return out
+
+    def all(self, ns: str) -> Dict[str, Any]:
+        return self._load(ns)
+
+
+# ────────────────────────────────────────
+# общий экземпляр
+# ────────────────────────────────────────
+@lru_cache
+def get_store() -> StateStore:
+    legacy = {ns: os.getenv(env, default) for ns, (env, default) in LEGACY_FILES.items()}
+    if os.getenv("STATE_BACKEND", "sqlite").lower() == "json":
+        return JsonStore(legacy)
+    store = SQLiteStore(os.getenv("STATE_DB", "user_state.sqlite3"))
+    for ns, path in legacy.items():
+        store.import_json(ns, path)
+    return store
@@ -0,0 +1,71 @@
+"""
+synthesis.py – неизменяемый запрос на синтез
+============================================
+SynthesisRequest несёт всё, что нужно одному синтезу: текст, путь к слепку,
+итоговые sampling-параметры и (необязательно) файл результата.
+VoiceModule.synthesize(request) не читает и не меняет общее состояние
+модуля, поэтому запросы можно выполнять параллельно в потоках и в
+процессах-репликах (объект сериализуется pickle).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+DEFAULT_PARAMS: Dict[str, float] = {
+    "temperature": 0.7,
+    "top_k": 50,
+    "top_p": 0.85,
+    "repetition_penalty": 2.0,
+    "length_penalty": 1.0,
+    "speed": 1.0,
+}
+
+# какие поля пользовательских настроек относятся к синтезу
+TTS_KEYS = frozenset(DEFAULT_PARAMS)
+
+
+def _clamp(v: float, low: float, high: float) -> float:
+    """Ограничить значение диапазоном [low, high]."""
+    return max(low, min(high, v))
+
+
+def resolve_params(overrides: Optional[Mapping] = None) -> Dict[str, float]:
+    """DEFAULT_PARAMS + допустимые переопределения; speed – в [0.1, 3.0]."""
+    params = {**DEFAULT_PARAMS, **{k: v for k, v in (overrides or {}).items() if k in TTS_KEYS}}
+    # speed может прилететь экзотический — ограничиваем
+    params["speed"] = _clamp(float(params.get("speed", 1.0)), 0.1, 3.0)
+    return params
+
+
+@dataclass(frozen=True)
+class SynthesisRequest:
+    user_id: str
+    text: str
+    embedding: Path
+    params: Tuple[Tuple[str, float], ...]
+    outfile: Optional[Path] = None
+
+    @classmethod
+    def create(
+        cls,
+        user_id: str,
+        text: str,
+        embedding: str | Path,
+        params: Optional[Mapping] = None,
+        outfile: Optional[str | Path] = None,
+    ) -> "SynthesisRequest":
+        """Собрать запрос: params – настройки пользователя (лишние ключи отбрасываются)."""
+        return cls(
+            user_id=str(user_id),
+            text=text,
+            embedding=Path(embedding),
+            params=tuple(sorted(resolve_params(params).items())),
+            outfile=Path(outfile) if outfile else None,
+        )
+
+    def sampling(self) -> Dict[str, float]:
+        """Параметры синтеза – свежий dict (мутации запрос не затрагивают)."""
+        return dict(self.params)
@@ -1,5 +1,11 @@
 import pytest, os, tempfile, io, wave, contextlib, types, sys
 
+# состояние пользователей – во временной SQLite, а не в рабочих файлах
+_STATE_DIR = tempfile.mkdtemp()
+os.environ.setdefault("STATE_DB", os.path.join(_STATE_DIR, "state.sqlite3"))
+os.environ.setdefault("GEN_JOURNAL", os.path.join(_STATE_DIR, "gen_counters.journal"))
+os.environ.setdefault("TTS_CACHE_DIR", os.path.join(_STATE_DIR, "tts_cache"))
+
 # ---- lightweight stub for voice_module before importing server_bot ----
 class DummyVM:
     def __init__(self, *a, **k):
@@ -16,20 +22,32 @@ class DummyVM:
             p["speed"] = min(3.0, p["speed"])
         self._params[uid] = p
 
-    def create_embedding(self, path, uid):
+    def create_embedding(self, audio, uid, slot=None):
         dst = os.path.join(self.storage, f"emb_{uid}.wav")
         open(dst, "wb").write(b"RIFF")
         return dst
 
-    def synthesize(self, uid, text, embedding_file=None):
+    def synthesize(self, req, text=None, embedding_file=None, **params):
+        uid = getattr(req, "user_id", req)  # SynthesisRequest или прежний user_id
         dst = os.path.join(self.storage, f"tts_{uid}.wav")
         open(dst, "wb").write(b"RIFF" + b"0" * 1000)
         return dst
 
+    def synthesize_stream(self, req, text=None, embedding_file=None):
+        for _ in range(3):
+            yield b"\0\0" * 240
+
 sys.modules['voice_module'] = types.ModuleType('voice_module')
 sys.modules['voice_module'].VoiceModule = DummyVM
 sys.modules['audio_checker'] = types.ModuleType('audio_checker')
 sys.modules['audio_checker'].predict = lambda path: "BINARY:0 CLASS:0"
+sys.modules['audio_checker'].load_model = lambda: None
+sys.modules['audio_checker'].SAMPLE_RATE = 16000
+sys.modules['audio_checker'].WINDOW_SAMPLES = 204_289
+sys.modules['audio_checker'].load_audio = lambda path, sr=16000: path
+sys.modules['audio_checker'].predict_batch = lambda items: [
+    {"fake": 0.0, "classes": {}, "label": "BINARY:0 CLASS:0"} for _ in items
+]
 sys.modules['classifier'] = types.ModuleType('classifier')
 class DummyClf:
     async def analyse(self, text):
@@ -43,6 +61,18 @@ def client():
     flask_app.config["TESTING"] = True
     return flask_app.test_client()
 
+@pytest.fixture(autouse=True)
+def fresh_counters(tmp_path, monkeypatch):
+    """Свои дневные счётчики на каждый тест: общий get_counters() – на процесс."""
+    import server_bot, bot_extra_commands
+    from counters import DailyCounters
+
+    counters = DailyCounters(tmp_path / "gen_counters.journal")
+    monkeypatch.setattr(server_bot, "COUNTERS", counters)
+    monkeypatch.setattr(bot_extra_commands, "get_counters", lambda: counters)
+    yield counters
+    counters.close()
+
 @pytest.fixture
 def silence_wav(tmp_path):
     """1-секундный WAV 16 kHz silence."""
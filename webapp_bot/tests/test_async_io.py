@@ -0,0 +1,20 @@
+import asyncio
+import threading
+import time
+import pytest
+from async_io import run_io, LoopLagMonitor
+
+@pytest.mark.asyncio
+async def test_run_io_leaves_loop_thread():
+    main = threading.get_ident()
+    assert await run_io(threading.get_ident) != main
+
+@pytest.mark.asyncio
+async def test_lag_monitor_reports_blocking_callback():
+    mon = LoopLagMonitor(threshold=0.05, interval=0.01)
+    mon.start()
+    await asyncio.sleep(0.03)
+    time.sleep(0.2)               # блокируем цикл
+    await asyncio.sleep(0.03)
+    mon.stop()
+    assert mon.stalls >= 1 and mon.stats()["max_lag_ms"] >= 100
@@ -0,0 +1,164 @@
+import importlib.util
+import io
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+import server_bot as sb
+from batching import MicroBatcher
+from server_bot import app as flask_app
+
+
+def _real_checker():
+    # conftest подменяет audio_checker – берём настоящий модуль из файла
+    path = Path(__file__).resolve().parent.parent / "audio_checker.py"
+    spec = importlib.util.spec_from_file_location("audio_checker_real", path)
+    ac = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(ac)
+    return ac
+
+
+def _post(results, i, wav_bytes):
+    client = flask_app.test_client()
+    r = client.post("/audio_check", data={"audio": (io.BytesIO(wav_bytes), f"{i}.wav")})
+    results[i] = r
+
+
+def test_concurrent_uploads_share_one_batch(monkeypatch, silence_wav):
+    sizes = []
+
+    def fn(mels):
+        sizes.append(len(mels))
+        return [{"fake": 0.9, "classes": {"original": 0.1}, "label": "BINARY: fake, CLASS: x"}
+                for _ in mels]
+
+    batcher = MicroBatcher(fn, window=0.5, max_batch=8, name="test-check")
+    monkeypatch.setattr(sb, "CHECK_BATCHER", batcher)
+    wav_bytes = Path(silence_wav).read_bytes()
+    results = {}
+    threads = [threading.Thread(target=_post, args=(results, i, wav_bytes)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    batcher.close()
+
+    assert sum(sizes) == 4 and max(sizes) >= 2
+    for r in results.values():
+        body = r.get_json()
+        assert r.status_code == 200 and body["fake"] == 0.9
+        assert body["result"].startswith("BINARY: fake")
+
+
+def test_broken_upload_does_not_fail_batch(monkeypatch, client):
+    checker = sb.AUDIO_CHECKER.get()
+    calls = []
+    batcher = MicroBatcher(lambda mels: calls.append(mels) or [], window=0.01, name="test-check")
+    monkeypatch.setattr(sb, "CHECK_BATCHER", batcher)
+
+    def bad_audio(path, sr=16000):
+        raise ValueError("not audio")
+
+    monkeypatch.setattr(checker, "load_audio", bad_audio)
+    r = client.post("/audio_check", data={"audio": (io.BytesIO(b"junk"), "a.wav")})
+    assert r.status_code == 500 and "not audio" in r.get_json()["message"]
+    batcher.close()
+    assert calls == []  # декодирование идёт до пачки, соседей ошибка не задевает
+
+
+def test_long_upload_is_cropped_or_rejected(monkeypatch, client):
+    checker = sb.AUDIO_CHECKER.get()
+    seen = []
+    batcher = MicroBatcher(
+        lambda items: [seen.append(len(x)) or {"fake": 0.1, "classes": {}, "label": "BINARY: real"}
+                       for x in items],
+        window=0.01, name="test-check",
+    )
+    monkeypatch.setattr(sb, "CHECK_BATCHER", batcher)
+    monkeypatch.setattr(checker, "load_audio", lambda data, sr=16000: [0.0] * (sr * 60))
+    r = client.post("/audio_check", data={"audio": (io.BytesIO(b"RIFF"), "a.wav")})
+    assert r.status_code == 200 and seen == [checker.WINDOW_SAMPLES]  # только первое окно
+
+    monkeypatch.setattr(sb, "AUDIO_CHECK_MAX_SEC", 30.0)
+    for url in ("/audio_check", "/audio_check?mode=windows", "/audio_check/stream"):
+        r = client.post(url, data={"audio": (io.BytesIO(b"RIFF"), "a.wav")})
+        assert r.status_code == 413 and "30 s" in r.get_json()["message"]
+    batcher.close()
+    assert seen == [checker.WINDOW_SAMPLES]
+
+
+def test_predict_batch_matches_single():
+    torch = pytest.importorskip("torch")
+    ac = _real_checker()
+    torch.manual_seed(0)
+    ac.MODEL = ac.PatentTTSNet().train(False)
+
+    mels = [torch.randn(n, ac.N_MELS) for n in (120, 400, 530)]
+    batch = ac.predict_batch(mels)
+    for mel, out in zip(mels, batch):
+        single = ac.predict_batch([mel])[0]
+        assert out["fake"] == pytest.approx(single["fake"], abs=1e-5)
+        assert out["label"] == single["label"]
+        assert sum(out["classes"].values()) == pytest.approx(1.0)
+    assert ac.predict_batch([]) == []
+
+
+def _fake_windows(monkeypatch, scores):
+    checker = sb.AUDIO_CHECKER.get()
+    windows = [(i * 6.4, i * 6.4 + 12.8, p) for i, p in enumerate(scores)]
+    monkeypatch.setattr(checker, "split_windows", lambda wav: windows, raising=False)
+    monkeypatch.setattr(checker, "verdict", lambda ws: {
+        "fake": max(w["fake"] for w in ws), "label": "BINARY: fake, CLASS: x",
+        "suspicious": [[6.4, 19.2]], "duration": ws[-1]["end"], "windows": len(ws),
+    }, raising=False)
+    sizes = []
+
+    def fn(items):  # «окно» – сразу его оценка
+        sizes.append(len(items))
+        return [{"fake": p, "classes": {}, "label": ""} for p in items]
+
+    batcher = MicroBatcher(fn, window=0.01, max_batch=2, name="test-check")
+    monkeypatch.setattr(sb, "CHECK_BATCHER", batcher)
+    return sizes
+
+
+def test_windowed_check(monkeypatch, client):
+    sizes = _fake_windows(monkeypatch, [0.1, 0.9, 0.2])
+    r = client.post("/audio_check?mode=windows", data={"audio": (io.BytesIO(b"RIFF"), "a.wav")})
+    body = r.get_json()
+    assert r.status_code == 200 and body["fake"] == 0.9
+    assert [w["start"] for w in body["windows"]] == [0.0, 6.4, 12.8]
+    assert body["suspicious"] == [[6.4, 19.2]] and body["duration"] == 25.6
+    assert max(sizes) <= 2 and sum(sizes) == 3  # группами по max_batch
+
+
+def test_stream_check_ndjson(monkeypatch, client):
+    _fake_windows(monkeypatch, [0.1, 0.9, 0.2])
+    r = client.post("/audio_check/stream", data={"audio": (io.BytesIO(b"RIFF"), "a.wav")})
+    assert r.status_code == 200 and r.mimetype == "application/x-ndjson"
+    lines = [json.loads(x) for x in r.get_data(as_text=True).splitlines()]
+    assert [x["type"] for x in lines] == ["window"] * 3 + ["verdict"]
+    assert lines[1]["fake"] == 0.9 and lines[-1]["result"].startswith("BINARY: fake")
+
+
+def test_windows_and_verdict():
+    torch = pytest.importorskip("torch")
+    ac = _real_checker()
+    wav = torch.zeros(ac.SAMPLE_RATE * 30)
+    windows = ac.split_windows(wav)
+    assert windows[0][0] == 0.0 and windows[-1][1] == 30.0
+    assert all(len(w) == ac.WINDOW_SAMPLES for _, _, w in windows)
+    assert len(ac.split_windows(wav[:ac.SAMPLE_RATE])) == 1
+
+    scored = [
+        {"start": 0.0, "end": 12.8, "fake": 0.1, "classes": {"original": 0.9, "x": 0.1}},
+        {"start": 6.4, "end": 19.2, "fake": 0.7, "classes": {"original": 0.2, "x": 0.8}},
+        {"start": 12.8, "end": 25.6, "fake": 0.6, "classes": {"original": 0.3, "x": 0.7}},
+        {"start": 25.6, "end": 38.4, "fake": 0.8, "classes": {"original": 0.1, "x": 0.9}},
+    ]
+    out = ac.verdict(scored)
+    assert out["label"] == "BINARY: fake, CLASS: x" and out["fake"] == 0.8
+    assert out["suspicious"] == [[6.4, 38.4]]  # смежные окна сливаются
+    assert ac.verdict(scored[:1])["label"] == "BINARY: real, CLASS: original"
@@ -0,0 +1,99 @@
+import pytest
+from types import SimpleNamespace
+
+import numpy as np
+
+import server_bot as sb
+from audio_format import decode_audio, encode_audio, output_format, wav_header
+from state_store import SQLiteStore
+
+
+def test_output_format_aliases_and_wav_passthrough():
+    assert output_format("opus") == output_format(".OGG") == "ogg"
+    assert output_format("mp3") == "mp3"
+    assert output_format("flac") is None
+    assert encode_audio(b"RIFFdata", "wav") == b"RIFFdata"
+
+
+def test_decode_pcm_wav_in_memory():
+    stereo = np.array([[1000, -1000], [2000, 0]], dtype="<i2").tobytes()
+    data = wav_header(16_000, len(stereo), channels=2) + stereo
+    samples, sr = decode_audio(data)
+    assert sr == 16_000
+    assert np.allclose(samples, [0.0, 1000 / 32768])
+
+
+def _fake_encode(calls):
+    def encode(wav, fmt, kbps):
+        calls.append((fmt, kbps))
+        return b"OggS" if fmt == "ogg" else b"ID3"
+    return encode
+
+
+def test_voice_tts_negotiates_format(client, monkeypatch, tmp_path):
+    uid = "fmt_user"
+    monkeypatch.setattr(sb, "USERS_EMB", tmp_path)
+    (tmp_path / uid).mkdir()
+    np.savez(tmp_path / uid / "speaker_embedding_0.npz", gpt_cond_latent=np.full(4, 7.0))
+    calls = []
+    monkeypatch.setattr(sb, "encode_audio", _fake_encode(calls))
+    body = {"userId": uid, "text": "Формат ответа", "slot": 0}
+
+    r = client.post("/voice/tts", json=body, headers={"Accept": "audio/ogg"})
+    assert r.status_code == 200 and r.mimetype == "audio/ogg" and r.data == b"OggS"
+    r = client.post("/voice/tts?format=mp3", json=body)
+    assert r.mimetype == "audio/mpeg" and r.data == b"ID3"
+    r = client.post("/voice/tts", json=body)  # без Accept – WAV, как раньше
+    assert r.mimetype == "audio/wav" and r.data.startswith(b"RIFF")
+    assert client.post("/voice/tts?format=flac", json=body).status_code == 406
+    # free-тариф: Opus 24 кбит/с, MP3 – вдвое выше
+    assert calls == [("ogg", 24), ("mp3", 48)]
+
+
+class VoiceBot:
+    def __init__(self):
+        self.sent = []
+    async def send_voice(self, chat_id, voice):
+        self.sent.append(("voice", voice))
+        return SimpleNamespace(chat_id=chat_id, message_id=50)
+    async def send_audio(self, chat_id, audio, title):
+        self.sent.append(("audio", audio))
+        return SimpleNamespace(chat_id=chat_id, message_id=50)
+
+
+class DummyMsg:
+    text = "Голосовое сообщение"
+    message_id = 10
+    async def reply_text(self, text, **kw):
+        return SimpleNamespace(chat_id=1, message_id=11)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("ffmpeg_ok", [True, False])
+async def test_tg_text_sends_opus_voice(monkeypatch, tmp_path, ffmpeg_ok):
+    uid = "77"
+    sb.ACTIVE_SLOTS[uid] = 0
+    monkeypatch.setattr(sb, "USERS_EMB", tmp_path / "u")
+    (sb.USERS_EMB / uid).mkdir(parents=True)
+    (sb.USERS_EMB / uid / "speaker_embedding_0.npz").write_bytes(f"ogg-{ffmpeg_ok}".encode())
+    monkeypatch.setattr(sb, "STORE", SQLiteStore(tmp_path / "s.sqlite3"))
+    sb.STORE.put("settings", uid, {"filter_off": True})
+    if ffmpeg_ok:
+        monkeypatch.setattr(sb, "encode_audio", _fake_encode([]))
+    else:
+        def missing(*a):
+            raise FileNotFoundError("ffmpeg")
+        monkeypatch.setattr(sb, "encode_audio", missing)
+
+    bot = VoiceBot()
+    msg = DummyMsg()
+    upd = SimpleNamespace(
+        effective_user=SimpleNamespace(id=uid),
+        effective_chat=SimpleNamespace(id=1),
+        effective_message=msg,
+        message=msg,
+    )
+    await sb.tg_text(upd, SimpleNamespace(bot=bot, args=[]))
+    kind, payload = bot.sent[0]
+    assert kind == ("voice" if ffmpeg_ok else "audio")
+    assert payload.filename.endswith(".ogg" if ffmpeg_ok else ".wav")
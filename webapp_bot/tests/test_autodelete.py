@@ -1,6 +1,10 @@
+import asyncio
+import time
 import pytest
 from types import SimpleNamespace
 import server_bot as sb
+from autodelete import DeletionScheduler
+from state_store import SQLiteStore
 
 class DummyBot:
     def __init__(self):
@@ -10,10 +14,15 @@ class DummyBot:
     async def send_audio(self, chat_id, audio, title):
         return SimpleNamespace(chat_id=chat_id, message_id=50)
 
+class BatchBot(DummyBot):
+    async def delete_messages(self, chat_id, message_ids):
+        self.deleted.extend((chat_id, m) for m in message_ids)
+
 class DummyMsg:
     def __init__(self, chat_id=1):
         self.chat_id = chat_id
         self.message_id = 10
+        self.text = "hello"
     async def reply_text(self, text, **kw):
         return SimpleNamespace(chat_id=self.chat_id, message_id=11)
 
@@ -32,18 +41,61 @@ async def test_delete_message_called(monkeypatch, tmp_path):
     (emb_dir / "speaker_embedding_0.npz").write_bytes(b"0")
     out = tmp_path / "out.wav"
     out.write_bytes(b"RIFF")
-    monkeypatch.setattr(sb.VOICE, "synthesize", lambda uid, txt: out)
-    monkeypatch.setattr(sb, "apply_user_settings", lambda u: None)
+    monkeypatch.setattr(sb.VOICE, "synthesize", lambda req: out)
     monkeypatch.setattr(sb, "tariff_info", lambda u: {"slots":1, "daily_gen":5})
     monkeypatch.setattr(sb, "daily_gen_count", lambda u: 0)
-    monkeypatch.setattr(sb, "auto_delete_enabled", lambda u: True)
-    monkeypatch.setattr(sb, "load_json", lambda p: {uid: {"filter_off": True}})
+    monkeypatch.setattr(sb, "STORE", SQLiteStore(tmp_path / "s.sqlite3"))
+    sb.STORE.put("settings", uid, {"filter_off": True, "auto_delete": True})
 
     ctx = SimpleNamespace(bot=DummyBot(), args=[])
+    msg = DummyMsg()
     upd = DummyUpd(
         effective_user=SimpleNamespace(id=uid),
         effective_chat=SimpleNamespace(id=1),
-        message=DummyMsg(),
+        effective_message=msg,
+        message=msg,
     )
+    started = time.monotonic()
     await sb.tg_text(upd, ctx)
+    assert time.monotonic() - started < sb.DEL_DELAY  # хендлер не ждёт удаления
+    for _ in range(100):          # удаление идёт фоновой задачей
+        await sb.DELETER.run_due()
+        if (1, 10) in ctx.bot.deleted:
+            break
+        await asyncio.sleep(0.01)
     assert (1, 10) in ctx.bot.deleted
+
+@pytest.mark.asyncio
+async def test_scheduler_batches_and_survives_restart(tmp_path):
+    store = SQLiteStore(tmp_path / "s.sqlite3")
+    bot = BatchBot()
+    first = DeletionScheduler(store)
+    first.schedule(bot, 7, 1)
+    first.schedule(bot, 7, 2)
+    first.schedule(bot, 7, 3, delay=60)
+    assert await first.run_due() == 2
+    assert sorted(bot.deleted) == [(7, 1), (7, 2)]
+
+    second = DeletionScheduler(store)   # «рестарт процесса»
+    assert await second.restore(bot) == 1
+
+class FlakyStore(SQLiteStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.fail = 1
+    def update_many(self, ops):
+        if self.fail:
+            self.fail -= 1
+            raise OSError("disk full")
+        return super().update_many(ops)
+
+@pytest.mark.asyncio
+async def test_failed_persist_is_retried(tmp_path):
+    store = FlakyStore(tmp_path / "s.sqlite3")
+    sched = DeletionScheduler(store)
+    sched.schedule(BatchBot(), 5, 1, delay=60)
+    await sched.run_due()                  # запись упала – чат остался «грязным»
+    assert sched._dirty == {5} and store.all("autodelete") == {}
+    await sched.run_due()
+    assert sched._dirty == set() and list(store.all("autodelete")["5"]) == ["1"]
+    sched._task.cancel()
@@ -0,0 +1,47 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def test_requests_within_window_share_a_batch():
+    seen = []
+
+    def fn(items):
+        seen.append(list(items))
+        return [x * 10 for x in items]
+
+    b = MicroBatcher(fn, window=0.2, max_batch=4)
+    with concurrent.futures.ThreadPoolExecutor(6) as ex:
+        res = list(ex.map(b.call, range(6)))
+    b.close()
+    assert res == [x * 10 for x in range(6)]      # ответы – своим запросам
+    assert max(map(len, seen)) == 4               # упёрлись в max_batch
+    assert b.stats()["items"] == 6 and b.stats()["batches"] < 6
+
+
+def test_window_bounds_latency():
+    b = MicroBatcher(lambda items: items, window=0.05, max_batch=16)
+    started = time.monotonic()
+    assert b.call("one", timeout=5) == "one"
+    assert time.monotonic() - started < 1.0
+    b.close()
+
+
+def test_error_fails_whole_batch():
+    gate = threading.Event()
+
+    def fn(items):
+        gate.wait(1)
+        raise ValueError("oops")
+
+    b = MicroBatcher(fn, window=0.1, max_batch=2)
+    f1, f2 = b.submit(1), b.submit(2)
+    gate.set()
+    for f in (f1, f2):
+        with pytest.raises(ValueError):
+            f.result(timeout=5)
+    b.close()
@@ -0,0 +1,56 @@
+import threading
+from datetime import date, timedelta
+
+from counters import DailyCounters
+
+
+def test_incr_get_reset(tmp_path):
+    c = DailyCounters(tmp_path / "j", flush_interval=60)
+    assert c.get("u") == 0
+    assert c.incr("u") == 1
+    assert c.incr("u", 2) == 3
+    c.reset("u")
+    assert c.get("u") == 0
+    c.close()
+
+
+def test_journal_replay(tmp_path):
+    path = tmp_path / "j"
+    c = DailyCounters(path, flush_interval=60)
+    c.incr("a", 2); c.incr("b"); c.reset("b"); c.incr("a")
+    c.close()
+    c2 = DailyCounters(path, flush_interval=60)
+    assert (c2.get("a"), c2.get("b")) == (3, 0)
+    c2.close()
+
+
+def test_atomic_across_threads(tmp_path):
+    c = DailyCounters(tmp_path / "j", flush_interval=0.01)
+    ts = [threading.Thread(target=lambda: [c.incr("u") for _ in range(500)]) for _ in range(8)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    c.close()
+    assert c.get("u") == 4000
+    assert DailyCounters(tmp_path / "j", flush_interval=60).get("u") == 4000
+
+
+def test_compaction(tmp_path):
+    path = tmp_path / "j"
+    c = DailyCounters(path, flush_interval=60, compact_after=10)
+    for _ in range(25):
+        c.incr("u")
+    c.flush()
+    assert path.read_text().splitlines() == [f"{date.today().isoformat()}\tu\t=25"]
+    c.close()
+
+
+def test_midnight_rollover(tmp_path):
+    path = tmp_path / "j"
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    path.write_text(f"{yesterday}\tu\t+5\n")
+    c = DailyCounters(path, flush_interval=60)
+    assert c.get("u") == 0  # вчерашние записи не учитываются
+    c.incr("u")
+    c._day = date.today() - timedelta(days=1)  # «до полуночи»
+    assert c.get("u") == 0
+    c.close()
@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+
+from emb_cache import EmbeddingCache
+
+
+def _save(path, value):
+    tmp = path.with_name("new.npz")
+    np.savez(tmp, gpt_cond_latent=np.full((1, 32, 1024), value, np.float32),
+             speaker_embedding=np.full((1, 512, 1), value, np.float32))
+    os.replace(tmp, path)  # как установка слота в server_bot
+
+
+def _loader(calls):
+    def load(path):
+        calls.append(path)
+        with np.load(path) as d:
+            return d["gpt_cond_latent"].copy(), d["speaker_embedding"].copy()
+    return load
+
+
+def test_hit_and_invalidate_on_overwrite(tmp_path):
+    calls = []
+    cache = EmbeddingCache(_loader(calls), max_mb=8)
+    slot = tmp_path / "speaker_embedding_0.npz"
+    _save(slot, 1.0)
+    for _ in range(10):
+        g, s = cache.get(slot)
+    assert len(calls) == 1 and g[0, 0, 0] == 1.0
+    assert cache.stats()["hits"] == 9 and cache.stats()["misses"] == 1
+
+    _save(slot, 2.0)  # перезапись слота
+    g, _ = cache.get(slot)
+    assert len(calls) == 2 and g[0, 0, 0] == 2.0
+    assert cache.stats()["entries"] == 1
+
+
+def test_lru_eviction_by_size(tmp_path):
+    calls = []
+    one = (32 * 1024 + 512) * 4  # байт на слепок
+    cache = EmbeddingCache(_loader(calls), max_mb=2.5 * one / (1024 * 1024))
+    paths = [tmp_path / f"e{i}.npz" for i in range(3)]
+    for i, p in enumerate(paths):
+        _save(p, float(i))
+    cache.get(paths[0]); cache.get(paths[1])
+    cache.get(paths[0])          # e0 свежее e1
+    cache.get(paths[2])          # вытесняет e1
+    assert cache.stats()["entries"] == 2
+    cache.get(paths[0])
+    assert len(calls) == 3
+    cache.get(paths[1])
+    assert len(calls) == 4
@@ -0,0 +1,88 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from mel_frontend import HOP_LENGTH, hz_to_mel, length_groups, mel_filterbank, mel_to_hz
+
+SR = 16_000
+
+
+def _signal(seconds: float, seed: int = 0) -> np.ndarray:
+    t = np.arange(int(SR * seconds)) / SR
+    rng = np.random.default_rng(seed)
+    chirp = np.sin(2 * np.pi * (200 + 1500 * t) * t)
+    return (0.5 * chirp + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def test_slaney_scale_and_filterbank():
+    assert hz_to_mel(1000.0) == pytest.approx(15.0)
+    f = np.array([0.0, 440.0, 1000.0, 3000.0, 8000.0])
+    assert np.allclose(mel_to_hz(hz_to_mel(f)), f)
+    fb = mel_filterbank(SR, 2048, 80)
+    assert fb.shape == (80, 1025) and fb.dtype == np.float32
+    assert (fb >= 0).all() and (fb.sum(axis=1) > 0).all()
+    assert mel_filterbank(SR, 2048, 80) is fb  # кеш
+
+
+def test_filterbank_matches_librosa():
+    librosa = pytest.importorskip("librosa")
+    ref = librosa.filters.mel(sr=SR, n_fft=2048, n_mels=80)
+    assert np.allclose(mel_filterbank(SR, 2048, 80), ref, atol=1e-7)
+
+
+def test_length_groups_bound_padding():
+    lengths = [16_000, 500, 31_000, 1_000, 160_000, 0]
+    groups = length_groups(lengths)
+    assert sorted(i for g in groups for i in g) == list(range(len(lengths)))
+    assert groups == [[5], [1, 3], [0, 2], [4]]
+    for g in groups:
+        assert max(lengths[i] for i in g) <= 2 * max(1, min(lengths[i] for i in g))
+    assert length_groups([]) == []
+
+
+def test_batch_equals_single():
+    pytest.importorskip("torch")
+    from mel_frontend import log_mel
+
+    waves = [_signal(0.7, 1), _signal(3.1, 2), _signal(0.05, 3)]
+    batch = log_mel(waves, SR)
+    for w, m in zip(waves, batch):
+        single = log_mel([w], SR)[0]
+        assert m.shape == (1 + len(w) // HOP_LENGTH, 80)
+        assert float((m - single).abs().max()) < 1e-4
+        assert float(m.max()) == 0.0 and float(m.min()) >= -80.0
+
+
+def test_log_mel_matches_librosa():
+    pytest.importorskip("torch")
+    librosa = pytest.importorskip("librosa")
+    from mel_frontend import log_mel
+
+    waves = [_signal(2.3, 4), _signal(0.4, 5)]
+    for w, m in zip(waves, log_mel(waves, SR)):
+        ref = librosa.power_to_db(
+            librosa.feature.melspectrogram(y=w, sr=SR, n_mels=80, power=2.0), ref=np.max
+        ).T
+        assert m.shape == ref.shape
+        assert np.abs(m.numpy() - ref).max() < 0.05
+
+
+def test_load_audio_pcm_wav(tmp_path):
+    pytest.importorskip("torch")
+    from mel_frontend import load_audio
+
+    w = _signal(0.5)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SR)
+        out.writeframes((w * 32767).astype("<i2").tobytes())
+    path = tmp_path / "a.wav"
+    path.write_bytes(buf.getvalue())
+    wav = load_audio(path, SR)
+    assert wav.shape == (len(w),)
+    assert np.abs(wav.numpy() - w).max() < 1e-3
+    assert (load_audio(buf.getvalue(), SR) == wav).all()
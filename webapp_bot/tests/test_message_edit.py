@@ -1,6 +1,7 @@
 import pytest
 from types import SimpleNamespace
 import server_bot as sb
+from state_store import SQLiteStore
 
 class DummyMsg:
     def __init__(self, text):
@@ -21,8 +22,7 @@ class DummyBot:
 @pytest.mark.asyncio
 async def test_edited_message_triggers_tts(monkeypatch, tmp_path):
     monkeypatch.setattr(sb, "USERS_EMB", tmp_path / "u")
-    monkeypatch.setattr(sb, "SETTINGS_DB", str(tmp_path / "s.json"))
-    (tmp_path / "s.json").write_text("{}")
+    monkeypatch.setattr(sb, "STORE", SQLiteStore(tmp_path / "s.sqlite3"))
     uid = "1"
     (sb.USERS_EMB / uid).mkdir(parents=True)
     (sb.USERS_EMB / uid / "speaker_embedding_0.npz").write_bytes(b"x")
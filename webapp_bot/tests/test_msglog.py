@@ -0,0 +1,86 @@
+import gzip
+from datetime import date
+from msglog import MessageLogWriter, last_lines, read_history, segments, IDX_NAME
+
+def test_buffered_until_flush(tmp_path):
+    w = MessageLogWriter(flush_interval=60)
+    w.write(tmp_path, "one")
+    w.write(tmp_path, "two")
+    assert not (tmp_path / "message.log").exists()
+    w.flush(tmp_path)
+    assert [l.split("] ", 1)[1] for l in last_lines(tmp_path, 5)] == ["one\n", "two\n"]
+    assert (tmp_path / IDX_NAME).stat().st_size == 16
+    w.close()
+
+def test_rotation_and_tail_across_segments(tmp_path):
+    w = MessageLogWriter(flush_interval=60, max_bytes=200)
+    for i in range(20):
+        w.write(tmp_path, f"msg {i:02d}")
+        w.flush()
+    w.close()
+    segs = segments(tmp_path)
+    assert segs and all(s.suffix == ".gz" for s in segs)
+    with gzip.open(segs[0], "rt") as f:
+        assert "msg 00" in f.readline()
+    tail = [l.split("] ", 1)[1].strip() for l in last_lines(tmp_path, 8)]
+    assert tail == [f"msg {i:02d}" for i in range(12, 20)]
+
+def _write_log(folder, days_lines):
+    lines = [f"[{d} 12:00:{i % 60:02d}] {t}\n" for i, (d, t) in enumerate(days_lines)]
+    (folder / "message.log").write_text("".join(lines), encoding="utf-8")
+
+def _texts(lines):
+    return [l.split("] ", 1)[1].strip() for l in lines]
+
+def test_history_paging_and_day_filter(tmp_path):
+    rows = [("2025-06-14", f"a{i}") for i in range(5)] + \
+           [("2025-06-15", f"b{i}") for i in range(5)] + \
+           [("2025-06-16", f"c{i}") for i in range(5)]
+    _write_log(tmp_path, rows)
+    w = MessageLogWriter(flush_interval=60)
+    w.write(tmp_path, "latest")     # достраивает индекс для старого лога
+    w.flush()
+    w.close()
+    assert _texts(read_history(tmp_path, limit=3)) == ["c3", "c4", "latest"]
+    assert _texts(read_history(tmp_path, limit=3, page=2)) == ["c0", "c1", "c2"]
+    day = date(2025, 6, 15)
+    assert _texts(read_history(tmp_path, limit=2, day=day)) == ["b3", "b4"]
+    assert _texts(read_history(tmp_path, limit=2, page=3, day=day)) == ["b0"]
+    assert read_history(tmp_path, day=date(2024, 1, 1)) == []
+
+def test_history_without_index_reads_from_end(tmp_path):
+    rows = [("2025-06-15", "x" * 3000 + str(i)) for i in range(10)]
+    _write_log(tmp_path, rows)
+    out = read_history(tmp_path, limit=2, page=2)
+    assert [l.strip()[-1] for l in out] == ["6", "7"]
+    assert not (tmp_path / IDX_NAME).exists()
+
+def test_parse_history_args():
+    from bot_extra_commands import parse_history_args
+    assert parse_history_args([]) == {"limit": 5, "page": 1, "day": None}
+    assert parse_history_args(["20", "page", "3"])["page"] == 3
+    assert parse_history_args(["2025-06-15"])["day"] == date(2025, 6, 15)
+    assert parse_history_args(["page"]) is None
+
+def _rotate_many(folder, **kw):
+    w = MessageLogWriter(flush_interval=60, max_bytes=100, **kw)
+    for i in range(20):
+        w.write(folder, f"msg {i:02d}")
+        w.flush()
+    w.close()
+
+def test_segments_kept_unless_retention_enabled(tmp_path):
+    (tmp_path / "all").mkdir()
+    (tmp_path / "two").mkdir()
+    _rotate_many(tmp_path / "all")
+    _rotate_many(tmp_path / "two", keep_segments=2)
+    assert len(segments(tmp_path / "all")) > 2
+    assert len(segments(tmp_path / "two")) == 2
+
+def test_history_skips_vanished_segment(tmp_path, monkeypatch):
+    import msglog
+    _rotate_many(tmp_path)
+    real = msglog.segments
+    monkeypatch.setattr(msglog, "segments", lambda f: real(f) + [tmp_path / "message.20990101-000000-000.log.gz"])
+    tail = [l.split("] ", 1)[1].strip() for l in read_history(tmp_path, limit=3)]
+    assert tail == ["msg 17", "msg 18", "msg 19"]
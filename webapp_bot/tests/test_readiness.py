@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+import server_bot as sb
+from readiness import LazyModel, ModelNotReady, ModelProxy, ModelRegistry
+
+
+def test_lazy_model_loads_once_in_background():
+    gate, calls = threading.Event(), []
+
+    def loader():
+        calls.append(1)
+        gate.wait(5)
+        return {"value": 42}
+
+    model = LazyModel("slow", loader)
+    assert model.state == "idle"
+    with pytest.raises(ModelNotReady) as e:
+        model.get(timeout=0.01)  # запуск не блокирует
+    assert e.value.state == "loading" and model.status()["loading_sec"] >= 0
+    gate.set()
+    assert model.get(5) == {"value": 42} and model.get() is model.peek()
+    assert calls == [1] and model.status()["state"] == "ready"
+
+
+def test_failed_model_and_registry():
+    reg = ModelRegistry()
+    reg.register("ok", lambda: "x")
+    bad = reg.register("bad", lambda: 1 / 0)
+    reg.register("extra", lambda: 1 / 0, required=False)
+    reg.start()
+    with pytest.raises(ModelNotReady):
+        bad.get(5)
+    st = reg.status()
+    assert st["bad"]["state"] == "failed" and "ZeroDivisionError" in st["bad"]["error"]
+    assert not reg.ready()
+
+
+def test_lazy_model_not_started_by_registry():
+    calls = []
+    reg = ModelRegistry()
+    reg.register("stream-only", lambda: calls.append(1) or "m", required=False, eager=False)
+    reg.register("ok", lambda: "x")
+    reg.start()
+    reg["ok"].get(5)
+    assert reg.ready() and reg.status()["stream-only"]["state"] == "idle" and calls == []
+    assert reg["stream-only"].get(5) == "m" and calls == [1]  # по первому запросу
+
+
+def test_voice_routes_follow_workers_model():
+    # без реплик синтез и слепки ждут XTTS этого процесса
+    assert sb.VOICE_POOL.workers == 0 and sb.VOICE_MODEL is sb.XTTS
+    assert sb.XTTS.eager and sb.XTTS.required
+
+
+def test_proxy_delegates_and_allows_overrides():
+    proxy = ModelProxy(LazyModel("p", lambda: "text"))
+    assert proxy.upper() == "TEXT"
+    proxy.upper = lambda: "patched"
+    assert proxy.upper() == "patched"
+
+
+@pytest.mark.asyncio
+async def test_async_wait():
+    assert await LazyModel("a", lambda: 7).wait() == 7
+
+
+def test_route_answers_warming_up(monkeypatch):
+    gate = threading.Event()
+    model = LazyModel("slow_route", lambda: gate.wait(5))
+    monkeypatch.setattr(sb, "MODEL_WAIT_SEC", 0.01)
+    view = sb.requires_models(model)(lambda: "done")
+    with sb.app.test_request_context():
+        body, status, headers = view()
+        assert status == 503 and body.get_json()["status"] == "warming_up"
+        assert headers["Retry-After"]
+        gate.set()
+        model.get(5)
+        assert view() == "done"
+
+
+def test_healthz_and_readyz(client):
+    r = client.get("/healthz")
+    assert r.status_code == 200 and set(r.get_json()["models"]) >= {"xtts", "audio_checker"}
+    assert set(r.get_json()["loop_lag"]) == {"max_lag_ms", "stalls"}
+    sb.MODELS.start()
+    for name in ("xtts", "audio_checker", "classifier"):
+        sb.MODELS[name].get(5)
+    r = client.get("/readyz")
+    assert r.status_code == 200 and r.get_json()["status"] == "ready"
+    assert r.get_json()["models"]["xtts"]["load_sec"] is not None
@@ -0,0 +1,19 @@
+from registry import IdRegistry
+
+def test_add_and_contains(tmp_path):
+    f = tmp_path / "bl.txt"
+    reg = IdRegistry(f)
+    assert "1" not in reg
+    assert reg.add("1") is True
+    assert reg.add("1") is False
+    assert "1" in reg
+    assert f.read_text() == "1\n"
+
+def test_external_edit_is_picked_up(tmp_path):
+    f = tmp_path / "bl.txt"
+    f.write_text("1\n")
+    reg = IdRegistry(f, check_interval=0)
+    assert "2" not in reg
+    with open(f, "a") as fh:
+        fh.write("2\n")
+    assert "2" in reg and len(reg) == 2
@@ -0,0 +1,40 @@
+import numpy as np
+
+from segmenter import crossfade, split_sentences, split_text
+
+
+def test_split_sentences():
+    text = "Привет! Как дела? Всё хорошо… «Да.» Конец"
+    assert split_sentences(text) == ["Привет!", "Как дела?", "Всё хорошо…", "«Да.»", "Конец"]
+
+
+def test_pack_under_budget_keeps_order():
+    sents = [f"Предложение номер {i}." for i in range(20)]
+    segs = split_text(" ".join(sents), budget=60)
+    assert len(segs) > 1
+    assert all(len(s) <= 60 for s in segs)
+    assert " ".join(segs) == " ".join(sents)
+
+
+def test_long_sentence_split_by_clauses_then_words():
+    long = "раз, " * 30 + "конец."
+    segs = split_text(long, budget=40)
+    assert all(len(s) <= 40 for s in segs)
+    assert " ".join(segs).split() == long.split()
+    words = split_text("слово " * 50, budget=30)
+    assert all(len(s) <= 30 for s in words)
+
+
+def test_custom_length_counts_tokens():
+    segs = split_text("а б в. г д е. ж з и.", budget=6, length=lambda s: len(s.split()))
+    assert segs == ["а б в. г д е.", "ж з и."]
+
+
+def test_crossfade_length_and_no_gap():
+    sr = 1000
+    a, b = np.ones(100, np.float32), np.ones(200, np.float32)
+    out = crossfade([a, b], sr, fade_ms=20)
+    assert len(out) == 100 + 200 - 20
+    # равномощное перекрытие постоянного сигнала не проваливается к нулю
+    assert out.min() > 0.99
+    assert len(crossfade([a], sr)) == 100 and len(crossfade([], sr)) == 0
@@ -0,0 +1,39 @@
+import numpy as np
+
+import slots
+
+
+def test_save_npz_replaces_slot_atomically(tmp_path):
+    path = slots.slot_path(tmp_path, 2)
+    slots.save_npz(path, a=np.ones(3))
+    slots.save_npz(path, a=np.zeros(3))
+    with np.load(path) as d:
+        assert d["a"].sum() == 0
+    assert [p.name for p in tmp_path.iterdir()] == ["speaker_embedding_2.npz"]
+
+
+def test_manifest_mark_and_legacy_rebuild(tmp_path):
+    user = tmp_path / "7"
+    user.mkdir()
+    # старый пользователь: слоты 0 и 3 есть, манифеста ещё нет
+    for i in (0, 3):
+        slots.slot_path(user, i).write_bytes(b"x")
+    (user / "speaker_embedding_20240101_120000.npz").write_bytes(b"x")
+    assert slots.filled(user) == {0, 3}
+    assert (user / slots.MANIFEST).exists()
+
+    slots.save_npz(slots.slot_path(user, 1), a=np.ones(1))
+    slots.mark(user, 1)
+    assert slots.filled(user) == {0, 1, 3}
+
+
+def test_keyboard_marks_filled_slots_not_count(monkeypatch, tmp_path):
+    import server_bot as sb
+
+    monkeypatch.setattr(sb, "USERS_EMB", tmp_path)
+    monkeypatch.setattr(sb, "tariff_info", lambda u: {"slots": 3})
+    slots.slot_path(tmp_path / "9", 2).parent.mkdir()
+    slots.slot_path(tmp_path / "9", 2).write_bytes(b"x")
+    kb = sb.build_slot_keyboard("9")
+    data = [row[0].callback_data for row in kb.inline_keyboard]
+    assert data == ["new:0", "new:1", "slot:2"]
@@ -0,0 +1,43 @@
+import json
+import threading
+
+import pytest
+from state_store import SQLiteStore, JsonStore
+
+def test_sqlite_roundtrip(tmp_path):
+    st = SQLiteStore(tmp_path / "s.sqlite3")
+    assert st.get("settings", "1") is None
+    st.put("settings", "1", {"speed": 1.2})
+    assert st.get("settings", "1") == {"speed": 1.2}
+    assert st.all("settings") == {"1": {"speed": 1.2}}
+
+def test_incr_is_atomic_across_threads(tmp_path):
+    st = SQLiteStore(tmp_path / "s.sqlite3")
+    def worker():
+        for _ in range(50):
+            st.incr("strikes", "u")
+    ts = [threading.Thread(target=worker) for _ in range(4)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert st.get("strikes", "u") == 200
+
+def test_json_migration_runs_once(tmp_path):
+    src = tmp_path / "tariffs_db.json"
+    src.write_text(json.dumps({"7": "vip", "8": {"plan": "base", "bonus_gen": 2}}))
+    st = SQLiteStore(tmp_path / "s.sqlite3")
+    assert st.import_json("tariffs", src) == 2
+    st.put("tariffs", "7", {"plan": "free", "bonus_gen": 0})
+    assert st.import_json("tariffs", src) == 0
+    assert st.get("tariffs", "7")["plan"] == "free"
+    assert st.get("tariffs", "8")["bonus_gen"] == 2
+
+def test_json_backend(tmp_path):
+    f = tmp_path / "strikes.json"
+    st = JsonStore({"strikes": f})
+    assert st.incr("strikes", "u", 2) == 2
+    assert json.loads(f.read_text()) == {"u": 2}
+
+def test_base_store_is_abstract():
+    from state_store import StateStore
+    with pytest.raises(TypeError):
+        StateStore()
@@ -0,0 +1,28 @@
+import dataclasses
+import pickle
+from pathlib import Path
+
+import pytest
+
+import server_bot as sb
+from synthesis import DEFAULT_PARAMS, SynthesisRequest
+
+
+def test_request_is_immutable_and_picklable():
+    req = SynthesisRequest.create("u", "Привет", "e.npz", {"speed": 10, "junk": 1})
+    assert req.sampling()["speed"] == 3.0 and "junk" not in req.sampling()
+    assert req.sampling()["top_k"] == DEFAULT_PARAMS["top_k"]
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        req.text = "x"
+    req.sampling()["temperature"] = 0.1          # копия, запрос не меняется
+    assert req.sampling()["temperature"] == DEFAULT_PARAMS["temperature"]
+    assert pickle.loads(pickle.dumps(req)) == req  # уходит в процесс-реплику
+
+
+def test_tts_request_reads_settings_without_touching_voice(monkeypatch):
+    monkeypatch.setattr(sb.VOICE, "set_user_params",
+                        lambda *a, **k: pytest.fail("VOICE не должен меняться"))
+    req = sb.tts_request("42", "текст", Path("e.npz"),
+                         {"temperature": 0.3, "auto_delete": True})
+    assert req.sampling()["temperature"] == 0.3
+    assert req.embedding == Path("e.npz") and req.user_id == "42"
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+import server_bot as sb
+from state_store import SQLiteStore
+
+class CountingStore(SQLiteStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.reads = self.writes = 0
+    def get(self, *a, **kw):
+        self.reads += 1
+        return super().get(*a, **kw)
+    def update(self, *a, **kw):
+        self.writes += 1
+        return super().update(*a, **kw)
+    def put(self, *a, **kw):
+        self.writes += 1
+        return super().put(*a, **kw)
+
+def test_reads_are_cached_and_side_effect_free(monkeypatch, tmp_path):
+    st = CountingStore(tmp_path / "s.sqlite3")
+    monkeypatch.setattr(sb, "STORE", st)
+    monkeypatch.setattr(sb, "_TARIFF_CACHE", OrderedDict())
+    for _ in range(10):
+        assert sb.tariff_info("c1")["slots"] == 1
+        assert sb.get_tariff("c1") == "free"
+    assert st.writes == 0 and st.reads == 1
+
+def test_write_through_updates_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(sb, "STORE", CountingStore(tmp_path / "s.sqlite3"))
+    monkeypatch.setattr(sb, "_TARIFF_CACHE", OrderedDict())
+    assert sb.get_tariff("c2") == "free"
+    sb.set_tariff("c2", "vip")
+    assert sb.tariff_info("c2")["slots"] == 6
+    sb.add_daily_gen("c2", 4)
+    assert sb.tariff_info("c2")["daily_gen"] == 64
+    assert sb.STORE.get("tariffs", "c2") == {"plan": "vip", "bonus_gen": 4}
+
+def test_cache_is_bounded_lru(monkeypatch, tmp_path):
+    st = CountingStore(tmp_path / "s.sqlite3")
+    monkeypatch.setattr(sb, "STORE", st)
+    monkeypatch.setattr(sb, "_TARIFF_CACHE", OrderedDict())
+    monkeypatch.setattr(sb, "_TARIFF_CACHE_SIZE", 3)
+    for uid in ("a", "b", "c"):
+        sb.get_tariff(uid)
+    sb.get_tariff("a")              # «a» свежая – вытеснится «b»
+    sb.get_tariff("d")
+    assert list(sb._TARIFF_CACHE) == ["c", "a", "d"]
+    reads = st.reads
+    sb.get_tariff("a")
+    assert st.reads == reads        # из кеша
+    sb.get_tariff("b")
+    assert st.reads == reads + 1 and len(sb._TARIFF_CACHE) == 3
@@ -0,0 +1,81 @@
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import server_bot as sb
+from tts_cache import SynthesisCache
+
+
+def _emb(path, value=1.0):
+    np.savez(path, gpt_cond_latent=np.full((1, 4), value), speaker_embedding=np.zeros(2))
+    return path
+
+
+def test_key_normalizes_text_and_tracks_inputs(tmp_path):
+    cache = SynthesisCache(tmp_path / "c")
+    emb = _emb(tmp_path / "e.npz")
+    p = {"temperature": 0.7, "speed": 1.0}
+    k = cache.key(emb, "Привет!", p)
+    assert k == cache.key(emb, "  Привет!\n", dict(reversed(p.items())))
+    assert k != cache.key(emb, "Привет!", {**p, "speed": 1.5})
+    assert k != cache.key(emb, "Привет!", p, seed=1)
+    other = _emb(tmp_path / "o.npz", 2.0)
+    assert k != cache.key(other, "Привет!", p)
+
+
+def test_lru_eviction_and_counters(tmp_path):
+    cache = SynthesisCache(tmp_path / "c", max_mb=2500 / (1024 * 1024))
+    src = tmp_path / "a.wav"
+    src.write_bytes(b"x" * 1000)
+    for k in ("k1", "k2"):
+        cache.put(k, src)
+    assert cache.get("k1") is not None  # k1 свежее k2
+    cache.put("k3", src)                # вытесняет k2
+    assert cache.get("k2") is None
+    assert cache.get("k3").read_bytes() == src.read_bytes()
+    st = cache.stats()
+    assert (st["hits"], st["misses"], st["bytes_saved"], st["entries"]) == (2, 1, 2000, 2)
+    # после рестарта индекс поднимается с диска
+    assert SynthesisCache(tmp_path / "c").stats()["entries"] == 2
+
+
+def test_concurrent_writers_of_one_key(tmp_path):
+    cache = SynthesisCache(tmp_path / "c")
+    with concurrent.futures.ThreadPoolExecutor(8) as ex:
+        paths = list(ex.map(lambda i: cache.put_bytes("kk", b"%d" % i * 100), range(32)))
+    assert len(set(paths)) == 1 and len(paths[0].read_bytes()) in (100, 200)
+    with pytest.raises(OSError):
+        cache.put("kk", tmp_path / "missing.wav")
+    assert [p.name for p in (tmp_path / "c").glob("*/*")] == ["kk.wav"]  # без *.tmp
+
+
+def test_voice_tts_hit_skips_model(client, monkeypatch, tmp_path):
+    uid = "cache_user"
+    monkeypatch.setattr(sb, "USERS_EMB", tmp_path)
+    (tmp_path / uid).mkdir()
+    _emb(tmp_path / uid / "speaker_embedding_0.npz")
+    calls = []
+    real = sb.VOICE.synthesize
+    monkeypatch.setattr(sb.VOICE, "synthesize", lambda *a, **k: calls.append(a) or real(*a, **k))
+    body = {"userId": uid, "text": "Привет!", "slot": 0}
+    before = sb.TTS_CACHE.stats()["hits"]
+    for _ in range(3):
+        r = client.post("/voice/tts", json=body)
+        assert r.status_code == 200 and r.data.startswith(b"RIFF")
+    assert len(calls) == 1
+    assert sb.TTS_CACHE.stats()["hits"] - before == 2
+    assert client.get("/voice/stats").get_json()["tts_cache"]["hits"] >= 2
+
+
+def test_tariff_profile_and_cache_key(monkeypatch, tmp_path):
+    plans = {"u_free": "free", "u_vip": "vip"}
+    monkeypatch.setattr(sb, "_tariff_record", lambda uid: {"plan": plans[uid]})
+    monkeypatch.setattr(sb, "TARIFF_PROFILES", {"free": "int8"})
+    assert sb.tariff_profile("u_free") == sb.DEFAULT_PROFILE  # без реплик профиль один
+    monkeypatch.setattr(sb, "VOICE_WORKERS", 2)
+    assert sb.tariff_profile("u_free") == "int8"
+    assert sb.tariff_profile("u_vip") == sb.DEFAULT_PROFILE
+
+    req = sb.SynthesisRequest.create("u_free", "Привет!", _emb(tmp_path / "e.npz"), {})
+    assert sb._tts_lookup(req, "int8")[0] != sb._tts_lookup(req, "fp32")[0]
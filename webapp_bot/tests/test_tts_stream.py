@@ -0,0 +1,40 @@
+import io
+import wave
+
+import numpy as np
+
+import server_bot as sb
+from audio_format import pcm16, wav_header
+
+
+def test_wav_header_streaming_and_sized():
+    pcm = pcm16([0.0, 0.5, -1.0, 2.0])
+    assert np.frombuffer(pcm, "<i2").tolist() == [0, 16383, -32767, 32767]
+    with wave.open(io.BytesIO(wav_header(24_000, len(pcm)) + pcm)) as w:
+        assert (w.getframerate(), w.getnchannels(), w.getnframes()) == (24_000, 1, 4)
+    assert wav_header()[4:8] == b"\xff\xff\xff\xff"
+
+
+def test_stream_endpoint_chunks_then_cache(client, monkeypatch, tmp_path):
+    uid = "stream_user"
+    monkeypatch.setattr(sb, "USERS_EMB", tmp_path)
+    (tmp_path / uid).mkdir()
+    np.savez(tmp_path / uid / "speaker_embedding_0.npz", gpt_cond_latent=np.ones(4))
+    body = {"userId": uid, "text": "Поток", "slot": 0}
+
+    r = client.post("/voice/tts/stream", json=body, buffered=False)
+    assert r.status_code == 200 and r.mimetype == "audio/wav"
+    chunks = list(r.response)
+    assert chunks[0] == wav_header()          # заголовок – первым куском
+    assert len(chunks) == 4 and sum(map(len, chunks[1:])) == 3 * 480
+    r.close()
+
+    # повтор – готовый WAV с настоящей длиной из кеша
+    r = client.post("/voice/tts/stream", json=body)
+    with wave.open(io.BytesIO(r.data)) as w:
+        assert w.getnframes() == 3 * 240
+    assert sb.daily_gen_count(uid) == 2
+
+
+def test_stream_endpoint_validates(client):
+    assert client.post("/voice/tts/stream", json={"userId": "x"}).status_code == 400
@@ -0,0 +1,29 @@
+import server_bot as sb
+from state_store import SQLiteStore
+
+class TxCountingStore(SQLiteStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.tx = 0
+    def update_many(self, ops):
+        self.tx += 1
+        return super().update_many(ops)
+
+def test_context_flushes_once(monkeypatch, tmp_path):
+    st = TxCountingStore(tmp_path / "s.sqlite3")
+    st.put("settings", "5", {"auto_delete": True, "speed": 1.1})
+    monkeypatch.setattr(sb, "STORE", st)
+    monkeypatch.setattr(sb, "USERS_EMB", tmp_path / "u")
+
+    uc = sb.load_user_context("5")
+    assert uc.auto_delete and not uc.filter_off
+    uc.set_setting("filter_off", True)
+    assert uc.add_strike() == 1
+    assert uc.add_strike() == 2
+    uc.flush()
+
+    assert st.tx == 1
+    assert st.get("settings", "5") == {"auto_delete": True, "speed": 1.1, "filter_off": True}
+    assert st.get("strikes", "5") == 2
+    uc.flush()  # пустой flush ничего не пишет
+    assert st.tx == 1
@@ -6,7 +6,9 @@ class DummyBot:
     async def get_file(self, file_id):
         class F:
             async def download_to_drive(self, dest):
-                open(dest, "wb").write(b"vid")
+                raise AssertionError("файл не должен попадать на диск")
+            async def download_as_bytearray(self):
+                return bytearray(b"vid")
         return F()
 
 class DummyMsg:
@@ -21,7 +23,7 @@ class DummyMsg:
         return SimpleNamespace(chat_id=1, message_id=1)
 
 @pytest.mark.asyncio
-async def test_video_to_wav(monkeypatch, tmp_path):
+async def test_video_bytes_to_embedding(monkeypatch, tmp_path):
     uid = "55"
     monkeypatch.setattr(sb, "USERS_EMB", tmp_path / "u")
     (sb.USERS_EMB / uid).mkdir(parents=True)
@@ -30,30 +32,19 @@ async def test_video_to_wav(monkeypatch, tmp_path):
     monkeypatch.setattr(sb, "auto_delete_enabled", lambda u: False)
 
     called = {}
-    def fake_create(path, user):
-        called["path"] = path
-        open(path, "wb").write(b"RIFF")
-        return path
+    def fake_create(audio, user, slot):
+        called["audio"] = audio
+        out = sb.USERS_EMB / user / f"speaker_embedding_{slot}.npz"
+        out.write_bytes(b"npz")
+        return out
     monkeypatch.setattr(sb.VOICE, "create_embedding", fake_create)
 
-    used = {}
-    def fake_from_file(src):
-        used["src"] = src
-        class S:
-            def set_channels(self, *a): return self
-            def set_frame_rate(self, *a): return self
-            def set_sample_width(self, *a): return self
-            def export(self, dst, format):
-                open(dst, 'wb').write(b'RIFF')
-                return dst
-        return S()
-    monkeypatch.setattr(sb, "AudioSegment", SimpleNamespace(from_file=fake_from_file))
-
     ctx = SimpleNamespace(bot=DummyBot())
     msg = DummyMsg()
     upd = SimpleNamespace(effective_user=SimpleNamespace(id=uid),
                           effective_message=msg,
                           message=msg)
     await sb.tg_voice(upd, ctx)
-    assert "src" in used
-    assert called["path"].endswith(".wav")
+    assert called["audio"] == b"vid"          # видео ушло байтами, без temp-файлов
+    assert (sb.USERS_EMB / uid / "speaker_embedding_0.npz").exists()
+    assert sb.slots.filled(sb.USERS_EMB / uid) == {0}
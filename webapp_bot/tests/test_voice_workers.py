@@ -0,0 +1,138 @@
+import asyncio
+import concurrent.futures
+import inspect
+import math
+import time
+
+import pytest
+
+from voice_workers import CALL_TIMEOUT, VoiceWorkerPool, WorkerCrashed
+
+FAKE = '''
+import os, time
+
+class FakeVoice:
+    def __init__(self, tag):
+        self.tag = tag
+
+    def synthesize(self, uid, text, **params):
+        time.sleep(params.get("delay", 0))
+        return (self.tag, os.getpid(), uid, text, os.environ["OMP_NUM_THREADS"])
+
+    def crash(self):
+        os._exit(3)
+
+    def boom(self):
+        raise ValueError("bad text")
+
+
+class BrokenVoice:
+    def __init__(self, tag):
+        raise RuntimeError("no model")
+'''
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    (tmp_path / "fake_voice.py").write_text(FAKE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    p = VoiceWorkerPool(
+        2, factory=("fake_voice", "FakeVoice"), factory_args=("m",),
+        threads_per_worker=3, monitor_interval=0.1, restart_backoff=0.1,
+    )
+    assert p.start().wait_ready(timeout=30)
+    yield p
+    p.close()
+
+
+def test_jobs_spread_over_replicas(pool):
+    futs = [pool.submit("synthesize", "u", f"t{i}", delay=0.2) for i in range(4)]
+    res = [f.result(timeout=30) for f in futs]
+    assert [r[3] for r in res] == ["t0", "t1", "t2", "t3"]
+    assert len({r[1] for r in res}) == 2            # обе реплики работали
+    assert {r[4] for r in res} == {"3"}             # потоки поделены
+    assert sum(h["jobs_done"] for h in pool.health()) == 4
+
+
+def test_errors_and_crash_restart(pool):
+    with pytest.raises(RuntimeError, match="bad text"):
+        pool.call("boom", timeout=30)
+    with pytest.raises(WorkerCrashed):
+        pool.call("crash", timeout=30)
+    assert pool.wait_ready(timeout=30)
+    assert sum(h["restarts"] for h in pool.health()) == 1
+    assert all(h["alive"] for h in pool.health())
+    assert pool.call("synthesize", "u", "after", timeout=30)[3] == "after"
+
+
+def test_crash_does_not_lose_queued_jobs(pool):
+    futs = [pool.submit("synthesize", "u", f"t{i}", delay=0.1) for i in range(2)]
+    crash = pool.submit("crash")
+    futs += [pool.submit("synthesize", "u", f"t{i}", delay=0.1) for i in range(2, 5)]
+    with pytest.raises(WorkerCrashed):
+        crash.result(timeout=30)
+    assert [f.result(timeout=30)[3] for f in futs] == [f"t{i}" for i in range(5)]
+    assert sum(h["restarts"] for h in pool.health()) == 1
+
+
+def test_call_timeout_drops_queued_job(pool):
+    busy = [pool.submit("synthesize", "u", "busy", delay=0.5) for _ in range(2)]
+    with pytest.raises(concurrent.futures.TimeoutError):
+        pool.call("synthesize", "u", "late", timeout=0.05)
+    for f in busy:
+        f.result(timeout=30)
+    assert pool.call("synthesize", "u", "next", timeout=30)[3] == "next"
+    assert sum(h["jobs_done"] for h in pool.health()) == 3  # «late» не запускался
+    default = inspect.signature(VoiceWorkerPool.call).parameters["timeout"].default
+    assert default == CALL_TIMEOUT and math.isfinite(default)
+
+
+def test_replica_takes_several_jobs(tmp_path, monkeypatch):
+    (tmp_path / "fake_voice.py").write_text(FAKE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    p = VoiceWorkerPool(
+        1, factory=("fake_voice", "FakeVoice"), factory_args=("m",),
+        monitor_interval=0.1, jobs_per_worker=3,
+    )
+    assert p.start().wait_ready(timeout=30)
+    t0 = time.monotonic()
+    futs = [p.submit("synthesize", "u", f"t{i}", delay=0.5) for i in range(3)]
+    assert [f.result(timeout=30)[3] for f in futs] == ["t0", "t1", "t2"]
+    assert time.monotonic() - t0 < 1.2  # три задания – одновременно
+    assert p.health()[0]["jobs_done"] == 3 and p.health()[0]["busy_jobs"] == []
+    p.close()
+
+
+def test_failing_replica_gives_up(tmp_path, monkeypatch):
+    (tmp_path / "fake_voice.py").write_text(FAKE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    p = VoiceWorkerPool(
+        1, factory=("fake_voice", "BrokenVoice"), factory_args=("m",),
+        monitor_interval=0.05, restart_backoff=0.05, max_failures=2,
+    )
+    queued = p.submit("synthesize", "u", "t")  # до start(): процессов ещё нет
+    assert p.health()[0]["pid"] is None
+    with pytest.raises(RuntimeError, match="not started"):
+        p.wait_ready(timeout=1)
+    p.start()
+    with pytest.raises(WorkerCrashed, match="2 times"):
+        p.wait_ready(timeout=60)
+    with pytest.raises(WorkerCrashed):
+        queued.result(timeout=5)
+    with pytest.raises(WorkerCrashed):
+        p.submit("synthesize", "u", "t")
+    assert p.health()[0]["failed"] and p.health()[0]["restarts"] == 1
+    p.close()
+
+
+def test_inline_mode_resolves_methods_at_call_time():
+    class Target:
+        def synthesize(self, uid, text):
+            return "old"
+
+    t = Target()
+    p = VoiceWorkerPool(0, target=t)
+    t.synthesize = lambda uid, text: f"new {text}"
+    assert p.call("synthesize", "u", "x") == "new x"
+    assert asyncio.run(p.run("synthesize", "u", "y")) == "new y"
+    p.close()
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("safetensors")
+
+from weights import save_safetensors, tensor_names  # noqa: E402
+
+
+def test_numpy_roundtrip_drops_non_tensors(tmp_path):
+    from safetensors import safe_open
+    from safetensors.numpy import load_file
+
+    state = {
+        "emb": np.arange(12, dtype=np.float32).reshape(3, 4),
+        "ids": np.array([1, 2, 3], dtype=np.int64),
+        "flag": np.array([True, False]),
+        "scalar": np.full((), 0.5, np.float16),
+        "step": 1000,  # не тензор – в файл не попадает
+    }
+    path = save_safetensors(state, tmp_path / "m.safetensors", metadata={"source": "m.pth"})
+    assert sorted(tensor_names(path)) == ["emb", "flag", "ids", "scalar"]
+    arrays = load_file(str(path))
+    for name in arrays:
+        np.testing.assert_array_equal(arrays[name], state[name])
+    with safe_open(str(path), framework="np") as fh:
+        assert fh.metadata() == {"format": "pt", "source": "m.pth"}
+    assert [p.name for p in tmp_path.iterdir()] == ["m.safetensors"]  # tmp убран
+
+
+def test_torch_state_dict_shares_file_pages(tmp_path):
+    torch = pytest.importorskip("torch")
+    from weights import load_into, mmap_state_dict
+
+    src = torch.nn.Sequential(torch.nn.Linear(4, 3), torch.nn.LayerNorm(3))
+    state = {**src.state_dict(), "tied": src[0].weight}  # общая память – пишется копией
+    path = save_safetensors(state, tmp_path / "m.safetensors")
+    loaded = mmap_state_dict(path)
+    assert torch.equal(loaded["0.weight"], src[0].weight.detach())
+    assert torch.equal(loaded["tied"], loaded["0.weight"])
+
+    dst = torch.nn.Sequential(torch.nn.Linear(4, 3), torch.nn.LayerNorm(3))
+    save_safetensors(src.state_dict(), tmp_path / "s.safetensors")
+    load_into(dst, tmp_path / "s.safetensors")
+    x = torch.randn(2, 4)
+    assert torch.allclose(dst(x), src(x))
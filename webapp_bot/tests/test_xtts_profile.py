@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import xtts_profile as xp
+
+
+def test_profile_selection(monkeypatch):
+    monkeypatch.delenv("XTTS_PROFILE", raising=False)
+    assert xp.get_profile().name == "fp32"
+    monkeypatch.setenv("XTTS_PROFILE", "INT8")
+    assert xp.get_profile().int8
+    with pytest.raises(ValueError):
+        xp.get_profile("int4")
+
+
+def test_effective_profile_falls_back(monkeypatch):
+    both = xp.PROFILES["int8-bf16"]
+    assert xp.effective(both, "cuda").name == "fp32"
+    monkeypatch.setattr(xp, "bf16_supported", lambda: False)
+    assert xp.effective(both, "cpu").name == "int8"
+    assert xp.effective(xp.PROFILES["bf16"], "cpu").name == "fp32"
+    monkeypatch.setattr(xp, "bf16_supported", lambda: True)
+    assert xp.effective(both, "cpu") is both
+
+
+def test_mel_distance_tolerates_timing_not_timbre():
+    rng = np.random.default_rng(0)
+    ref = rng.normal(-40, 10, size=(60, 80))
+    slower = np.repeat(ref, 2, axis=0)[::2][:55]  # тот же звук, другая длина
+    assert xp.mel_distance(ref, ref) == 0.0
+    assert xp.mel_distance(ref, np.repeat(ref, 2, axis=0)) == 0.0
+    assert xp.mel_distance(ref, slower) < 1.0
+    assert xp.mel_distance(ref, ref + 6.0) == pytest.approx(6.0)
+
+
+def test_conv1d_to_linear_matches_output():
+    torch = pytest.importorskip("torch")
+
+    class Conv1D(torch.nn.Module):  # как transformers.pytorch_utils.Conv1D
+        def __init__(self, nf, nx):
+            super().__init__()
+            self.weight = torch.nn.Parameter(torch.randn(nx, nf))
+            self.bias = torch.nn.Parameter(torch.randn(nf))
+
+        def forward(self, x):
+            return x @ self.weight + self.bias
+
+    block = torch.nn.Sequential(torch.nn.Sequential(Conv1D(6, 4)))
+    x = torch.randn(3, 4)
+    before = block(x)
+    assert xp._conv1d_to_linear(block) == 1
+    assert isinstance(block[0][0], torch.nn.Linear)
+    assert torch.allclose(block(x), before, atol=1e-6)
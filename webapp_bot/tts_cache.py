@@ -0,0 +1,168 @@
+"""
+tts_cache.py – кеш готовых синтезов
+===================================
+Один и тот же текст тем же голосом с теми же параметрами → тот же файл,
+без повторного прогона XTTS.
+•  ключ  – sha256(содержимое слепка, нормализованный текст, параметры, seed);
+           хеш слепка запоминается по штампу файла, чтобы не читать *.npz
+           на каждый запрос
+•  диск  – root/<kk>/<key>.<ext>, запись через свой tmp (.<имя>.<hex>.tmp,
+           как в slots.save_npz – один ключ пишут параллельно) + os.replace;
+           суммарный размер ограничен max_mb, вытесняется давно не
+           использованный файл (время использования – mtime, переживает рестарт)
+•  stats – hits / misses / bytes_saved
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from emb_cache import Stamp, file_stamp
+
+
+def normalize_text(text: str) -> str:
+    """NFC + схлопнутые пробелы: «Привет! » и «Привет!» – один ключ."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class SynthesisCache:
+    def __init__(self, root: str | Path, max_mb: float = 512.0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        self._bytes = 0
+        self._emb_digest: Dict[str, Tuple[Stamp, str]] = {}
+        self._scan()
+
+    # ---------- public API ------------------------------------------- #
+    def key(
+        self,
+        emb_path: str | Path,
+        text: str,
+        params: dict,
+        seed: Optional[int] = None,
+    ) -> str:
+        h = hashlib.sha256()
+        h.update(self._embedding_digest(Path(emb_path)).encode())
+        h.update(b"\0" + normalize_text(text).encode("utf-8"))
+        h.update(b"\0" + json.dumps(params, sort_keys=True, default=str).encode())
+        h.update(b"\0" + str(seed).encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[Path]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            path, size = item
+            self._items.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += size
+        try:
+            os.utime(path)  # отметка использования для LRU после рестарта
+        except FileNotFoundError:  # удалили руками
+            with self._lock:
+                self._drop(key)
+            return None
+        return path
+
+    def put(self, key: str, src: str | Path) -> Path:
+        """Скопировать готовый файл в кеш. Возвращает путь внутри кеша."""
+        src = Path(src)
+        dst, tmp = self._target(key, src.suffix)
+        try:
+            shutil.copyfile(src, tmp)
+            return self._commit(key, tmp, dst)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def put_bytes(self, key: str, data: bytes, suffix: str = ".wav") -> Path:
+        """То же для результата, собранного в памяти (потоковый синтез)."""
+        dst, tmp = self._target(key, suffix)
+        try:
+            tmp.write_bytes(data)
+            return self._commit(key, tmp, dst)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "entries": len(self._items),
+                "mb": round(self._bytes / (1024 * 1024), 2),
+            }
+
+    # ---------- internal --------------------------------------------- #
+    def _embedding_digest(self, path: Path) -> str:
+        stamp = file_stamp(path)
+        key = str(path.resolve())
+        cached = self._emb_digest.get(key)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        self._emb_digest[key] = (stamp, digest)
+        return digest
+
+    def _target(self, key: str, suffix: str) -> Tuple[Path, Path]:
+        dst = self.root / key[:2] / f"{key}{suffix}"
+        dst.parent.mkdir(exist_ok=True)
+        return dst, dst.with_name(f".{dst.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+    def _commit(self, key: str, tmp: Path, dst: Path) -> Path:
+        os.replace(tmp, dst)
+        size = dst.stat().st_size
+        with self._lock:
+            self._drop(key, unlink=False)
+            self._items[key] = (dst, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                self._drop(next(iter(self._items)))
+        return dst
+
+    def _scan(self) -> None:
+        found = []
+        for p in self.root.glob("*/*"):
+            if p.name.endswith(".tmp"):
+                p.unlink(missing_ok=True)  # недописанный файл после падения
+                continue
+            st = p.stat()
+            found.append((st.st_mtime, p.name.split(".")[0], p, st.st_size))
+        for _, key, p, size in sorted(found):
+            self._items[key] = (p, size)
+            self._bytes += size
+
+    def _drop(self, key: str, unlink: bool = True) -> None:
+        item = self._items.pop(key, None)
+        if item:
+            self._bytes -= item[1]
+            if unlink:
+                item[0].unlink(missing_ok=True)
+
+
+@lru_cache
+def get_tts_cache() -> SynthesisCache:
+    return SynthesisCache(
+        os.getenv("TTS_CACHE_DIR", "tts_cache"),
+        max_mb=float(os.getenv("TTS_CACHE_MB", "512")),
+    )
@@ -4,24 +4,38 @@ voice_module.py – XTTS v2 | клон / синтез голоса
 •  model_dir   – папка с `XTTS-v2/` (веса + config.json)       → D:/prdja
 •  storage_dir – корень, где будут храниться *личные* папки    → users_emb
                   └─ <user_id>/
-                     ├─ speaker_embedding_*.npz
+                     ├─ speaker_embedding_{slot}.npz + slots.json
                      └─ tts_*.wav
 """
 
 from __future__ import annotations
 
+import functools
 import logging
+import os
+import queue
+import threading
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import torch
+import torch.nn.functional as F
 import torchaudio
-from pydub import AudioSegment
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 
+from audio_format import TTS_SAMPLE_RATE, decode_audio, pcm16, wav_header
+from batching import MicroBatcher
+from emb_cache import EmbeddingCache
+from segmenter import crossfade, split_text
+from slots import save_npz, slot_path
+from synthesis import DEFAULT_PARAMS, SynthesisRequest, resolve_params  # noqa: F401
+from weights import mmap_state_dict
+from xtts_profile import InferenceProfile, apply_profile, autocast, effective, get_profile
+
 # ────────────────────────────────────────
 # logging
 # ────────────────────────────────────────
@@ -31,45 +45,28 @@ logging.basicConfig(
     level=logging.INFO,
 )
 
-# ────────────────────────────────────────
-# defaults for TTS sampling
-# ────────────────────────────────────────
-DEFAULT_PARAMS: Dict[str, float] = {
-    "temperature": 0.7,
-    "top_k": 50,
-    "top_p": 0.85,
-    "repetition_penalty": 2.0,
-    "length_penalty": 1.0,
-    "speed": 1.0,
-}
+# частота, на которой XTTS считает conditioning latents (load_sr)
+COND_SAMPLE_RATE = 22_050
+
+# длинный текст режется на сегменты (токены XTTS; у GPT предел ~400);
+# одна модель считает по одному запросу за раз (см. _model_lock), поэтому
+# сегменты идут по очереди, а при micro-batching (TTS_BATCH_MAX > 1) –
+# сразу все в батчер, одной пачкой GPT
+SEGMENT_TOKENS = int(os.getenv("TTS_SEGMENT_TOKENS", "200"))
+
+# micro-batching: сегменты, пришедшие за окно, идут одним прогоном GPT
+BATCH_MAX = int(os.getenv("TTS_BATCH_MAX", "1"))  # 1 – без батчинга
+BATCH_WINDOW_MS = float(os.getenv("TTS_BATCH_WINDOW_MS", "30"))
+
+_SAMPLING_KEYS = ("temperature", "top_k", "top_p", "repetition_penalty", "length_penalty")
 
 # ────────────────────────────────────────
 # helpers
 # ────────────────────────────────────────
-def _ensure_wav(src: Path, samplerate: int = 16_000) -> Path:
-    """Любой входной аудиофайл → mono WAV 16 кГц / 16-бит."""
-    if src.suffix.lower() == ".wav":
-        return src
-    dst = src.with_suffix(".wav")
-    (
-        AudioSegment.from_file(src)
-        .set_channels(1)
-        .set_frame_rate(samplerate)
-        .set_sample_width(2)  # 16-bit
-        .export(dst, format="wav")
-    )
-    return dst
-
-
 def _now() -> str:
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
-def _clamp(v: float, low: float, high: float) -> float:
-    """Ограничить значение диапазоном [low, high]."""
-    return max(low, min(high, v))
-
-
 # ────────────────────────────────────────
 # основной класс
 # ────────────────────────────────────────
@@ -82,21 +79,44 @@ class VoiceModule:
     storage_dir : str | Path
         Корневая папка для пользовательских данных:
         storage_dir/<user_id>/(слепки + синтезы).
+    profile     : str | None
+        Профиль CPU-инференса (xtts_profile.py): fp32 / int8 / bf16 /
+        int8-bf16; по умолчанию – env XTTS_PROFILE или fp32.
     """
 
     # ------------------------------------------------------------------ #
     # init
     # ------------------------------------------------------------------ #
-    def __init__(self, model_dir: str | Path, storage_dir: str | Path):
+    def __init__(
+        self,
+        model_dir: str | Path,
+        storage_dir: str | Path,
+        profile: Optional[str] = None,
+    ):
         self.model_dir = Path(model_dir).expanduser().resolve()
         self.storage_root = Path(storage_dir).expanduser().resolve()
         self.storage_root.mkdir(parents=True, exist_ok=True)
+        self.profile: InferenceProfile = get_profile(profile)
 
         self._load_tts()
+        # GPT XTTS хранит префикс (cond latents + текст) в самом модуле
+        # (gpt_inference.store_prefix_emb) – параллельные прогоны на одной
+        # модели перетирают его друг другу, поэтому инференс – под замком
+        self._model_lock = threading.Lock()
 
         # кеши в RAM
         self.user_params: Dict[str, Dict[str, float]] = {}
         self.user_embedding: Dict[str, Path] = {}
+        # готовые тензоры слепков (path + штамп файла → на self.device)
+        self.emb_cache = EmbeddingCache(
+            self._load_embedding, max_mb=float(os.getenv("EMB_CACHE_MB", "64"))
+        )
+
+        self.batcher: Optional[MicroBatcher] = None
+        if BATCH_MAX > 1:
+            self.batcher = MicroBatcher(
+                self._infer_batch, BATCH_WINDOW_MS / 1000, BATCH_MAX, name="tts-batch"
+            )
 
         logger.info("VoiceModule готов. Корень хранения: %s", self.storage_root)
 
@@ -106,7 +126,7 @@ class VoiceModule:
     def set_user_params(self, user_id: str, **overrides) -> None:
         """Сохранить / переопределить личные sampling-параметры."""
         cur = self.user_params.get(user_id, {})
-        self.user_params[user_id] = {**DEFAULT_PARAMS, **cur, **overrides}
+        self.user_params[user_id] = resolve_params({**cur, **overrides})
 
     def get_user_params(self, user_id: str) -> Dict[str, float]:
         """Вернуть готовые к работе sampling-параметры для пользователя."""
@@ -115,17 +135,36 @@ class VoiceModule:
         return self.user_params[user_id]
 
     # ---------- 1)  слепок ------------------------------------------- #
-    def create_embedding(self, audio_file: str | Path, user_id: str) -> Path:
+    def create_embedding(
+        self,
+        audio: str | Path | bytes | bytearray | np.ndarray,
+        user_id: str,
+        slot: Optional[int] = None,
+        *,
+        sample_rate: Optional[int] = None,
+    ) -> Path:
         """
-        Принять аудиофайл (голосовое) и создать `speaker_embedding_*.npz`
-        в папке пользователя. Возвращает путь к npz.
+        Создать слепок в папке пользователя из голосового: байтов
+        (ogg / mp4 / wav – декодируются в памяти), mono-waveform
+        (np.ndarray + sample_rate) или пути к файлу. С `slot` файл атомарно
+        встаёт на место speaker_embedding_{slot}.npz, без него – новый
+        speaker_embedding_<время>.npz. Возвращает путь к npz.
         """
         user_dir = self._user_dir(user_id)
-        wav_path = _ensure_wav(Path(audio_file))
-
-        g_latent, sp_emb = self.tts.get_conditioning_latents(audio_path=[str(wav_path)])
-        out_path = user_dir / f"speaker_embedding_{_now()}.npz"
-        np.savez(
+        if isinstance(audio, np.ndarray):
+            if not sample_rate:
+                raise ValueError("sample_rate обязателен для waveform")
+            wave_np, sr = audio, sample_rate
+        else:
+            data = audio if isinstance(audio, (bytes, bytearray)) else Path(audio).read_bytes()
+            wave_np, sr = decode_audio(data, COND_SAMPLE_RATE)
+
+        g_latent, sp_emb = self._conditioning_latents(wave_np, sr)
+        out_path = (
+            slot_path(user_dir, slot) if slot is not None
+            else user_dir / f"speaker_embedding_{_now()}.npz"
+        )
+        save_npz(
             out_path,
             gpt_cond_latent=g_latent.cpu().numpy(),
             speaker_embedding=sp_emb.cpu().numpy(),
@@ -136,7 +175,7 @@ class VoiceModule:
         return out_path
 
     # ---------- 2)  синтез ------------------------------------------ #
-    def synthesize(
+    def make_request(
         self,
         user_id: str,
         text: str,
@@ -144,50 +183,112 @@ class VoiceModule:
         embedding_file: Optional[str | Path] = None,
         outfile: Optional[str | Path] = None,
         **params_override,
-    ) -> Path:
+    ) -> SynthesisRequest:
         """
-        Синтезировать `text` c помощью последнего (или указанного) слепка.
-        Возвращает путь к WAV-файлу.
+        Прежний вызов «по user_id» → SynthesisRequest: слепок и параметры
+        берутся из user_embedding / user_params в момент вызова.
         """
-        # параметры
-        if user_id not in self.user_params:
-            self.set_user_params(user_id)
-        params = {**self.user_params[user_id], **params_override}
-
-        # speed может прилететь экзотический — ограничиваем
-        params["speed"] = _clamp(float(params.get("speed", 1.0)), 0.1, 3.0)
-
-        logger.info("TTS-параметры %s → %s", user_id, params)
-
-        # какой слепок?
-        emb_path = Path(embedding_file) if embedding_file else self.user_embedding.get(user_id)
-        if not emb_path or not emb_path.exists():
+        emb_path = embedding_file or self.user_embedding.get(user_id)
+        if not emb_path:
             raise RuntimeError(f"Слепок для пользователя {user_id!r} не найден.")
+        params = {**self.get_user_params(user_id), **params_override}
+        return SynthesisRequest.create(user_id, text, emb_path, params, outfile)
 
-        # загрузка слепка
-        data = np.load(emb_path, allow_pickle=True)
-        g_latent = torch.tensor(data["gpt_cond_latent"], device=self.device)
-        sp_emb   = torch.tensor(data["speaker_embedding"], device=self.device)
-
-        # генерация
-        with torch.amp.autocast(device_type=self.device.type, enabled=False):
-            wav_dict = self.tts.inference(
-                text, "ru", g_latent, sp_emb,
-                temperature=params["temperature"],
-                top_k=params["top_k"],
-                top_p=params["top_p"],
-                repetition_penalty=params["repetition_penalty"],
-                length_penalty=params["length_penalty"],
-            )
-
-        wav_tensor = torch.as_tensor(wav_dict["wav"]).float().unsqueeze(0)
+    def synthesize(
+        self, request: SynthesisRequest | str, text: Optional[str] = None, **legacy
+    ) -> Path:
+        """
+        Синтезировать request.text слепком request.embedding.
+        Возвращает путь к WAV-файлу (request.outfile или новый tts_*.wav).
+        Старая форма synthesize(user_id, text, embedding_file=…, **params)
+        тоже работает – через make_request().
+        """
+        if not isinstance(request, SynthesisRequest):
+            request = self.make_request(request, text, **legacy)
+        user_id, text = request.user_id, request.text
+        params, g_latent, sp_emb = self._prepare(request)
+
+        # генерация: по предложениям в пределах бюджета токенов; с батчером
+        # сегменты уходят в него все сразу и склеиваются в одну пачку GPT,
+        # без него – по очереди (модель всё равно одна)
+        segments = self._segments(text)
+        if len(segments) == 1 or self.batcher is None:
+            parts = [self._infer(seg, params, g_latent, sp_emb) for seg in segments]
+        else:
+            futures = [self.batcher.submit((seg, params, g_latent, sp_emb)) for seg in segments]
+            parts = [fut.result() for fut in futures]
+        if len(segments) > 1:
+            logger.info("Синтез %s: %d сегментов", user_id, len(segments))
+
+        # PCM 16-бит вместо float32: файл вдвое меньше, кодеры (Opus / MP3)
+        # всё равно работают с 16-битным входом
+        pcm        = pcm16(crossfade(parts, TTS_SAMPLE_RATE))
         user_dir   = self._user_dir(user_id)
-        dst        = Path(outfile) if outfile else user_dir / f"tts_{_now()}.wav"
-        torchaudio.save(str(dst), wav_tensor.cpu(), 24_000)
+        # суффикс: параллельные синтезы одного пользователя в одну секунду
+        dst        = request.outfile or user_dir / f"tts_{_now()}_{uuid.uuid4().hex[:6]}.wav"
+        Path(dst).write_bytes(wav_header(TTS_SAMPLE_RATE, len(pcm)) + pcm)
 
         logger.info("Синтез сохранён: %s", dst)
         return dst
 
+    # ---------- 3)  потоковый синтез -------------------------------- #
+    def synthesize_stream(
+        self,
+        request: SynthesisRequest | str,
+        text: Optional[str] = None,
+        *,
+        stream_chunk_size: int = 20,
+        **legacy,
+    ) -> Iterator[bytes]:
+        """
+        То же, что synthesize(), но отдаёт PCM 16-бит / 24 кГц кусками
+        по мере декодирования XTTS (заголовок WAV – на стороне вызывающего).
+        Длинный текст режется так же, как в synthesize(); сегменты идут в
+        поток один за другим (без crossfade – начало уже отдано клиенту).
+        """
+        if not isinstance(request, SynthesisRequest):
+            request = self.make_request(request, text, **legacy)
+        # режем до генерации: предел токенов XTTS иначе сработал бы уже
+        # после отправленного клиенту заголовка
+        segments = self._segments(request.text)
+        params, g_latent, sp_emb = self._prepare(request)
+        # GPT декодирует с префиксом, сохранённым в модуле, на всём протяжении
+        # сегмента – замок модели держится до его последнего куска (между
+        # сегментами модель свободна). Генерация идёт в своём потоке:
+        # медленный клиент не держит модель дольше, чем она считает
+        chunks: "queue.Queue[object]" = queue.Queue()
+        stop = threading.Event()
+
+        def produce() -> None:
+            try:
+                for seg in segments:
+                    with self._model_lock, autocast(self.profile, self.device.type):
+                        for chunk in self.tts.inference_stream(
+                            seg, "ru", g_latent, sp_emb,
+                            stream_chunk_size=stream_chunk_size,
+                            temperature=params["temperature"],
+                            top_k=params["top_k"],
+                            top_p=params["top_p"],
+                            repetition_penalty=params["repetition_penalty"],
+                            length_penalty=params["length_penalty"],
+                        ):
+                            if stop.is_set():  # клиент ушёл – модель свободна раньше
+                                return
+                            chunks.put(pcm16(chunk.detach().float().cpu().numpy()))
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(None)
+
+        threading.Thread(target=produce, name="tts-stream", daemon=True).start()
+        try:
+            while (item := chunks.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
     # ------------------------------------------------------------------ #
     # internal utils
     # ------------------------------------------------------------------ #
@@ -197,11 +298,173 @@ class VoiceModule:
 
         cfg = XttsConfig(); cfg.load_json(cfg_path)
         model = Xtts.init_from_config(cfg)
-        model.load_checkpoint(cfg, checkpoint_dir=ckpt_dir, eval=True)
+        st_path = ckpt_dir / "model.safetensors"
+        if st_path.exists():
+            # веса из mmap (convert_safetensors.py): load_checkpoint получает
+            # готовый state_dict, параметры ссылаются на страницы файла –
+            # реплики делят их через page cache вместо копий в куче
+            state = mmap_state_dict(st_path)
+            model.get_compatible_checkpoint_state_dict = lambda _path: state
+            model.load_state_dict = functools.partial(
+                torch.nn.Module.load_state_dict, model, assign=True
+            )
+        try:
+            model.load_checkpoint(cfg, checkpoint_dir=ckpt_dir, eval=True)
+        finally:
+            vars(model).pop("get_compatible_checkpoint_state_dict", None)
+            vars(model).pop("load_state_dict", None)
 
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.tts: Xtts = model.to(self.device)
-        logger.info("XTTS-v2 загружена (%s).", self.device.type.upper())
+        self.profile = effective(self.profile, self.device.type)
+        self.tts: Xtts = apply_profile(model.to(self.device), self.profile)
+        logger.info("XTTS-v2 загружена (%s, %s).", self.device.type.upper(), self.profile.name)
+
+    def _prepare(
+        self, request: SynthesisRequest
+    ) -> Tuple[Dict[str, float], torch.Tensor, torch.Tensor]:
+        """Параметры синтеза + тензоры слепка (общая часть обоих синтезов)."""
+        params = request.sampling()
+        logger.info("TTS-параметры %s → %s", request.user_id, params)
+
+        if not request.embedding.exists():
+            raise RuntimeError(f"Слепок для пользователя {request.user_id!r} не найден.")
+
+        # загрузка слепка (из LRU, если файл не менялся)
+        g_latent, sp_emb = self.emb_cache.get(request.embedding)
+        return params, g_latent, sp_emb
+
+    def _infer(self, text: str, params: Dict[str, float], g_latent, sp_emb) -> np.ndarray:
+        """Один сегмент → float-сэмплы 24 кГц (через micro-batcher, если включён)."""
+        if self.batcher is not None:
+            return self.batcher.call((text, params, g_latent, sp_emb))
+        return self._infer_one(text, params, g_latent, sp_emb)
+
+    def _infer_one(self, text: str, params: Dict[str, float], g_latent, sp_emb) -> np.ndarray:
+        with self._model_lock, autocast(self.profile, self.device.type):
+            wav_dict = self.tts.inference(
+                text, "ru", g_latent, sp_emb,
+                temperature=params["temperature"],
+                top_k=params["top_k"],
+                top_p=params["top_p"],
+                repetition_penalty=params["repetition_penalty"],
+                length_penalty=params["length_penalty"],
+            )
+        return torch.as_tensor(wav_dict["wav"]).float().cpu().numpy()
+
+    def _infer_batch(self, items: List[tuple]) -> List[np.ndarray]:
+        """
+        Пачка (text, params, g_latent, sp_emb) от MicroBatcher. Внутри одной
+        пачки sampling-параметры обязаны совпадать, поэтому группируем по ним.
+        """
+        out: List[Optional[np.ndarray]] = [None] * len(items)
+        groups: Dict[tuple, List[int]] = {}
+        for i, (_, params, _, _) in enumerate(items):
+            groups.setdefault(tuple(params[k] for k in _SAMPLING_KEYS), []).append(i)
+        for idx in groups.values():
+            group = [items[i] for i in idx]
+            if len(group) == 1:
+                wavs = [self._infer_one(*group[0])]
+            else:
+                try:
+                    with self._model_lock, autocast(self.profile, self.device.type):
+                        wavs = self._generate_batch(group)
+                except Exception as e:  # батч не удался – не теряем запросы
+                    logger.warning("Батч из %d не удался (%s), по одному", len(group), e)
+                    wavs = [self._infer_one(*it) for it in group]
+            for i, wav in zip(idx, wavs):
+                out[i] = wav
+        return out
+
+    @torch.no_grad()
+    def _generate_batch(self, group: List[tuple]) -> List[np.ndarray]:
+        """
+        Авторегрессия GPT – одним батчем: префиксы (cond latents + текст)
+        выравниваются паддингом слева и маскируются attention_mask.
+        Проход за латентами и HiFi-GAN – по элементам (длины разные).
+        """
+        gpt = self.tts.gpt
+        params = group[0][1]
+        tokens, prefixes = [], []
+        for text, _, g_latent, _ in group:
+            t = torch.IntTensor(
+                self.tts.tokenizer.encode(text.strip().lower(), lang="ru")
+            ).unsqueeze(0).to(self.device)
+            tokens.append(t)
+            ti = F.pad(F.pad(t, (0, 1), value=gpt.stop_text_token), (1, 0), value=gpt.start_text_token)
+            emb = gpt.text_embedding(ti) + gpt.text_pos_embedding(ti)
+            prefixes.append(torch.cat([g_latent.to(self.device), emb], dim=1))
+
+        width = max(p.shape[1] for p in prefixes)
+        prefix = torch.cat([F.pad(p, (0, 0, width - p.shape[1], 0)) for p in prefixes])
+        mask = torch.zeros(len(group), width + 1, dtype=torch.long, device=self.device)
+        for i, p in enumerate(prefixes):
+            mask[i, width - p.shape[1]:] = 1
+        ids = torch.full((len(group), width + 1), 1, dtype=torch.long, device=self.device)
+        ids[:, -1] = gpt.start_audio_token
+
+        gpt.gpt_inference.store_prefix_emb(prefix)
+        gen = gpt.gpt_inference.generate(
+            ids,
+            attention_mask=mask,
+            bos_token_id=gpt.start_audio_token,
+            pad_token_id=gpt.stop_audio_token,
+            eos_token_id=gpt.stop_audio_token,
+            max_length=gpt.max_gen_mel_tokens + ids.shape[-1],
+            do_sample=True,
+            num_return_sequences=1,
+            num_beams=1,
+            output_attentions=False,
+            **{k: params[k] for k in _SAMPLING_KEYS},
+        )
+        codes = gen[:, ids.shape[1]:]
+
+        wavs = []
+        for i, (_, _, g_latent, sp_emb) in enumerate(group):
+            c = codes[i]
+            stop = (c == gpt.stop_audio_token).nonzero()
+            c = c[: int(stop[0]) if len(stop) else len(c)].unsqueeze(0)
+            latents = gpt(
+                tokens[i],
+                torch.tensor([tokens[i].shape[-1]], device=self.device),
+                c,
+                torch.tensor([c.shape[-1] * gpt.code_stride_len], device=self.device),
+                cond_latents=g_latent.to(self.device),
+                return_attentions=False,
+                return_latent=True,
+            )
+            wav = self.tts.hifigan_decoder(latents, g=sp_emb.to(self.device))
+            wavs.append(wav.float().cpu().squeeze().numpy())
+        return wavs
+
+    def _segments(self, text: str) -> List[str]:
+        return split_text(text, SEGMENT_TOKENS, self._text_tokens) or [text]
+
+    def _text_tokens(self, text: str) -> int:
+        """Длина текста в токенах XTTS (бюджет сегмента считается в них)."""
+        return len(self.tts.tokenizer.encode(text, lang="ru"))
+
+    @torch.no_grad()
+    def _conditioning_latents(self, wave_np: np.ndarray, sr: int):
+        """
+        То же, что Xtts.get_conditioning_latents(audio_path=…), но из waveform
+        в памяти: mono → 22.05 кГц → первые 30 с → speaker / GPT latents.
+        """
+        audio = torch.as_tensor(np.asarray(wave_np, dtype=np.float32).reshape(1, -1))
+        if sr != COND_SAMPLE_RATE:
+            audio = torchaudio.functional.resample(audio, sr, COND_SAMPLE_RATE)
+        audio = audio.clamp(-1, 1)[:, : COND_SAMPLE_RATE * 30].to(self.device)
+        sp_emb = self.tts.get_speaker_embedding(audio, COND_SAMPLE_RATE)
+        g_latent = self.tts.get_gpt_cond_latents(
+            audio, COND_SAMPLE_RATE, length=6, chunk_length=6
+        )
+        return g_latent, sp_emb
+
+    def _load_embedding(self, emb_path: Path):
+        """*.npz → (gpt_cond_latent, speaker_embedding) на self.device."""
+        with np.load(emb_path, allow_pickle=True) as data:
+            g_latent = torch.tensor(data["gpt_cond_latent"], device=self.device)
+            sp_emb   = torch.tensor(data["speaker_embedding"], device=self.device)
+        return g_latent, sp_emb
 
     def _user_dir(self, user_id: str) -> Path:
         """
@@ -0,0 +1,407 @@
+"""
+voice_workers.py – пул процессов с репликами VoiceModule
+========================================================
+•  workers > 0 – N процессов (spawn), в каждом своя модель XTTS. Задания
+                 раздаёт родитель: очередь ждёт в нём, свободная реплика
+                 получает следующее по своему pipe, и задание сразу числится
+                 за ней. Общих межпроцессных очередей (и их замков) нет –
+                 упавшая реплика не подвешивает соседей.
+                 torch.set_num_threads делит ядра поровну (threads_per_worker).
+                 Реплика берёт до jobs_per_worker заданий сразу (каждое – в
+                 своём потоке): одна модель считает их по очереди, но с
+                 micro-batching (TTS_BATCH_MAX > 1) они сходятся в одну пачку
+•  workers = 0 – задания выполняются в текущем процессе, в inline_threads
+                 потоках (по умолчанию 1); методы target берутся в момент вызова.
+                 Для батчинга между запросами нужно inline_threads ≥ TTS_BATCH_MAX
+•  start()     – запуск процессов; конструктор их не создаёт, поэтому пул
+                 можно держать в модуле, который реплика (spawn) импортирует
+                 заново – start() зовут только из main() родителя
+•  health()    – состояние реплик (pid, жив ли, текущее задание, счётчики);
+                 упавший процесс перезапускается с паузой (VOICE_RESTART_BACKOFF,
+                 удваивается до минуты), её задания завершаются ошибкой
+                 WorkerCrashed. Реплика, упавшая VOICE_MAX_FAILURES раз подряд
+                 (не дойдя до готовности), больше не поднимается: wait_ready()
+                 бросает WorkerCrashed, а если упали все – ждущие задания тоже
+
+submit(method, *args, **kw) → concurrent.futures.Future;
+await run(...) – то же для asyncio; call(...) – блокирующий вызов (Flask)
+с таймаутом VOICE_CALL_TIMEOUT (по умолчанию 300 с); не начатое задание
+при таймауте снимается с очереди.
+Аргументы и результат заданий должны сериализоваться pickle.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import importlib
+import itertools
+import logging
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger("voice-workers")
+
+CALL_TIMEOUT = float(os.getenv("VOICE_CALL_TIMEOUT", "300"))
+RESTART_BACKOFF = float(os.getenv("VOICE_RESTART_BACKOFF", "1"))
+RESTART_BACKOFF_MAX = 60.0
+MAX_FAILURES = int(os.getenv("VOICE_MAX_FAILURES", "5"))
+
+
+class WorkerCrashed(RuntimeError):
+    """Процесс-реплика умер во время выполнения задания."""
+
+
+def _limit_threads(n: int) -> None:
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(n)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(n)
+
+
+def _worker_main(wid, factory, factory_args, threads, conn, jobs=1) -> None:
+    """Тело процесса-реплики: модель грузится один раз, дальше – цикл заданий."""
+    _limit_threads(threads)
+    module, cls = factory
+    target = getattr(importlib.import_module(module), cls)(*factory_args)
+    send_lock = threading.Lock()  # ответы шлют потоки заданий
+
+    def run(job_id, method, args, kwargs) -> None:
+        try:
+            msg = ("done", job_id, True, getattr(target, method)(*args, **kwargs))
+        except Exception as e:  # исключение может не пережить pickle – шлём текст
+            msg = ("done", job_id, False, f"{type(e).__name__}: {e}")
+        with send_lock:
+            conn.send(msg)
+
+    executor = concurrent.futures.ThreadPoolExecutor(jobs, thread_name_prefix="job")
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:  # родитель закрыл pipe
+            break
+        if job is None:
+            break
+        executor.submit(run, *job)
+    executor.shutdown(wait=True)  # начатые задания – доводим
+
+
+def _claim(fut: concurrent.futures.Future) -> bool:
+    """Перевести задание в RUNNING; False – снято до запуска (cancel)."""
+    # RUNNING уже бывает: отправка упала (OSError), и задание вернулось в очередь
+    return fut.running() or fut.set_running_or_notify_cancel()
+
+
+class _Worker:
+    def __init__(self, wid: int):
+        self.wid = wid
+        self.proc: Optional[mp.process.BaseProcess] = None
+        self.pid: Optional[int] = None
+        self.ready = False
+        self.conn: Optional[mp.connection.Connection] = None
+        self.jobs: Dict[int, concurrent.futures.Future] = {}  # отправленные ей
+        self.done = 0
+        self.restarts = 0
+        self.failures = 0  # падений подряд без готовности
+        self.failed = False
+        self.respawn_at: Optional[float] = None
+        self.last_seen = 0.0
+
+
+class VoiceWorkerPool:
+    """
+    Parameters
+    ----------
+    workers            : int
+        Число процессов-реплик; 0 – выполнять в текущем процессе.
+    target             : object
+        Объект для режима workers=0 (обычно общий VOICE).
+    factory            : (module, class)
+        Что создавать в каждом процессе: factory(*factory_args).
+    threads_per_worker : int | None
+        Потоков torch на реплику; по умолчанию – ядра поровну.
+    inline_threads     : int
+        Параллельных заданий при workers=0. Инференс одной модели VoiceModule
+        сериализует сам (_model_lock), так что >1 безопасно, но быстрее
+        только с micro-batching (TTS_BATCH_MAX > 1) – иначе задания ждут замок.
+    jobs_per_worker    : int
+        Сколько заданий реплика берёт одновременно (то же для workers > 0).
+    restart_backoff    : float
+        Пауза перед первым перезапуском упавшей реплики; дальше удваивается.
+    max_failures       : int
+        Сколько падений подряд (без готовности) терпеть до отказа реплики.
+    """
+
+    def __init__(
+        self,
+        workers: int = 0,
+        *,
+        target: Any = None,
+        factory: Tuple[str, str] = ("voice_module", "VoiceModule"),
+        factory_args: tuple = (),
+        threads_per_worker: Optional[int] = None,
+        monitor_interval: float = 1.0,
+        inline_threads: int = 1,
+        jobs_per_worker: int = 1,
+        restart_backoff: float = RESTART_BACKOFF,
+        max_failures: int = MAX_FAILURES,
+    ):
+        self.workers = workers
+        self.target = target
+        self.factory = factory
+        self.factory_args = factory_args
+        self.threads = threads_per_worker or max(1, (os.cpu_count() or 1) // max(1, workers))
+        self.monitor_interval = monitor_interval
+        self.jobs_per_worker = max(1, jobs_per_worker)
+        self.restart_backoff = restart_backoff
+        self.max_failures = max(1, max_failures)
+        # ждущие реплику: (job_id, future, method, args, kwargs)
+        self._pending: Deque[tuple] = deque()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._started = False
+        self._inline: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._workers = [_Worker(i) for i in range(workers)]
+        if workers <= 0:
+            self._inline = concurrent.futures.ThreadPoolExecutor(
+                max(1, inline_threads), thread_name_prefix="voice"
+            )
+            return
+        self._ctx = mp.get_context("spawn")  # fork + torch/CUDA – источник зависаний
+
+    # ---------- public API ------------------------------------------- #
+    def start(self) -> "VoiceWorkerPool":
+        """Запустить процессы-реплики (повторные вызовы ничего не делают)."""
+        if self._inline is not None:
+            return self
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+            for w in self._workers:
+                self._spawn(w)
+        threading.Thread(target=self._collect, name="voice-results", daemon=True).start()
+        return self
+
+    def submit(self, method: str, *args, **kwargs) -> concurrent.futures.Future:
+        if self._inline is not None:
+            return self._inline.submit(
+                lambda: getattr(self.target, method)(*args, **kwargs)
+            )
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("voice pool is closed")
+            if self._broken():
+                raise WorkerCrashed("all voice workers failed")
+            self._pending.append((next(self._ids), fut, method, args, kwargs))
+            self._dispatch()
+        return fut
+
+    async def run(self, method: str, *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self.submit(method, *args, **kwargs))
+
+    def call(self, method: str, *args, timeout: Optional[float] = CALL_TIMEOUT, **kwargs) -> Any:
+        fut = self.submit(method, *args, **kwargs)
+        try:
+            return fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()  # ещё в очереди – реплике не достанется
+            raise
+
+    def health(self) -> list:
+        if self._inline is not None:
+            return [{"worker": 0, "mode": "inline", "alive": True}]
+        with self._lock:
+            return [
+                {
+                    "worker": w.wid,
+                    "pid": w.pid,
+                    "alive": bool(w.proc and w.proc.is_alive()),
+                    "ready": w.ready,
+                    "busy_jobs": sorted(w.jobs),
+                    "jobs_done": w.done,
+                    "restarts": w.restarts,
+                    "failed": w.failed,
+                    "idle_sec": round(time.monotonic() - w.last_seen, 1) if w.last_seen else None,
+                }
+                for w in self._workers
+            ]
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Дождаться загрузки модели во всех репликах (загрузчик готовности).
+        Реплика, исчерпавшая max_failures, – WorkerCrashed.
+        """
+        if self._workers and not self._started:
+            raise RuntimeError("voice pool is not started")
+        end = None if timeout is None else time.monotonic() + timeout
+        while not all(w.ready for w in self._workers):
+            for w in self._workers:
+                if w.failed:
+                    raise WorkerCrashed(
+                        f"voice worker {w.wid} failed to start {w.failures} times in a row"
+                    )
+            if end is not None and time.monotonic() > end:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self) -> None:
+        self._closing = True
+        if self._inline is not None:
+            self._inline.shutdown(wait=False)
+            return
+        with self._lock:
+            pending, self._pending = list(self._pending), deque()
+            for w in self._workers:
+                try:
+                    w.conn.send(None)  # занятая реплика выйдет после задания
+                except (OSError, AttributeError):
+                    pass
+        for _, fut, *_ in pending:
+            if _claim(fut):
+                fut.set_exception(RuntimeError("voice pool is closed"))
+        for w in self._workers:
+            if w.proc:
+                w.proc.join(timeout=5)
+                if w.proc.is_alive():
+                    w.proc.terminate()
+
+    # ---------- internal --------------------------------------------- #
+    def _spawn(self, w: _Worker) -> None:
+        parent, child = self._ctx.Pipe()
+        w.ready, w.jobs, w.respawn_at = False, {}, None
+        w.proc = self._ctx.Process(
+            target=_worker_main,
+            args=(
+                w.wid, self.factory, self.factory_args, self.threads, child,
+                self.jobs_per_worker,
+            ),
+            name=f"voice-worker-{w.wid}",
+            daemon=True,
+        )
+        w.proc.start()
+        child.close()  # конец реплики – только у неё: её смерть = EOF здесь
+        w.pid, w.conn = w.proc.pid, parent
+
+    def _dispatch(self) -> None:
+        """Раздать ждущие задания свободным репликам (под self._lock)."""
+        for w in self._workers:
+            if not self._pending:
+                return
+            while w.ready and len(w.jobs) < self.jobs_per_worker and self._pending:
+                job_id, fut, method, args, kwargs = self._pending.popleft()
+                if not _claim(fut):
+                    continue  # снят по таймауту call()
+                try:
+                    w.conn.send((job_id, method, args, kwargs))
+                except OSError:  # реплика уже умерла – задание ждёт следующую
+                    self._pending.appendleft((job_id, fut, method, args, kwargs))
+                    w.ready = False
+                    break
+                except Exception as e:  # аргументы не сериализуются
+                    fut.set_exception(e)
+                    continue
+                # задание числится за репликой с момента отправки
+                w.jobs[job_id] = fut
+
+    def _collect(self) -> None:
+        """Ответы реплик + контроль их жизни (один поток – без гонок с pipe)."""
+        while not self._closing:
+            with self._lock:
+                conns = {w.conn: w for w in self._workers if w.conn is not None}
+            for conn in mp.connection.wait(list(conns), timeout=self.monitor_interval):
+                w = conns[conn]
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    self._crashed(w)
+                    continue
+                self._handle(w, msg)
+            now = time.monotonic()
+            for w in self._workers:
+                if self._closing:
+                    break
+                if w.conn is not None and not w.proc.is_alive():
+                    self._crashed(w)
+                elif w.respawn_at is not None and now >= w.respawn_at:
+                    with self._lock:
+                        self._spawn(w)
+
+    def _handle(self, w: _Worker, msg: tuple) -> None:
+        with self._lock:
+            w.last_seen = time.monotonic()
+            if msg[0] == "ready":
+                w.ready, w.pid, w.failures = True, msg[1], 0
+                self._dispatch()
+                return
+            _, job_id, ok, res = msg
+            fut = w.jobs.pop(job_id, None)
+            w.done += 1
+            self._dispatch()
+        if fut is None:
+            return
+        if ok:
+            fut.set_result(res)
+        else:
+            fut.set_exception(RuntimeError(res))
+
+    def _broken(self) -> bool:
+        return bool(self._workers) and all(w.failed for w in self._workers)
+
+    def _crashed(self, w: _Worker) -> None:
+        conn = w.conn
+        try:  # ответы, отправленные до смерти, – не теряем
+            while conn.poll():
+                self._handle(w, conn.recv())
+        except (EOFError, OSError):
+            pass
+        if self._closing:
+            return
+        if w.proc.is_alive():  # EOF без смерти процесса – добиваем
+            w.proc.kill()
+        w.proc.join(timeout=5)
+        conn.close()
+        orphans: list = []
+        with self._lock:
+            lost, w.jobs, w.conn = list(w.jobs.values()), {}, None
+            if not w.ready:  # не дошла до готовности – растёт пауза
+                w.failures += 1
+            w.ready = False
+            if w.failures >= self.max_failures:
+                w.failed = True
+                if self._broken():  # исполнять некому
+                    orphans, self._pending = list(self._pending), deque()
+            else:
+                w.restarts += 1
+                delay = min(
+                    self.restart_backoff * 2 ** max(0, w.failures - 1), RESTART_BACKOFF_MAX
+                )
+                w.respawn_at = time.monotonic() + delay
+        if w.failed:
+            logger.error(
+                "Реплика %d (pid %s) упала %d раз подряд, код %s – больше не поднимаем",
+                w.wid, w.pid, w.failures, w.proc.exitcode,
+            )
+        else:
+            logger.warning(
+                "Реплика %d (pid %s) упала, код %s – перезапуск через %.1f с",
+                w.wid, w.pid, w.proc.exitcode, w.respawn_at - time.monotonic(),
+            )
+        err = WorkerCrashed(f"voice worker {w.wid} crashed")
+        for fut in lost:
+            fut.set_exception(err)
+        for _, fut, *_ in orphans:
+            if _claim(fut):
+                fut.set_exception(err)
@@ -0,0 +1,112 @@
+"""
+weights.py – веса моделей в safetensors с отображением в память
+===============================================================
+Формат, запись и чтение – библиотека safetensors; здесь только обвязка:
+•  save_safetensors() – state_dict (torch.Tensor или np.ndarray; счётчики и
+                        конфиги отбрасываются) → safetensors.save_file через
+                        tmp + os.replace; связанные веса (общая память) пишутся
+                        копией – save_file общих тензоров не принимает
+•  mmap_state_dict()  – safetensors.torch.load_file: тензоры смотрят прямо
+                        в mmap файла (MAP_PRIVATE): копии в куче процесса нет,
+                        все реплики делят одни страницы page cache, а
+                        изменённая страница копируется только у изменившего
+•  tensor_names()     – имена тензоров файла (safe_open, данные не читаются)
+•  load_into()        – module.load_state_dict(…, assign=True): параметры
+                        модуля становятся mmap-тензорами, а не копиями
+torch и safetensors импортируются только внутри функций.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+
+def save_safetensors(
+    state: Mapping[str, object],
+    path: str | Path,
+    metadata: Optional[Mapping[str, str]] = None,
+) -> Path:
+    path = Path(path)
+    tensors = {k: v for k, v in state.items() if isinstance(v, np.ndarray) or _is_tensor(v)}
+    meta = {"format": "pt", **(metadata or {})}
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        if any(_is_tensor(v) for v in tensors.values()):
+            from safetensors.torch import save_file
+
+            save_file(_torch_tensors(tensors), str(tmp), metadata=meta)
+        else:  # чистый numpy – torch не нужен
+            from safetensors.numpy import save_file
+
+            save_file(
+                {k: np.ascontiguousarray(v) for k, v in tensors.items()}, str(tmp), metadata=meta
+            )
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def mmap_state_dict(path: str | Path) -> Dict[str, "torch.Tensor"]:  # noqa: F821
+    from safetensors.torch import load_file
+
+    return load_file(str(path), device="cpu")
+
+
+def tensor_names(path: str | Path) -> List[str]:
+    from safetensors import safe_open
+
+    with safe_open(str(path), framework="np") as fh:
+        return list(fh.keys())
+
+
+def load_into(module, path: str | Path, allow_missing: Iterable[str] = ()) -> None:
+    """
+    Параметры module ← mmap-тензоры файла (assign=True, без копирования).
+    Отсутствующие ключи допустимы, если это связанные веса (tie_weights)
+    или они подходят под regex из allow_missing.
+    """
+    state = mmap_state_dict(path)
+    missing, unexpected = module.load_state_dict(state, strict=False, assign=True)
+    if hasattr(module, "tie_weights"):
+        module.tie_weights()
+    loaded = {t.data_ptr() for t in state.values()}
+    current = module.state_dict()
+    patterns = [re.compile(p) for p in allow_missing]
+    missing = [
+        k for k in missing
+        if current[k].data_ptr() not in loaded and not any(p.search(k) for p in patterns)
+    ]
+    if missing or unexpected:
+        raise RuntimeError(f"State dict mismatch!\nMissing: {missing}\nUnexpected: {unexpected}")
+
+
+# ────────────────────────────────────────
+# helpers
+# ────────────────────────────────────────
+def _is_tensor(value) -> bool:
+    return type(value).__module__.startswith("torch") and hasattr(value, "dtype")
+
+
+def _torch_tensors(tensors: Mapping[str, object]) -> Dict[str, "torch.Tensor"]:  # noqa: F821
+    """np → torch, всё на CPU и непрерывно; тензор поверх уже занятой памяти – копией."""
+    import torch
+
+    out, storages = {}, set()
+    for name, value in tensors.items():
+        if isinstance(value, np.ndarray):
+            t = torch.from_numpy(np.ascontiguousarray(value))
+        else:
+            t = value.detach().cpu().contiguous()
+        ptr = t.untyped_storage().data_ptr()
+        if t.numel() and ptr in storages:
+            t = t.clone()
+        storages.add(t.untyped_storage().data_ptr())
+        out[name] = t
+    return out
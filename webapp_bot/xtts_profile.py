@@ -0,0 +1,159 @@
+"""
+xtts_profile.py – профили CPU-инференса XTTS
+============================================
+•  fp32       – как раньше, эталон качества
+•  int8       – динамическое int8-квантование GPT: веса nn.Linear хранятся
+                в int8, активации квантуются на лету (fbgemm / qnnpack).
+                Conv1D из transformers (attn / mlp в блоках GPT-2) сначала
+                переводятся в nn.Linear – иначе quantize_dynamic их не видит
+•  bf16       – autocast bfloat16 на CPU с AVX512-BF16 / AMX; без них – fp32
+•  int8-bf16  – оба сразу
+HiFi-GAN и speaker-encoder – свёрточные, остаются в fp32.
+На CUDA профиль не применяется (int8-ядра здесь только CPU).
+Профиль – на модель (процесс); по тарифам его разводит server_bot
+(XTTS_TARIFF_PROFILES): с репликами на каждый профиль – свой пул.
+
+mel_distance() – метрика для офлайн-проверки качества профиля
+(bench/bench_xtts_profiles.py): средняя |Δ| лог-мелов в дБ после
+DTW-выравнивания кадров – длины синтезов разных профилей не совпадают.
+torch импортируется только внутри функций.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger("xtts-profile")
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    name: str
+    int8: bool = False
+    bf16: bool = False
+
+
+PROFILES = {
+    p.name: p
+    for p in (
+        InferenceProfile("fp32"),
+        InferenceProfile("int8", int8=True),
+        InferenceProfile("bf16", bf16=True),
+        InferenceProfile("int8-bf16", int8=True, bf16=True),
+    )
+}
+
+
+def get_profile(name: Optional[str] = None) -> InferenceProfile:
+    """Профиль по имени (по умолчанию – env XTTS_PROFILE, иначе fp32)."""
+    name = (name or os.getenv("XTTS_PROFILE") or "fp32").strip().lower()
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown XTTS profile {name!r}; known: {', '.join(PROFILES)}") from None
+
+
+def bf16_supported() -> bool:
+    """Есть ли у CPU нативный bfloat16 (иначе bf16 медленнее fp32)."""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as fh:
+            flags = fh.read()
+    except OSError:  # не Linux – проверить не можем, не рискуем
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def effective(profile: InferenceProfile, device_type: str) -> InferenceProfile:
+    """Что реально применимо на этом устройстве."""
+    if device_type != "cpu":
+        if profile.int8 or profile.bf16:
+            logger.warning("Профиль %s – только для CPU, на %s работает fp32", profile.name, device_type)
+        return PROFILES["fp32"]
+    if profile.bf16 and not bf16_supported():
+        logger.warning("CPU без bf16 – профиль %s без bf16", profile.name)
+        return PROFILES["int8" if profile.int8 else "fp32"]
+    return profile
+
+
+def apply_profile(model, profile: InferenceProfile):
+    """Квантовать GPT модели XTTS на месте (int8); возвращает model."""
+    if not profile.int8:
+        return model
+    import torch
+
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("fbgemm", "x86", "qnnpack"):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            break
+    _conv1d_to_linear(model.gpt)
+    torch.ao.quantization.quantize_dynamic(
+        model.gpt, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    logger.info("GPT квантована в int8 (%s)", torch.backends.quantized.engine)
+    return model
+
+
+def autocast(profile: InferenceProfile, device_type: str):
+    """Контекст инференса: bf16-autocast для bf16-профилей, иначе fp32."""
+    import torch
+
+    if profile.bf16 and device_type == "cpu":
+        return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+    if device_type in ("cpu", "cuda"):
+        return torch.amp.autocast(device_type=device_type, enabled=False)
+    return contextlib.nullcontext()
+
+
+def _conv1d_to_linear(module) -> int:
+    """transformers Conv1D (y = x·W + b, W[in, out]) → nn.Linear с W.T."""
+    import torch
+
+    replaced = 0
+    for name, child in module.named_children():
+        if type(child).__name__ == "Conv1D" and child.weight.dim() == 2:
+            n_in, n_out = child.weight.shape
+            lin = torch.nn.Linear(n_in, n_out, bias=child.bias is not None)
+            with torch.no_grad():
+                lin.weight.copy_(child.weight.t())
+                if child.bias is not None:
+                    lin.bias.copy_(child.bias)
+            setattr(module, name, lin)
+            replaced += 1
+        else:
+            replaced += _conv1d_to_linear(child)
+    return replaced
+
+
+# ────────────────────────────────────────
+# офлайн-проверка качества
+# ────────────────────────────────────────
+def mel_distance(ref_db: np.ndarray, test_db: np.ndarray) -> float:
+    """
+    Средняя |Δ| (дБ) между лог-мел-спектрограммами [кадры, мелы]
+    вдоль DTW-пути. 0 – совпадение; фразы по 1–3 с → O(T²) допустимо.
+    """
+    a = np.asarray(ref_db, dtype=np.float64)
+    b = np.asarray(test_db, dtype=np.float64)
+    if not len(a) or not len(b):
+        raise ValueError("empty spectrogram")
+    cost = np.abs(a[:, None, :] - b[None, :, :]).mean(axis=2)
+    n, m = cost.shape
+    acc = np.full((n + 1, m + 1), np.inf)
+    steps = np.zeros((n + 1, m + 1), dtype=np.int64)
+    acc[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            prev = ((acc[i - 1, j - 1], steps[i - 1, j - 1]),
+                    (acc[i - 1, j], steps[i - 1, j]),
+                    (acc[i, j - 1], steps[i, j - 1]))
+            best, k = min(prev, key=lambda t: t[0])
+            acc[i, j] = best + cost[i - 1, j - 1]
+            steps[i, j] = k + 1
+    return float(acc[n, m] / steps[n, m])